@@ -5,13 +5,15 @@ Exposes the following endpoints under `/api/auth`:
 - POST /signup  -> register a new user
 - POST /login   -> returns JWT access token (valid for 1 hour) and user info
 - GET  /me      -> returns current user details (requires Authorization header)
+- PATCH /profile -> updates current user's profile
+- DELETE /profile -> deletes current user's account and all of their content
 
 Uses python-jose for token creation and passlib for password hashing.
 """
 import os
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from dotenv import load_dotenv
@@ -19,6 +21,8 @@ from dotenv import load_dotenv
 from . import schemas, crud
 from .database import get_db
 from .services.geocode import reverse_geocode
+from .services.password_hasher import PasswordHasherBusy, password_hasher
+from .services.user_cache import UserSnapshot, subject_key, user_cache
 
 load_dotenv()
 
@@ -41,9 +45,11 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Dependency to return the current user from the provided JWT token.
+async def user_from_token(token: str, db: AsyncSession) -> UserSnapshot:
+    """Resolve a JWT access token to a snapshot of its user.
 
+    Tokens carry the user id in `uid`; older tokens only have the email in
+    `sub`. Results are cached briefly, so most requests skip the database.
     Raises 401 if token is invalid or user not found.
     """
     credentials_exception = HTTPException(
@@ -54,27 +60,58 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str | None = payload.get("sub")
-        if email is None:
+        user_id = payload.get("uid")
+        if email is None or (user_id is not None and not isinstance(user_id, int)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = crud.get_user_by_email(db, email=email)
-    if user is None:
+    key = subject_key(user_id=user_id, email=email)
+    snapshot = user_cache.get(key)
+    if snapshot is None:
+        if user_id is not None:
+            user = await crud.get_user(db, user_id)
+        else:
+            user = await crud.get_user_by_email(db, email=email)
+        if user is None:
+            raise credentials_exception
+        snapshot = UserSnapshot.from_user(user)
+        user_cache.put(key, snapshot)
+
+    # Ids of deleted accounts can be reused; a token only speaks for the account it was issued to
+    if snapshot.email != email:
         raise credentials_exception
-    return user
+    return snapshot
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """Dependency to return the current user from the provided JWT token.
+
+    Raises 401 if token is invalid or user not found.
+    """
+    return await user_from_token(token, db)
+
+
+def _hasher_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, please retry shortly",
+        headers={"Retry-After": "2"},
+    )
 
 
 @router.post("/signup", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-async def signup(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def signup(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user.
 
     Expects JSON: { email, password, name, phone (optional), userType, crop (optional), location (optional) }
     Returns created user (without password).
     """
-    existing = crud.get_user_by_email(db, user_in.email)
+    existing = await crud.get_user_by_email(db, user_in.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
+    # Hand the pooled connection back while geocoding and hashing are awaited
+    await db.rollback()
 
     user_data = user_in.model_dump()
     lat = user_data.pop("latitude", None)
@@ -89,7 +126,11 @@ async def signup(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
         if not user_data.get("location"):
             user_data["location"] = f"{lat},{lon}"
 
-    user = crud.create_user(db, schemas.UserCreate(**user_data))
+    try:
+        hashed_password = await password_hasher.hash(user_in.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy_exception()
+    user = await crud.create_user(db, schemas.UserCreate(**user_data), hashed_password=hashed_password)
     return {
         "id": user.id,
         "email": user.email,
@@ -106,17 +147,26 @@ async def signup(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=dict)
-async def login(payload: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(payload: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
     """Authenticate user and return access token and user info.
 
     Expects JSON: { email, password }
     Returns: { access_token, token_type, user }
     """
-    user = crud.authenticate_user(db, payload.email, payload.password)
-    if not user:
+    user = await crud.get_user_by_email(db, payload.email)
+    if user is not None:
+        db.expunge(user)
+    # Hand the pooled connection back while bcrypt runs; a login storm would
+    # otherwise hold every connection and starve other requests
+    await db.rollback()
+    try:
+        valid = user is not None and await password_hasher.verify(payload.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy_exception()
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data={"sub": user.email, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer", "user": {
         "id": user.id,
         "email": user.email,
@@ -133,7 +183,7 @@ async def login(payload: schemas.UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=schemas.UserOut)
-async def me(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def me(current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Return current logged-in user details.
 
     Requires header: Authorization: Bearer <token>
@@ -157,15 +207,16 @@ async def me(current_user=Depends(get_current_user), db: Session = Depends(get_d
 async def update_profile(
     user_update: schemas.UserUpdate,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current user's profile.
 
     Requires header: Authorization: Bearer <token>
     """
-    updated_user = crud.update_user(db, current_user.id, user_update)
+    updated_user = await crud.update_user(db, current_user.id, user_update)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
+    user_cache.invalidate(current_user.id, current_user.email)
     
     return {
         "id": updated_user.id,
@@ -180,3 +231,16 @@ async def update_profile(
         "village": updated_user.village,
         "is_active": updated_user.is_active,
     }
+
+
+@router.delete("/profile", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_account(current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Delete current user's account together with their posts, likes and comments.
+
+    Requires header: Authorization: Bearer <token>
+    """
+    deleted = await crud.delete_user(db, current_user.id)
+    user_cache.invalidate(current_user.id, current_user.email)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="User not found")
+    return None
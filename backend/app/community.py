@@ -3,30 +3,149 @@ Community/Posts API endpoints.
 
 Handles post creation, fetching, liking, and commenting.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, or_
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, delete, desc, or_, select
 from typing import List, Optional
 from datetime import datetime
 from pathlib import Path
-import uuid
-
-from .database import get_db
-from .models import Post, PostLike, Comment, User
-from .schemas import PostCreate, PostUpdate, PostOut, PostLikeCreate, CommentCreate, CommentOut
-from .auth import get_current_user
+import asyncio
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+
+from . import crud
+from .database import AsyncSessionLocal, get_db
+from .models import Post, PostLike, Comment, User, UserStats
+from .schemas import PostCreate, PostUpdate, PostOut, PostLikeCreate, CommentCreate, CommentOut, UserStatsOut, FeedPage
+from .auth import get_current_user, user_from_token
+from .utils.http_cache import IMMUTABLE_CACHE_CONTROL, etag_matches, not_modified
+from .services import dedup, feed_ranking, image_pipeline, image_storage
+from .services.counter_buffer import apply_counter_delta
+from .services.pubsub import broker
 
 router = APIRouter(prefix="/community", tags=["community"])
 
-# Create uploads directory if it doesn't exist
-BASE_DIR = Path(__file__).parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
-
 # Allowed image extensions
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
+# Uploads are streamed to disk in chunks and rejected as soon as they exceed the limit
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024  # 5MB
+# Whole upload request, with room for the multipart headers and boundaries (see BodySizeLimitMiddleware)
+MAX_UPLOAD_REQUEST_SIZE = MAX_UPLOAD_SIZE + 64 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Names produced by the upload pipeline (sharded content hashes, or flat UUIDs
+# from older uploads); anything else is not served
+IMAGE_FILENAME_RE = re.compile(
+    r"^(?:[0-9a-f]{2}/[0-9a-f]{2}/)?[A-Za-z0-9][A-Za-z0-9_-]*\.(?:jpg|jpeg|png|gif|webp)$"
+)
+
+# Optional prefix of an internal nginx location serving the uploads directory (X-Accel-Redirect)
+IMAGE_ACCEL_REDIRECT_PREFIX = os.getenv("IMAGE_ACCEL_REDIRECT_PREFIX")
+
+# Leading bytes of each accepted image format
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": ".jpg",
+    b"\x89PNG\r\n\x1a\n": ".png",
+    b"GIF87a": ".gif",
+    b"GIF89a": ".gif",
+}
+
+
+# Realtime events carry a preview; clients fetch the full post when they need it
+EVENT_PREVIEW_LENGTH = 280
+EVENT_KEEPALIVE_SECONDS = 15
+
+
+def _detect_image_type(head: bytes) -> Optional[str]:
+    """Return the file extension matching the image's magic bytes, if any."""
+    for signature, ext in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+# ============================================================================
+# Hot queries (each is served by an index, see tests/test_query_plans.py)
+# ============================================================================
+
+def posts_query(crop: Optional[str] = None, category: Optional[str] = None):
+    """Listed posts, newest first. Near-duplicates of other posts are kept but not listed."""
+    query = select(Post).where(Post.duplicate_of.is_(None))
+    if crop:
+        query = query.where(Post.crop == crop)
+    if category:
+        query = query.where(Post.category == category)
+    return query.order_by(desc(Post.created_at))
+
+
+def user_posts_query(user_id: int):
+    return select(Post).where(Post.author_id == user_id).order_by(desc(Post.created_at))
+
+
+def comments_query(post_id: int):
+    # Author names come from the same query instead of one lookup per comment
+    return (
+        select(Comment, User.name)
+        .outerjoin(User, User.id == Comment.user_id)
+        .where(Comment.post_id == post_id)
+        .order_by(Comment.created_at)
+    )
+
+
+def liked_post_ids_query(user_id: int, post_ids: List[int]):
+    return select(PostLike.post_id).where(PostLike.user_id == user_id, PostLike.post_id.in_(post_ids))
+
+
+async def _serialize_posts(db: AsyncSession, posts: List[Post], viewer_id: int) -> List[dict]:
+    """Build PostOut-shaped dicts with one author query and one like query for the whole page.
+
+    Plain dicts are validated and serialized by the route's response_model in
+    one pass instead of constructing a PostOut per post first.
+    """
+    if not posts:
+        return []
+    author_ids = {post.author_id for post in posts}
+    authors = {
+        user.id: user
+        for user in (await db.execute(select(User).where(User.id.in_(author_ids)))).scalars()
+    }
+    liked = set((await db.execute(liked_post_ids_query(viewer_id, [post.id for post in posts]))).scalars())
+
+    result = []
+    for post in posts:
+        author = authors.get(post.author_id)
+        result.append({
+            "id": post.id,
+            "content": post.content,
+            "author_id": post.author_id,
+            "author": {
+                "id": author.id,
+                "name": author.name,
+                "email": author.email
+            } if author else None,
+            "author_name": author.name if author else None,
+            "region": post.region or (author.state if author else None),
+            "crop": post.crop,
+            "category": post.category,
+            "likes_count": post.likes_count if post.likes_count is not None else 0,
+            "comments_count": post.comments_count if post.comments_count is not None else 0,
+            "image_url": post.image_url,
+            "image_placeholder": post.image_placeholder,
+            "created_at": post.created_at,
+            "is_liked": post.id in liked,
+            "duplicate_of": post.duplicate_of,
+        })
+    return result
+
 
 # ============================================================================
 # Posts Endpoints
@@ -39,69 +158,87 @@ async def get_posts(
     crop: str = None,
     category: str = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all posts with author information and like status. Supports filtering by crop and category."""
     try:
-        query = db.query(Post)
+        posts = (await db.execute(posts_query(crop, category).offset(skip).limit(limit))).scalars().all()
         
-        # Apply filters
-        if crop:
-            query = query.filter(Post.crop == crop)
-        if category:
-            query = query.filter(Post.category == category)
-        
-        posts = query.order_by(desc(Post.created_at)).offset(skip).limit(limit).all()
-        
-        result = []
-        for post in posts:
-            # Get author info
-            author = db.query(User).filter(User.id == post.author_id).first()
-            
-            # Check if current user liked this post
-            is_liked = db.query(PostLike).filter(
-                PostLike.post_id == post.id,
-                PostLike.user_id == current_user.id
-            ).first() is not None
-            
-            post_dict = {
-                "id": post.id,
-                "content": post.content,
-                "author_id": post.author_id,
-                "author": {
-                    "id": author.id,
-                    "name": author.name,
-                    "email": author.email
-                } if author else None,
-                "author_name": author.name if author else None,
-                "region": post.region or (author.state if author else None),
-                "crop": post.crop,
-                "category": post.category,
-                "likes_count": post.likes_count if post.likes_count is not None else 0,
-                "comments_count": post.comments_count if post.comments_count is not None else 0,
-                "image_url": post.image_url,
-                "created_at": post.created_at,
-                "is_liked": is_liked
-            }
-            result.append(PostOut(**post_dict))
-        
-        return result
+        return await _serialize_posts(db, posts, current_user.id)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error fetching posts: {str(e)}")
 
 
+@router.get("/feed", response_model=FeedPage)
+async def get_feed(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    category: str = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Personalized "for you" feed.
+
+    Posts are ordered by their precomputed rank (engagement plus recency),
+    boosted when they match the viewer's crop and state. Pass `next_cursor`
+    back as `cursor` to get the following page.
+    """
+    try:
+        position = feed_ranking.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Near-duplicates of other posts are kept but not listed
+    visible = Post.duplicate_of.is_(None)
+    if category:
+        visible = and_(visible, Post.category == category)
+
+    posts, next_cursor = await feed_ranking.ranked_feed(
+        db,
+        crop=current_user.crop,
+        region=current_user.state,
+        limit=limit,
+        cursor=position,
+        base_filter=visible,
+    )
+    return {"items": await _serialize_posts(db, posts, current_user.id), "next_cursor": next_cursor}
+
+
 @router.post("/posts", response_model=PostOut, status_code=status.HTTP_201_CREATED)
 async def create_post(
     post_data: PostCreate,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Create a new post."""
+    """Create a new post.
+
+    A near-duplicate of one of the author's own recent posts returns that post
+    (200) instead of creating a copy. A near-duplicate of someone else's post
+    is stored with `duplicate_of` set and left out of feeds and search; it is
+    answered with 202 so the client can tell the author it will not be listed.
+    """
     # Use user's state as region if not provided
     region = post_data.region or current_user.state
     
+    signature = dedup.signature(post_data.content)
+    match = None
+    original = None
+    if signature is not None:
+        await db.run_sync(dedup.duplicate_index.catch_up)
+        match = dedup.duplicate_index.find(signature)
+        if match is not None:
+            original = await db.get(Post, match.post_id)
+            if original is None:
+                # Deleted by another worker since it was indexed
+                dedup.duplicate_index.remove(match.post_id)
+                match = None
+    if match is not None and match.author_id == current_user.id:
+        response.status_code = status.HTTP_200_OK
+        return (await _serialize_posts(db, [original], current_user.id))[0]
+    
     db_post = Post(
         content=post_data.content,
         author_id=current_user.id,
@@ -109,15 +246,34 @@ async def create_post(
         crop=post_data.crop,
         category=post_data.category,
         image_url=post_data.image_url,
+        image_placeholder=post_data.image_placeholder,
         likes_count=0,
-        comments_count=0
+        comments_count=0,
+        rank_score=feed_ranking.rank_score(0, 0, None),
+        duplicate_of=match.post_id if match is not None else None
     )
     db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    await crud.record_user_activity(db, current_user, posts_delta=1)
+    await db.commit()
+    await db.refresh(db_post)
     
-    # Return with author info
-    author = db.query(User).filter(User.id == db_post.author_id).first()
+    # The authenticated user is the author; no need to load it again
+    author = current_user
+    if db_post.duplicate_of is not None:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return (await _serialize_posts(db, [db_post], current_user.id))[0]
+    dedup.duplicate_index.add(db_post.id, db_post.author_id, signature, db_post.created_at)
+    await broker.publish({
+        "type": "post_created",
+        "post_id": db_post.id,
+        "crop": db_post.crop,
+        "region": db_post.region,
+        "category": db_post.category,
+        "author_name": author.name if author else None,
+        "content": db_post.content[:EVENT_PREVIEW_LENGTH],
+        "image_url": db_post.image_url,
+        "created_at": db_post.created_at.isoformat() if db_post.created_at else None,
+    })
     return PostOut(
         id=db_post.id,
         content=db_post.content,
@@ -134,6 +290,7 @@ async def create_post(
         likes_count=db_post.likes_count,
         comments_count=db_post.comments_count,
         image_url=db_post.image_url,
+        image_placeholder=db_post.image_placeholder,
         created_at=db_post.created_at,
         is_liked=False
     )
@@ -143,36 +300,31 @@ async def create_post(
 async def toggle_like(
     post_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Like or unlike a post."""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = (await db.execute(select(Post.crop, Post.region).where(Post.id == post_id))).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    # Check if user already liked
-    existing_like = db.query(PostLike).filter(
-        PostLike.post_id == post_id,
-        PostLike.user_id == current_user.id
-    ).first()
-    
-    if existing_like:
-        # Unlike: remove the like
-        db.delete(existing_like)
-        post.likes_count = max(0, post.likes_count - 1)
-        is_liked = False
-    else:
-        # Like: add the like
-        new_like = PostLike(post_id=post_id, user_id=current_user.id)
-        db.add(new_like)
-        post.likes_count += 1
-        is_liked = True
+    likes_delta, is_liked = await crud.toggle_post_like(db, post_id, current_user.id)
+    likes_count = await apply_counter_delta(db, post_id, "likes_count", likes_delta)
+    if likes_count is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Post not found")
     
-    db.commit()
+    await db.commit()
+    await broker.publish({
+        "type": "like_count",
+        "post_id": post_id,
+        "crop": post.crop,
+        "region": post.region,
+        "likes_count": likes_count,
+    })
     
     return {
         "post_id": post_id,
-        "likes_count": post.likes_count,
+        "likes_count": likes_count,
         "is_liked": is_liked
     }
 
@@ -185,28 +337,26 @@ async def toggle_like(
 async def get_comments(
     post_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all comments for a post."""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = (await db.execute(select(Post.id).where(Post.id == post_id))).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    comments = db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.created_at).all()
-    
-    result = []
-    for comment in comments:
-        author = db.query(User).filter(User.id == comment.user_id).first()
-        result.append(CommentOut(
-            id=comment.id,
-            post_id=comment.post_id,
-            user_id=comment.user_id,
-            author_name=author.name if author else None,
-            content=comment.content,
-            created_at=comment.created_at
-        ))
+    rows = (await db.execute(comments_query(post_id))).all()
     
-    return result
+    return [
+        {
+            "id": comment.id,
+            "post_id": comment.post_id,
+            "user_id": comment.user_id,
+            "author_name": author_name,
+            "content": comment.content,
+            "created_at": comment.created_at,
+        }
+        for comment, author_name in rows
+    ]
 
 
 @router.post("/posts/{post_id}/comments", response_model=CommentOut, status_code=status.HTTP_201_CREATED)
@@ -214,11 +364,13 @@ async def create_comment(
     post_id: int,
     comment_data: CommentCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add a comment to a post."""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+    # Counter update doubles as the existence check
+    comments_count = await apply_counter_delta(db, post_id, "comments_count", 1)
+    if comments_count is None:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Post not found")
     
     db_comment = Comment(
@@ -227,11 +379,24 @@ async def create_comment(
         content=comment_data.content
     )
     db.add(db_comment)
-    post.comments_count += 1
-    db.commit()
-    db.refresh(db_comment)
+    await crud.record_user_activity(db, current_user)
+    await db.commit()
+    await db.refresh(db_comment)
     
-    author = db.query(User).filter(User.id == current_user.id).first()
+    author = current_user  # The commenter
+    post = (await db.execute(select(Post.crop, Post.region).where(Post.id == post_id))).first()
+    if post:
+        await broker.publish({
+            "type": "comment_created",
+            "post_id": post_id,
+            "crop": post.crop,
+            "region": post.region,
+            "comment_id": db_comment.id,
+            "author_name": author.name if author else None,
+            "content": db_comment.content[:EVENT_PREVIEW_LENGTH],
+            "comments_count": comments_count,
+            "created_at": db_comment.created_at.isoformat() if db_comment.created_at else None,
+        })
     return CommentOut(
         id=db_comment.id,
         post_id=db_comment.post_id,
@@ -242,6 +407,58 @@ async def create_comment(
     )
 
 
+# ============================================================================
+# Realtime Events
+# ============================================================================
+
+def _split_filter(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = Query(None, description="Access token (EventSource cannot send headers)"),
+    crops: Optional[str] = Query(None, description="Comma-separated crops to subscribe to"),
+    regions: Optional[str] = Query(None, description="Comma-separated regions to subscribe to"),
+):
+    """Server-Sent Events stream of post_created, like_count and comment_created events.
+
+    Only events for posts matching the requested crops/regions are sent
+    (no filter means everything). Replaces polling `/community/posts`.
+    """
+    if not token:
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    # Authenticate with a short-lived session; the stream must not hold a DB connection
+    async with AsyncSessionLocal() as db:
+        await user_from_token(token, db)
+
+    subscription = broker.subscribe(crops=_split_filter(crops), regions=_split_filter(regions))
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ============================================================================
 # Image Upload Endpoint
 # ============================================================================
@@ -264,33 +481,116 @@ async def upload_image(
             detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
-    # Check file size (max 5MB)
-    contents = await file.read()
-    if len(contents) > 5 * 1024 * 1024:  # 5MB
-        raise HTTPException(status_code=400, detail="File too large. Maximum size is 5MB.")
-    
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = UPLOAD_DIR / unique_filename
-    
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    # Stream into a temp file, hashing as we go; only the re-encoded variants are kept
+    storage = image_storage.get_storage()
+    fd, tmp_name = tempfile.mkstemp(dir=storage.tmp_dir, prefix=".upload-", suffix=".part")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            size = 0
+            detected_ext = None
+            hasher = hashlib.sha256()
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                if detected_ext is None:
+                    detected_ext = _detect_image_type(chunk)
+                    if detected_ext is None:
+                        raise HTTPException(status_code=400, detail="File is not a valid image.")
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=400, detail="File too large. Maximum size is 5MB.")
+                hasher.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+        
+        if detected_ext is None:
+            raise HTTPException(status_code=400, detail="Empty file")
+        
+        # Identical bytes were uploaded before: reuse the stored variants
+        digest = hasher.hexdigest()
+        manifest = await run_in_threadpool(image_storage.read_manifest, storage, digest)
+        
+        if manifest is None:
+            # Re-encode as stripped WebP variants in the worker pool
+            work_dir = await run_in_threadpool(image_storage.make_work_dir, storage)
+            try:
+                derived = await image_pipeline.process_upload(str(tmp_path), work_dir, digest)
+                manifest = await run_in_threadpool(
+                    image_storage.store_derivatives, storage, digest, work_dir, derived
+                )
+            except image_pipeline.InvalidImageError:
+                raise HTTPException(status_code=400, detail="File is not a valid image.")
+            finally:
+                await run_in_threadpool(image_storage.remove_work_dir, work_dir)
+    finally:
+        # The raw upload (with its EXIF data) is never kept
+        tmp_path.unlink(missing_ok=True)
     
-    # Return URL (relative path that can be served)
-    return {"url": f"/community/images/{unique_filename}"}
+    # Return URL (relative path that can be served) plus the blur placeholder
+    url = f"{image_storage.IMAGES_URL_PREFIX}{manifest['variants']['full']}"
+    return {
+        "url": url,
+        "placeholder": manifest["placeholder"],
+        "variants": {size: f"{url}?size={size}" for size in manifest["variants"]},
+    }
 
 
-@router.get("/images/{filename}")
-async def get_image(filename: str):
-    """Serve uploaded images."""
-    file_path = UPLOAD_DIR / filename
+@router.get("/images/{filename:path}")
+async def get_image(
+    filename: str,
+    request: Request,
+    size: Optional[str] = Query(None, pattern="^(thumb|feed|full)$")
+):
+    """Serve uploaded images. `size` selects a WebP derivative (thumb, feed or full).
+
+    Upload names (content hashes, or UUIDs for older uploads) are never
+    reused, so responses are cacheable forever and the name itself is a
+    strong ETag.
+    """
+    # The strict name pattern rules out traversal without resolving paths
+    if not IMAGE_FILENAME_RE.match(filename):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if image_storage.is_content_addressed(filename):
+        storage = image_storage.get_storage()
+    else:
+        # Flat UUID names from older uploads only exist on local disk
+        storage = image_storage.get_legacy_storage()
+    stem = filename.rsplit(".", 1)[0]
+    candidates = [filename]
+    if size:
+        # Images uploaded before derivatives existed only have the original
+        candidates.insert(0, image_pipeline.variant_filename(stem, size))
+    
+    if not isinstance(storage, image_storage.LocalImageStorage):
+        # Content-addressed uploads always have every variant; hand off to the bucket/CDN
+        name = candidates[0]
+        etag = f'"{Path(name).stem}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag, IMMUTABLE_CACHE_CONTROL)
+        url = await run_in_threadpool(storage.url_for, name)
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=3000"})
     
-    # Security: prevent directory traversal
-    if not file_path.exists() or not str(file_path.resolve()).startswith(str(UPLOAD_DIR.resolve())):
+    for name in candidates:
+        try:
+            stat_result = os.stat(storage.path(name))
+            break
+        except FileNotFoundError:
+            continue
+    else:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    return FileResponse(file_path)
+    etag = f'"{Path(name).stem}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, IMMUTABLE_CACHE_CONTROL)
+    
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if IMAGE_ACCEL_REDIRECT_PREFIX:
+        # Let the front proxy (nginx internal location) send the bytes
+        headers["X-Accel-Redirect"] = f"{IMAGE_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{name}"
+        return Response(headers=headers, media_type=media_type)
+    
+    # FileResponse handles Range / If-Range requests
+    return FileResponse(storage.path(name), headers=headers, media_type=media_type, stat_result=stat_result)
 
 
 # ============================================================================
@@ -300,32 +600,63 @@ async def get_image(filename: str):
 @router.get("/top-contributors")
 async def get_top_contributors(
     limit: int = 10,
+    region: Optional[str] = None,
+    crop: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get top contributors by post count."""
-    # Query to get users with their post counts, ordered by count descending
-    contributors = db.query(
-        User.id,
+    """Get top contributors by post count, optionally within a region and/or crop.
+
+    Reads the top `limit` rows of the indexed `user_stats` table instead of
+    aggregating posts on every call.
+    """
+    query = select(
+        UserStats.user_id,
         User.name,
-        func.count(Post.id).label('posts_count')
-    ).join(Post, User.id == Post.author_id)\
-     .group_by(User.id, User.name)\
-     .order_by(desc('posts_count'))\
-     .limit(limit)\
-     .all()
+        UserStats.posts_count,
+        UserStats.likes_received,
+        UserStats.comments_received,
+    ).join(User, User.id == UserStats.user_id)\
+     .where(UserStats.posts_count > 0)
+    
+    if region:
+        query = query.where(UserStats.region == region)
+    if crop:
+        query = query.where(UserStats.crop == crop)
+    
+    contributors = (await db.execute(query.order_by(desc(UserStats.posts_count)).limit(limit))).all()
     
     result = []
-    for user_id, name, posts_count in contributors:
+    for user_id, name, posts_count, likes_received, comments_received in contributors:
         result.append({
             "user_id": user_id,
             "name": name or f"User {user_id}",
-            "posts_count": posts_count
+            "posts_count": posts_count,
+            "likes_received": likes_received,
+            "comments_received": comments_received,
         })
     
     return result
 
 
+@router.get("/user/{user_id}/stats", response_model=UserStatsOut)
+async def get_user_stats(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get community statistics for a user's profile page."""
+    stats = await db.get(UserStats, user_id)
+    if stats:
+        return stats
+    
+    # Users who have never posted or commented have no stats row yet
+    user = (await db.execute(select(User.id).where(User.id == user_id))).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserStatsOut(user_id=user_id)
+
+
 # ============================================================================
 # Search Endpoint
 # ============================================================================
@@ -336,7 +667,7 @@ async def search_posts(
     skip: int = 0,
     limit: int = 50,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Search posts by content, author name, or crop."""
     if not q or not q.strip():
@@ -345,7 +676,8 @@ async def search_posts(
     search_term = f"%{q.strip()}%"
     
     # Search in post content, author name, and crop
-    query = db.query(Post).join(User, Post.author_id == User.id).filter(
+    query = select(Post).join(User, Post.author_id == User.id).where(
+        Post.duplicate_of.is_(None),
         or_(
             Post.content.ilike(search_term),
             User.name.ilike(search_term),
@@ -353,41 +685,11 @@ async def search_posts(
         )
     )
     
-    posts = query.order_by(desc(Post.created_at)).offset(skip).limit(limit).all()
+    posts = (await db.execute(
+        query.order_by(desc(Post.created_at)).offset(skip).limit(limit)
+    )).scalars().all()
     
-    result = []
-    for post in posts:
-        # Get author info
-        author = db.query(User).filter(User.id == post.author_id).first()
-        
-        # Check if current user liked this post
-        is_liked = db.query(PostLike).filter(
-            PostLike.post_id == post.id,
-            PostLike.user_id == current_user.id
-        ).first() is not None
-        
-        post_dict = {
-            "id": post.id,
-            "content": post.content,
-            "author_id": post.author_id,
-            "author": {
-                "id": author.id,
-                "name": author.name,
-                "email": author.email
-            } if author else None,
-            "author_name": author.name if author else None,
-            "region": post.region or (author.state if author else None),
-            "crop": post.crop,
-            "category": post.category,
-            "likes_count": post.likes_count if post.likes_count is not None else 0,
-            "comments_count": post.comments_count if post.comments_count is not None else 0,
-            "image_url": post.image_url,
-            "created_at": post.created_at,
-            "is_liked": is_liked
-        }
-        result.append(PostOut(**post_dict))
-    
-    return result
+    return await _serialize_posts(db, posts, current_user.id)
 
 
 # ============================================================================
@@ -400,51 +702,19 @@ async def get_user_posts(
     skip: int = 0,
     limit: int = 50,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all posts created by a specific user."""
     try:
         # Verify user exists
-        user = db.query(User).filter(User.id == user_id).first()
+        user = (await db.execute(select(User.id).where(User.id == user_id))).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Get posts by this user
-        posts = db.query(Post).filter(Post.author_id == user_id).order_by(desc(Post.created_at)).offset(skip).limit(limit).all()
+        posts = (await db.execute(user_posts_query(user_id).offset(skip).limit(limit))).scalars().all()
         
-        result = []
-        for post in posts:
-            # Get author info
-            author = db.query(User).filter(User.id == post.author_id).first()
-            
-            # Check if current user liked this post
-            is_liked = db.query(PostLike).filter(
-                PostLike.post_id == post.id,
-                PostLike.user_id == current_user.id
-            ).first() is not None
-            
-            post_dict = {
-                "id": post.id,
-                "content": post.content,
-                "author_id": post.author_id,
-                "author": {
-                    "id": author.id,
-                    "name": author.name,
-                    "email": author.email
-                } if author else None,
-                "author_name": author.name if author else None,
-                "region": post.region or (author.state if author else None),
-                "crop": post.crop,
-                "category": post.category,
-                "likes_count": post.likes_count if post.likes_count is not None else 0,
-                "comments_count": post.comments_count if post.comments_count is not None else 0,
-                "image_url": post.image_url,
-                "created_at": post.created_at,
-                "is_liked": is_liked
-            }
-            result.append(PostOut(**post_dict))
-        
-        return result
+        return await _serialize_posts(db, posts, current_user.id)
     except HTTPException:
         raise
     except Exception as e:
@@ -462,11 +732,11 @@ async def update_post(
     post_id: int,
     post_update: PostUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a post. Only the author can update their own post."""
     try:
-        post = db.query(Post).filter(Post.id == post_id).first()
+        post = await db.get(Post, post_id)
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
         
@@ -483,36 +753,17 @@ async def update_post(
             post.category = post_update.category
         if post_update.image_url is not None:
             post.image_url = post_update.image_url
+        if post_update.image_placeholder is not None:
+            post.image_placeholder = post_update.image_placeholder
         
-        db.commit()
-        db.refresh(post)
+        await db.commit()
+        await db.refresh(post)
+        if post.duplicate_of is None and post_update.content is not None:
+            dedup.duplicate_index.remove(post.id)
+            dedup.duplicate_index.add(post.id, post.author_id, dedup.signature(post.content), post.created_at)
         
         # Return updated post with author info
-        author = db.query(User).filter(User.id == post.author_id).first()
-        is_liked = db.query(PostLike).filter(
-            PostLike.post_id == post.id,
-            PostLike.user_id == current_user.id
-        ).first() is not None
-        
-        return PostOut(
-            id=post.id,
-            content=post.content,
-            author_id=post.author_id,
-            author={
-                "id": author.id,
-                "name": author.name,
-                "email": author.email
-            } if author else None,
-            author_name=author.name if author else None,
-            region=post.region,
-            crop=post.crop,
-            category=post.category,
-            likes_count=post.likes_count if post.likes_count is not None else 0,
-            comments_count=post.comments_count if post.comments_count is not None else 0,
-            image_url=post.image_url,
-            created_at=post.created_at,
-            is_liked=is_liked
-        )
+        return (await _serialize_posts(db, [post], current_user.id))[0]
     except HTTPException:
         raise
     except Exception as e:
@@ -525,11 +776,11 @@ async def update_post(
 async def delete_post(
     post_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a post. Only the author can delete their own post."""
     try:
-        post = db.query(Post).filter(Post.id == post_id).first()
+        post = (await db.execute(select(Post.author_id).where(Post.id == post_id))).first()
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
         
@@ -537,9 +788,12 @@ async def delete_post(
         if post.author_id != current_user.id:
             raise HTTPException(status_code=403, detail="You can only delete your own posts")
         
-        # Delete the post (cascade will handle likes and comments)
-        db.delete(post)
-        db.commit()
+        # Single DELETE; likes and comments go with it via ON DELETE CASCADE
+        await db.execute(delete(Post).where(Post.id == post_id).execution_options(synchronize_session=False))
+        await crud.record_user_activity(db, current_user, posts_delta=-1, touch=False)
+        await db.run_sync(crud.refresh_received_stats, author_ids=[current_user.id])
+        await db.commit()
+        dedup.duplicate_index.remove(post_id)
         
         return None
     except HTTPException:
@@ -558,7 +812,7 @@ async def delete_post(
 async def get_trending_topics(
     limit: int = 10,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get trending hashtags from all posts."""
     try:
@@ -566,15 +820,17 @@ async def get_trending_topics(
         from collections import Counter
         
         # Get all posts
-        posts = db.query(Post).all()
+        contents = (await db.execute(
+            select(Post.content).where(Post.duplicate_of.is_(None))
+        )).scalars().all()
         
         # Extract hashtags using regex
         hashtag_pattern = re.compile(r'#(\w+)')
         hashtags = []
         
-        for post in posts:
-            if post.content:
-                matches = hashtag_pattern.findall(post.content)
+        for content in contents:
+            if content:
+                matches = hashtag_pattern.findall(content)
                 hashtags.extend([tag.lower() for tag in matches])
         
         # Count frequency
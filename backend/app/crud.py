@@ -1,25 +1,35 @@
 """
-CRUD helpers to interact with the database for user records.
+CRUD helpers to interact with the database for user and community records.
 
-These helpers keep DB logic out of the router implementation.
+These helpers keep DB logic out of the router implementation. Helpers used
+by request handlers take an AsyncSession; the bulk statistics helpers also
+run from background threads and take a synchronous Session (call them from
+async code through `AsyncSession.run_sync`).
 """
+from sqlalchemy import case, delete, exists, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from . import models, schemas
-from passlib.context import CryptContext
+from .services.password_hasher import password_hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+async def get_user_by_email(db: AsyncSession, email: str):
+    return (await db.execute(select(models.User).where(models.User.email == email))).scalars().first()
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
 
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
 
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
 
+async def create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str | None = None):
+    """Insert a user, hashing the password on the hasher pool unless `hashed_password` is given.
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+    Raises PasswordHasherBusy when the hasher pool is saturated.
+    """
+    if hashed_password is None:
+        hashed_password = await password_hasher.hash(user.password)
     db_user = models.User(
         email=user.email,
         name=user.name,
@@ -33,14 +43,14 @@ def create_user(db: Session, user: schemas.UserCreate):
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
+async def update_user(db: AsyncSession, user_id: int, user_update: schemas.UserUpdate):
     """Update user profile fields."""
-    db_user = get_user(db, user_id)
+    db_user = await get_user(db, user_id)
     if not db_user:
         return None
     
@@ -49,19 +59,220 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
-    db.commit()
-    db.refresh(db_user)
+    if "state" in update_data or "crop" in update_data:
+        # Keep leaderboard filters in step with the profile
+        await db.execute(
+            update(models.UserStats)
+            .where(models.UserStats.user_id == user_id)
+            .values(region=db_user.state, crop=db_user.crop)
+        )
+    
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def delete_user(db: AsyncSession, user_id: int) -> bool:
+    """Delete a user account in one DELETE.
 
+    Posts, likes, comments and stats rows are removed by ON DELETE CASCADE.
+    Counters on other users' posts that this account liked or commented on
+    are adjusted set-wise first so they do not drift.
+    """
+    PostLike, Comment, Post = models.PostLike, models.Comment, models.Post
+    liked = select(PostLike.post_id).where(PostLike.user_id == user_id)
+    commented = select(Comment.post_id).where(Comment.user_id == user_id)
+    own_likes = (
+        select(func.count(PostLike.id))
+        .where(PostLike.post_id == Post.id, PostLike.user_id == user_id)
+        .scalar_subquery()
+    )
+    own_comments = (
+        select(func.count(Comment.id))
+        .where(Comment.post_id == Post.id, Comment.user_id == user_id)
+        .scalar_subquery()
+    )
+    others = Post.author_id != user_id
+    await db.execute(
+        update(Post)
+        .where(Post.id.in_(liked), others)
+        .values(likes_count=func.coalesce(Post.likes_count, 0) - own_likes)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(Post)
+        .where(Post.id.in_(commented), others)
+        .values(comments_count=func.coalesce(Post.comments_count, 0) - own_comments)
+        .execution_options(synchronize_session=False)
+    )
+    await db.run_sync(refresh_received_stats, post_ids=liked.union(commented))
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    return user
+    result = await db.execute(
+        delete(models.User)
+        .where(models.User.id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return bool(result.rowcount)
+
+
+# ============================================================================
+# Community counters
+# ============================================================================
+
+def _insert(db, model):
+    """Return a dialect-specific INSERT that supports ON CONFLICT clauses."""
+    if db.get_bind().dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+
+async def increment_post_counter(db: AsyncSession, post_id: int, column_name: str, delta: int):
+    """Apply `delta` to a post counter in a single UPDATE statement.
+
+    Returns the new counter value, or None if the post does not exist.
+    Decrements never take the counter below zero.
+    """
+    column = getattr(models.Post, column_name)
+    current = func.coalesce(column, 0)
+    if delta >= 0:
+        new_value = current + delta
+    else:
+        new_value = case((current + delta > 0, current + delta), else_=0)
+
+    return (await db.execute(
+        update(models.Post)
+        .where(models.Post.id == post_id)
+        .values({column: new_value})
+        .returning(column)
+    )).scalar_one_or_none()
+
+
+async def toggle_post_like(db: AsyncSession, post_id: int, user_id: int):
+    """Like or unlike a post without a read-check-write race.
+
+    The unlike path is a DELETE ... RETURNING and the like path an
+    INSERT ... ON CONFLICT DO NOTHING, so concurrent taps can neither
+    double-insert a like nor double-count it. Returns (likes_delta, is_liked)
+    for the caller to apply to `likes_count`; the caller commits.
+    """
+    removed = (await db.execute(
+        delete(models.PostLike)
+        .where(models.PostLike.post_id == post_id, models.PostLike.user_id == user_id)
+        .returning(models.PostLike.id)
+    )).first()
+    if removed:
+        return -1, False
+
+    inserted = (await db.execute(
+        _insert(db, models.PostLike)
+        .values(post_id=post_id, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=["post_id", "user_id"])
+        .returning(models.PostLike.id)
+    )).first()
+
+    # No row means a concurrent request inserted the same like first
+    return (1 if inserted else 0), True
+
+
+# ============================================================================
+# User statistics
+# ============================================================================
+
+async def record_user_activity(db: AsyncSession, user, posts_delta: int = 0, touch: bool = True):
+    """Upsert the user's stats row in the caller's transaction.
+
+    Applies `posts_delta` to posts_count and, if `touch` is set, stamps
+    last_active. Region and crop are refreshed from the user's profile.
+    """
+    stats = models.UserStats.__table__
+    stmt = _insert(db, models.UserStats).values(
+        user_id=user.id,
+        region=user.state,
+        crop=user.crop,
+        posts_count=max(posts_delta, 0),
+        likes_received=0,
+        comments_received=0,
+        last_active=func.now() if touch else None,
+    )
+    new_posts_count = stats.c.posts_count + posts_delta
+    set_ = {
+        "region": stmt.excluded.region,
+        "crop": stmt.excluded.crop,
+        "posts_count": case((new_posts_count > 0, new_posts_count), else_=0),
+    }
+    if touch:
+        set_["last_active"] = stmt.excluded.last_active
+    await db.execute(stmt.on_conflict_do_update(index_elements=["user_id"], set_=set_))
+
+
+def _received_totals():
+    """Correlated subqueries summing the counters of a stats row's posts."""
+    Post = models.Post
+    owner = Post.author_id == models.UserStats.user_id
+    likes = select(func.coalesce(func.sum(Post.likes_count), 0)).where(owner).scalar_subquery()
+    comments = select(func.coalesce(func.sum(Post.comments_count), 0)).where(owner).scalar_subquery()
+    return likes, comments
+
+
+def refresh_received_stats(db: Session, post_ids=None, author_ids=None) -> int:
+    """Recompute likes/comments received for the authors of the given posts.
+
+    This is the incremental path: only authors whose posts changed are
+    touched. The caller commits.
+    """
+    authors = set(author_ids or ())
+    if post_ids is not None:
+        authors.update(
+            row[0]
+            for row in db.execute(
+                select(models.Post.author_id).where(models.Post.id.in_(post_ids)).distinct()
+            )
+        )
+    if not authors:
+        return 0
+
+    likes, comments = _received_totals()
+    result = db.execute(
+        update(models.UserStats)
+        .where(models.UserStats.user_id.in_(authors))
+        .values(likes_received=likes, comments_received=comments)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def rebuild_user_stats(db: Session) -> int:
+    """Bulk-rebuild user_stats from users/posts, rewriting only drifted rows."""
+    User, Post, UserStats = models.User, models.Post, models.UserStats
+
+    db.execute(
+        insert(UserStats).from_select(
+            ["user_id", "region", "crop"],
+            select(User.id, User.state, User.crop).where(
+                ~exists().where(UserStats.user_id == User.id)
+            ),
+        )
+    )
+
+    owner = Post.author_id == UserStats.user_id
+    posts_count = select(func.count(Post.id)).where(owner).scalar_subquery()
+    last_post = select(func.max(Post.created_at)).where(owner).scalar_subquery()
+    likes, comments = _received_totals()
+    result = db.execute(
+        update(UserStats)
+        .where(
+            UserStats.posts_count.is_distinct_from(posts_count)
+            | UserStats.likes_received.is_distinct_from(likes)
+            | UserStats.comments_received.is_distinct_from(comments)
+        )
+        .values(
+            posts_count=posts_count,
+            likes_received=likes,
+            comments_received=comments,
+            last_active=func.coalesce(UserStats.last_active, last_post),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount or 0
@@ -4,14 +4,15 @@ Fusion Engine - Intelligence layer that merges data sources and generates adviso
 Combines weather (IMD), market prices (Agmarknet), and satellite imagery (Bhuvan)
 to provide crop advisories, pest alerts, and risk detection.
 """
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
 import json
 import os
 import sys
 import asyncio
+import hashlib
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Tuple, Optional
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 # Add backend directory to path for imports
 BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -25,6 +26,9 @@ from app.services.weather import get_realtime_weather
 from app.services.geocode import reverse_geocode
 from app.services.ndvi_synthetic import synthetic_ndvi, synthetic_ndvi_history
 from app.services.market_service import fetch_market_price
+from app.services.advisory_cache import advisory_cache, advisory_cache_key, seconds_until_refresh, snap_to_tile
+from app.utils.http_cache import etag_matches, not_modified, weak_etag
+from app.utils.responses import JSON_VARY, ORJSONResponse
 
 router = APIRouter(prefix="/fusion", tags=["Fusion Engine"])
 
@@ -39,6 +43,58 @@ MOCK_PATH = os.path.join(os.path.dirname(__file__), "mock_data")
 RULE_CACHE: Dict[str, Dict[str, Any]] = {}
 
 
+def _files_version(files: List[str], directories: Tuple[str, ...] = ()) -> str:
+    """Hash of the given data files (and every JSON file in `directories`)."""
+    digest = hashlib.sha256()
+    paths = list(files)
+    for directory in directories:
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".json"))
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as fp:
+                digest.update(fp.read())
+    return digest.hexdigest()[:16]
+
+
+# Versions of the static inputs, so edited rules or data never hit stale cache entries or ETags
+RULES_VERSION = _files_version(
+    [os.path.join(DATA_PATH, "crops_metadata.json"), os.path.join(DATA_PATH, "crop_health.json")],
+    (RULES_PATH, MOCK_PATH),
+)
+DASHBOARD_DATA_VERSION = _files_version([
+    os.path.join(DATA_PATH, name)
+    for name in ("alerts.json", "crop_health.json", "market_prices.json", "weather_data.json")
+])
+
+
+def fusion_cache_control(now: Optional[datetime] = None) -> str:
+    """Clients may reuse a response until the weather hour changes, then revalidate."""
+    return f"public, max-age={seconds_until_refresh(now)}, stale-while-revalidate=60"
+
+
+# Sections `fields=` can select; the dashboard only does the lookups its selected sections need
+DASHBOARD_SECTIONS = ("weather", "market", "alerts", "crop_health", "ndvi", "summary")
+ADVISORY_FIELDS = (
+    "analysis", "priority", "severity", "rule_score", "fired_rules", "recommendations",
+    "rule_breakdown", "data_sources", "last_updated", "summary", "alerts", "metrics",
+)
+
+
+def requested_fields(fields: Optional[str], available: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Names listed in a comma-separated `fields=` parameter, in `available` order (all when absent)."""
+    names = {name.strip().lower() for name in (fields or "").split(",") if name.strip()}
+    if not names:
+        return available
+    unknown = names.difference(available)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(available)}",
+        )
+    return tuple(name for name in available if name in names)
+
+
 def get_rules(rule_type: str) -> Dict[str, Any]:
     if rule_type not in RULE_CACHE:
         RULE_CACHE[rule_type] = load_rules(rule_type) or {}
@@ -68,6 +124,25 @@ INDIA_CENTROID_LAT = 22.59
 INDIA_CENTROID_LON = 78.96
 
 
+def location_tile(
+    location: str | None = None,
+    latitude: float | None = None,
+    longitude: float | None = None,
+    state: str | None = None,
+    district: str | None = None,
+    village: str | None = None,
+) -> Tuple[Optional[float], Optional[float], Tuple]:
+    """Tile-snapped coordinates (None without any) and the tile key for a request's location."""
+    lat, lon = parse_lat_lon(location)
+    if lat is None or lon is None:
+        lat, lon = latitude, longitude
+    if lat is not None and lon is not None:
+        lat, lon = snap_to_tile(lat, lon)
+        return lat, lon, (lat, lon)
+    # Without coordinates the lookup falls back on the place names
+    return None, None, (state, district, village)
+
+
 def parse_lat_lon(location: str | None) -> Tuple[Optional[float], Optional[float]]:
     if not location:
         return None, None
@@ -78,14 +153,12 @@ def parse_lat_lon(location: str | None) -> Tuple[Optional[float], Optional[float
         return None, None
 
 
-async def resolve_weather_context(
+def resolve_coordinates(
     location: str | None = None,
     latitude: float | None = None,
     longitude: float | None = None,
-    state: str | None = None,
-    district: str | None = None,
-    village: str | None = None,
-) -> Tuple[Dict[str, Any], Dict[str, Any], float, float]:
+) -> Tuple[float, float]:
+    """Coordinates to look up: `location`, then latitude/longitude, then the centre of India."""
     lat, lon = parse_lat_lon(location)
 
     if lat is None or lon is None:
@@ -94,36 +167,63 @@ async def resolve_weather_context(
 
     if lat is None or lon is None:
         lat, lon = INDIA_CENTROID_LAT, INDIA_CENTROID_LON
+    return lat, lon
 
-    fallback_weather = load_json_file(os.path.join(DATA_PATH, "weather_data.json"))
-
-    weather = await get_realtime_weather(lat, lon)
-    if not weather:
-        weather = _load_weather_from_fallback(fallback_weather, lat, lon)
-
-    try:
-        geo_info = await reverse_geocode(lat, lon)
-    except Exception:
-        lat, lon = INDIA_CENTROID_LAT, INDIA_CENTROID_LON
-        weather = await get_realtime_weather(lat, lon)
-        geo_info = {
-            "state": state,
-            "district": district,
-            "village": village,
-        }
 
-    if not geo_info:
-        geo_info = {
-            "state": state,
-            "district": district,
-            "village": village,
-        }
+async def resolve_place(
+    lat: float,
+    lon: float,
+    state: str | None = None,
+    district: str | None = None,
+    village: str | None = None,
+    ctx: Optional["FusionContext"] = None,
+    geocode: bool = True,
+) -> Dict[str, Any]:
+    """State/district/village at the coordinates, or the caller's place names without a geocode."""
+    geo_info = None
+    if geocode:
+        ctx = ctx or FusionContext()
+        try:
+            geo_info = await ctx.geocode(lat, lon)
+        except Exception:
+            geo_info = None
+    return geo_info or {"state": state, "district": district, "village": village}
+
+
+async def resolve_weather(lat: float, lon: float, ctx: Optional["FusionContext"] = None) -> Dict[str, Any]:
+    ctx = ctx or FusionContext()
+    fallback_weather = ctx.data_file(os.path.join(DATA_PATH, "weather_data.json"))
+    weather = await ctx.weather(lat, lon)
+    # Copied: the memoized lookup is shared with the rest of the request
+    weather = dict(weather) if weather else _load_weather_from_fallback(fallback_weather, lat, lon)
 
     if fallback_weather:
         weather.setdefault("forecast", fallback_weather.get("forecast"))
     weather.setdefault("timestamp", datetime.now(timezone.utc).isoformat())
     weather.setdefault("location", f"{lat},{lon}")
+    return weather
+
 
+async def resolve_weather_context(
+    location: str | None = None,
+    latitude: float | None = None,
+    longitude: float | None = None,
+    state: str | None = None,
+    district: str | None = None,
+    village: str | None = None,
+    ctx: Optional["FusionContext"] = None,
+    geocode: bool = True,
+) -> Tuple[Dict[str, Any], Dict[str, Any], float, float]:
+    """Weather and place for a request's location; `geocode=False` skips the reverse geocode."""
+    ctx = ctx or FusionContext()
+    lat, lon = resolve_coordinates(location, latitude, longitude)
+
+    # Both lookups only need the coordinates, so make them concurrently. A failed
+    # geocode keeps the weather already fetched; place names then come from the caller.
+    weather, geo_info = await asyncio.gather(
+        resolve_weather(lat, lon, ctx),
+        resolve_place(lat, lon, state, district, village, ctx=ctx, geocode=geocode),
+    )
     return weather, geo_info, lat, lon
 
 
@@ -143,7 +243,13 @@ def _load_weather_from_fallback(fallback_data: Dict[str, Any], lat: float, lon:
     return result
 
 
-async def fetch_ndvi_context(lat: float, lon: float, crop: str = "cotton"):
+async def fetch_ndvi_context(lat: float, lon: float, crop: str = "cotton", ctx: Optional["FusionContext"] = None):
+    if ctx is not None:
+        return ctx.ndvi(lat, lon, crop)
+    return _ndvi_context(lat, lon, crop)
+
+
+def _ndvi_context(lat: float, lon: float, crop: str):
     latest = synthetic_ndvi(lat, lon, crop)
     history = synthetic_ndvi_history(lat, lon, crop, days=7)
 
@@ -154,15 +260,56 @@ async def fetch_ndvi_context(lat: float, lon: float, crop: str = "cotton"):
     return latest, ndvi_change, history
 
 
-def load_crop_mock(crop_name: str) -> Dict[str, Any]:
+def load_crop_mock(crop_name: str, ctx: Optional["FusionContext"] = None) -> Dict[str, Any]:
     """Load mock data JSON for a given crop if available."""
     filename = f"{crop_name.lower()}.json"
     file_path = os.path.join(MOCK_PATH, filename)
     if os.path.exists(file_path):
-        return load_json_file(file_path)
+        return ctx.data_file(file_path) if ctx is not None else load_json_file(file_path)
     return {}
 
 
+class FusionContext:
+    """Lookups made while serving one request, each done at most once.
+
+    Create one per request and pass it down the pipeline: every helper that
+    needs the same weather, location, NDVI, market price or data file then
+    reuses the first result (concurrent callers share the pending lookup).
+    Results are shared, so treat them as read-only. `calls` counts the
+    lookups actually made, by kind.
+    """
+
+    def __init__(self):
+        self._results: Dict[Tuple, Any] = {}
+        self.calls: Counter = Counter()
+
+    def _once(self, key: Tuple, load: Callable[[], Any]) -> Any:
+        if key not in self._results:
+            self.calls[key[0]] += 1
+            self._results[key] = load()
+        return self._results[key]
+
+    def _once_async(self, key: Tuple, fetch: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+        return self._once(key, lambda: asyncio.ensure_future(fetch()))
+
+    def weather(self, lat: float, lon: float) -> Awaitable[Dict[str, Any]]:
+        return self._once_async(("weather", lat, lon), lambda: get_realtime_weather(lat, lon))
+
+    def geocode(self, lat: float, lon: float) -> Awaitable[Dict[str, Any]]:
+        return self._once_async(("geocode", lat, lon), lambda: reverse_geocode(lat, lon))
+
+    def market(self, crop: str, district: Optional[str]) -> Awaitable[Dict[str, Any]]:
+        crop = crop.lower()
+        return self._once_async(("market", crop, district), lambda: fetch_market_price(crop, district))
+
+    def ndvi(self, lat: float, lon: float, crop: str):
+        crop = crop.lower()
+        return self._once(("ndvi", lat, lon, crop), lambda: _ndvi_context(lat, lon, crop))
+
+    def data_file(self, path: str) -> Any:
+        return self._once(("data_file", path), lambda: load_json_file(path))
+
+
 def _to_float(value):
     try:
         return float(value)
@@ -362,6 +509,7 @@ def build_advisory_from_features(
 
 @router.get("/dashboard")
 async def get_dashboard_data(
+    request: Request,
     crop: Optional[str] = None,
     location: Optional[str] = None,
     latitude: Optional[float] = None,
@@ -369,57 +517,90 @@ async def get_dashboard_data(
     state: Optional[str] = None,
     district: Optional[str] = None,
     village: Optional[str] = None,
+    fields: Optional[str] = None,
 ):
     """
     Combine weather, market, and alert mock data for dashboard.
+
+    `fields` (e.g. `weather` or `weather,ndvi`) limits the response to those
+    sections and skips the lookups the others need: the home screen widget
+    asking for `weather` only pays for the weather lookup.
     """
+    sections = requested_fields(fields, DASHBOARD_SECTIONS)
+    # Everything the response depends on is known before any upstream call
+    now = datetime.now(timezone.utc)
+    # Looked up for the tile, like the advisory, so the body matches the tile-based ETag
+    tile_lat, tile_lon, tile = location_tile(location, latitude, longitude, state, district, village)
+    etag = weak_etag("dashboard", sections, *advisory_cache_key(crop or "", tile, DASHBOARD_DATA_VERSION, now))
+    cache_control = fusion_cache_control(now)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control, JSON_VARY)
+
     try:
-        weather, geo_info, lat, lon = await resolve_weather_context(
-            location=location,
-            latitude=latitude,
-            longitude=longitude,
-            state=state,
-            district=district,
-            village=village,
-        )
-        crop_name_for_ndvi = crop.lower() if crop else "cotton"
-        ndvi_latest, ndvi_change, ndvi_history = await fetch_ndvi_context(lat, lon, crop_name_for_ndvi)
-        
-        # Fetch real market prices with fallback
-        market_data = {}
-        if crop:
-            market_price_data = await fetch_market_price(crop, geo_info.get("district"))
-            market_data[crop.lower()] = market_price_data
+        ctx = FusionContext()
+        # The district is only looked up for a crop's market price
+        geocode = "market" in sections and bool(crop)
+        lat, lon = resolve_coordinates(latitude=tile_lat, longitude=tile_lon)
+        if "weather" in sections:
+            weather, geo_info, lat, lon = await resolve_weather_context(
+                latitude=tile_lat,
+                longitude=tile_lon,
+                state=state,
+                district=district,
+                village=village,
+                ctx=ctx,
+                geocode=geocode,
+            )
         else:
-            # Load all crops from fallback if no specific crop
-            market_data = load_json_file(os.path.join(DATA_PATH, "market_prices.json"))
-        
-        alerts = load_json_file(os.path.join(DATA_PATH, "alerts.json"))
-        crop_health = load_json_file(os.path.join(DATA_PATH, "crop_health.json"))
-
-        total_alerts = len(alerts) if isinstance(alerts, list) else 0
-        high_priority_alerts = [
-            alert for alert in alerts
-            if isinstance(alert, dict) and alert.get("level") == "high"
-        ] if isinstance(alerts, list) else []
-
-        response_data = {
-            "weather": weather,
-            "market": market_data,
-            "alerts": alerts,
-            "crop_health": crop_health,
-            "ndvi": {
+            weather = None
+            geo_info = await resolve_place(lat, lon, state, district, village, ctx=ctx, geocode=geocode)
+
+        response_data: Dict[str, Any] = {}
+        if weather is not None:
+            response_data["weather"] = weather
+
+        if "market" in sections:
+            # Fetch real market prices with fallback
+            market_data = {}
+            if crop:
+                market_price_data = await ctx.market(crop, geo_info.get("district"))
+                market_data[crop.lower()] = market_price_data
+            else:
+                # Load all crops from fallback if no specific crop
+                market_data = ctx.data_file(os.path.join(DATA_PATH, "market_prices.json"))
+            response_data["market"] = market_data
+
+        if "alerts" in sections or "summary" in sections:
+            alerts = ctx.data_file(os.path.join(DATA_PATH, "alerts.json"))
+        if "crop_health" in sections or "summary" in sections:
+            crop_health = ctx.data_file(os.path.join(DATA_PATH, "crop_health.json"))
+        if "alerts" in sections:
+            response_data["alerts"] = alerts
+        if "crop_health" in sections:
+            response_data["crop_health"] = crop_health
+
+        if "ndvi" in sections:
+            crop_name_for_ndvi = crop.lower() if crop else "cotton"
+            ndvi_latest, ndvi_change, ndvi_history = await fetch_ndvi_context(lat, lon, crop_name_for_ndvi, ctx=ctx)
+            response_data["ndvi"] = {
                 "latest": ndvi_latest,
                 "change": ndvi_change,
                 "history": ndvi_history,
-            },
-            "summary": {
+            }
+
+        if "summary" in sections:
+            total_alerts = len(alerts) if isinstance(alerts, list) else 0
+            high_priority_alerts = [
+                alert for alert in alerts
+                if isinstance(alert, dict) and alert.get("level") == "high"
+            ] if isinstance(alerts, list) else []
+            response_data["summary"] = {
                 "total_alerts": total_alerts,
                 "high_priority_count": len(high_priority_alerts),
                 "crops_monitored": len(crop_health) if isinstance(crop_health, dict) else 0,
-            },
-            "timestamp": weather.get("timestamp"),
-        }
+            }
+
+        response_data["timestamp"] = weather.get("timestamp") if weather is not None else now.isoformat()
 
         if crop:
             response_data["user_crop"] = crop.lower()
@@ -427,103 +608,172 @@ async def get_dashboard_data(
             response_data["user_district"] = geo_info.get("district")
         response_data["coordinates"] = {"latitude": lat, "longitude": lon}
 
-        return JSONResponse(response_data)
+        return ORJSONResponse(response_data, headers={"ETag": etag, "Cache-Control": cache_control})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading dashboard data: {str(e)}")
 
 
+async def assemble_advisory(
+    crop: str,
+    weather: Dict[str, Any],
+    geo_info: Dict[str, Any],
+    lat: float,
+    lon: float,
+    ctx: "FusionContext",
+) -> Dict[str, Any]:
+    """Advisory data for one farm from resolved weather and location."""
+    ndvi_latest, ndvi_change, ndvi_history = await fetch_ndvi_context(lat, lon, crop, ctx=ctx)
+    # Fetch real market price
+    market = await ctx.market(crop, geo_info.get("district"))
+    user_context = {
+        "user_district": geo_info.get("district"),
+        "district": geo_info.get("district"),
+        "state": geo_info.get("state"),
+        "location": weather.get("location"),
+        "ndvi": ndvi_latest,
+        "ndvi_change": ndvi_change,
+    }
+
+    # Check for mock data
+    mock = load_crop_mock(crop, ctx=ctx)
+    if mock:
+        features = {
+            "temperature": weather.get("temperature"),
+            "humidity": weather.get("humidity"),
+            "rainfall": weather.get("rainfall"),
+            "wind_speed": weather.get("wind_speed"),
+            "ndvi": ndvi_latest if ndvi_latest is not None else mock.get("ndvi"),
+            "soil_moisture": mock.get("soil_moisture"),
+            "crop_stage": mock.get("crop_stage", "unknown"),
+            "price_change_percent": market.get("price_change_percent", 0),
+            "market_price": market.get("price") or mock.get("market_price"),
+            "days_since_sowing": mock.get("days_since_sowing"),
+            "previous_ndvi": mock.get("previous_ndvi") or mock.get("ndvi_previous"),
+            "ndvi_change": (
+                ndvi_change
+                if ndvi_change is not None
+                else compute_ndvi_change(
+                    ndvi_latest,
+                    mock.get("previous_ndvi") or mock.get("ndvi_previous")
+                )
+            ),
+            "user_district": mock.get("district") or geo_info.get("district"),
+            "district": mock.get("district") or geo_info.get("district"),
+        }
+
+        fields, score, fired_rules, breakdown = build_advisory_from_features(crop, features, user_context)
+        legacy_priority = "High" if score >= 0.8 else ("Medium" if score >= 0.6 else "Low")
+        advisory_data = {
+            "crop": crop.capitalize(),
+            "analysis": fields["summary"],
+            "priority": legacy_priority,
+            "severity": fields["severity"].capitalize(),
+            "rule_score": score,
+            "fired_rules": fired_rules,
+            "recommendations": [],
+            "rule_breakdown": breakdown,
+            "data_sources": {"weather": "Open-Meteo", "satellite": "Bhuvan", "market": "Agmarknet"},
+            "last_updated": weather.get("timestamp", "recently"),
+            "summary": fields["summary"],
+            "alerts": fields["alerts"],
+            "metrics": fields["metrics"],
+        }
+        if advisory_data.get("metrics") is not None and ndvi_history:
+            advisory_data["metrics"]["ndvi_history"] = ndvi_history
+        return advisory_data
+
+    # Use generate_advisory for non-mock crops
+    advisory_data = await generate_advisory(
+        crop,
+        weather,
+        user_context,
+        ndvi_latest=ndvi_latest,
+        ndvi_change=ndvi_change,
+        ndvi_history=ndvi_history,
+        ctx=ctx,
+    )
+    if ndvi_history and isinstance(advisory_data.get("metrics"), dict):
+        advisory_data["metrics"]["ndvi_history"] = ndvi_history
+    return advisory_data
+
+
+async def compute_advisory(
+    crop_name: str,
+    location: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    state: Optional[str] = None,
+    district: Optional[str] = None,
+    village: Optional[str] = None,
+    ctx: Optional[FusionContext] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Advisory for a crop at a location, computed at most once per location tile and weather hour.
+
+    The result is shared through the advisory cache and must not be mutated.
+    Pass the request's `ctx` to share lookups with other work in the same request.
+    """
+    ctx = ctx or FusionContext()
+    crop = crop_name.lower()
+    # Compute for the tile, so every farm in it gets the same advisory whichever asked first
+    lat, lon, tile = location_tile(location, latitude, longitude, state, district, village)
+
+    async def compute() -> Dict[str, Any]:
+        weather, geo_info, weather_lat, weather_lon = await resolve_weather_context(
+            latitude=lat,
+            longitude=lon,
+            state=state,
+            district=district,
+            village=village,
+            ctx=ctx,
+        )
+        return await assemble_advisory(crop, weather, geo_info, weather_lat, weather_lon, ctx)
+
+    key = advisory_cache_key(crop, tile, RULES_VERSION, now)
+    return await advisory_cache.get_or_compute(key, compute)
+
+
 @router.get("/advisory/{crop_name}")
 async def get_advisory(
     crop_name: str,
+    request: Request,
     location: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     state: Optional[str] = None,
     district: Optional[str] = None,
     village: Optional[str] = None,
+    fields: Optional[str] = None,
 ):
-    """Return advisory for a given crop using realtime weather."""
+    """Return advisory for a given crop using realtime weather.
+
+    `fields` (e.g. `priority,alerts`) trims the response to those keys plus
+    `crop`. Every rule reads weather, NDVI and market data, so the advisory
+    itself is still computed (and cached) in full.
+    """
+    selected = requested_fields(fields, ADVISORY_FIELDS)
+    # The ETag follows the advisory cache key, so a revalidation needs no upstream work
+    now = datetime.now(timezone.utc)
+    _, _, tile = location_tile(location, latitude, longitude, state, district, village)
+    etag = weak_etag("advisory", selected, *advisory_cache_key(crop_name, tile, RULES_VERSION, now))
+    cache_control = fusion_cache_control(now)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control, JSON_VARY)
+
     try:
-        crop = crop_name.lower()
-        weather, geo_info, lat, lon = await resolve_weather_context(
+        advisory = await compute_advisory(
+            crop_name,
             location=location,
             latitude=latitude,
             longitude=longitude,
             state=state,
             district=district,
             village=village,
+            now=now,
         )
-        ndvi_latest, ndvi_change, ndvi_history = await fetch_ndvi_context(lat, lon, crop)
-        user_context = {
-            "user_district": geo_info.get("district"),
-            "district": geo_info.get("district"),
-            "state": geo_info.get("state"),
-            "location": weather.get("location"),
-            "ndvi": ndvi_latest,
-            "ndvi_change": ndvi_change,
-        }
-
-        # Fetch real market price
-        market = await fetch_market_price(crop, geo_info.get("district"))
-        
-        mock = load_crop_mock(crop)
-        if mock:
-            features = {
-                "temperature": weather.get("temperature"),
-                "humidity": weather.get("humidity"),
-                "rainfall": weather.get("rainfall"),
-                "wind_speed": weather.get("wind_speed"),
-                "ndvi": ndvi_latest if ndvi_latest is not None else mock.get("ndvi"),
-                "soil_moisture": mock.get("soil_moisture"),
-                "crop_stage": mock.get("crop_stage", "unknown"),
-                "price_change_percent": market.get("price_change_percent", 0),
-                "market_price": market.get("price") or mock.get("market_price"),
-                "days_since_sowing": mock.get("days_since_sowing"),
-                "previous_ndvi": mock.get("previous_ndvi") or mock.get("ndvi_previous"),
-                "ndvi_change": (
-                    ndvi_change
-                    if ndvi_change is not None
-                    else compute_ndvi_change(
-                        ndvi_latest,
-                        mock.get("previous_ndvi") or mock.get("ndvi_previous")
-                    )
-                ),
-                "user_district": mock.get("district") or geo_info.get("district"),
-                "district": mock.get("district") or geo_info.get("district"),
-            }
-
-            fields, score, fired_rules, breakdown = build_advisory_from_features(crop, features, user_context)
-            legacy_priority = "High" if score >= 0.8 else ("Medium" if score >= 0.6 else "Low")
-            response = {
-                "crop": crop.capitalize(),
-                "analysis": fields["summary"],
-                "priority": legacy_priority,
-                "severity": fields["severity"].capitalize(),
-                "rule_score": score,
-                "fired_rules": fired_rules,
-                "recommendations": [],
-                "rule_breakdown": breakdown,
-                "data_sources": {"weather": "Open-Meteo", "satellite": "Bhuvan", "market": "Agmarknet"},
-                "last_updated": weather.get("timestamp", "recently"),
-                "summary": fields["summary"],
-                "alerts": fields["alerts"],
-                "metrics": fields["metrics"],
-            }
-            if response.get("metrics") is not None and ndvi_history:
-                response["metrics"]["ndvi_history"] = ndvi_history
-            return JSONResponse(response)
-
-        advisory = await generate_advisory(
-            crop,
-            weather,
-            user_context,
-            ndvi_latest=ndvi_latest,
-            ndvi_change=ndvi_change,
-            ndvi_history=ndvi_history,
-        )
-        if ndvi_history and isinstance(advisory.get("metrics"), dict):
-            advisory["metrics"]["ndvi_history"] = ndvi_history
-        return JSONResponse(advisory)
+        if selected != ADVISORY_FIELDS:
+            advisory = {"crop": advisory.get("crop"), **{name: advisory[name] for name in selected if name in advisory}}
+        return ORJSONResponse(advisory, headers={"ETag": etag, "Cache-Control": cache_control})
 
     except HTTPException:
         raise
@@ -531,9 +781,12 @@ async def get_advisory(
         raise HTTPException(status_code=500, detail=f"Error generating advisory: {str(e)}")
 
 
-async def enhance_advisory_with_rules(advisory: Dict[str, Any], crop_name: str) -> Dict[str, Any]:
+async def enhance_advisory_with_rules(
+    advisory: Dict[str, Any], crop_name: str, ctx: Optional[FusionContext] = None
+) -> Dict[str, Any]:
     """Enhance pre-generated advisory with metadata-aware rule evaluation."""
     try:
+        ctx = ctx or FusionContext()
         crop = crop_name.lower()
         metrics = advisory.get("metrics") if isinstance(advisory.get("metrics"), dict) else {}
         location_hint = metrics.get("location") if isinstance(metrics, dict) else None
@@ -542,12 +795,13 @@ async def enhance_advisory_with_rules(advisory: Dict[str, Any], crop_name: str)
             state=advisory.get("state"),
             district=advisory.get("district"),
             village=advisory.get("village"),
+            ctx=ctx,
         )
-        ndvi_latest, ndvi_change, ndvi_history = await fetch_ndvi_context(lat, lon, crop)
-        crop_health_data = load_json_file(os.path.join(DATA_PATH, "crop_health.json"))
+        ndvi_latest, ndvi_change, ndvi_history = await fetch_ndvi_context(lat, lon, crop, ctx=ctx)
+        crop_health_data = ctx.data_file(os.path.join(DATA_PATH, "crop_health.json"))
         
         # Fetch real market price with fallback
-        market = await fetch_market_price(crop, geo_info.get("district"))
+        market = await ctx.market(crop, geo_info.get("district"))
 
         crop_health = crop_health_data.get(crop, {})
 
@@ -596,15 +850,17 @@ async def generate_advisory(
     ndvi_latest: Optional[float] = None,
     ndvi_change: Optional[float] = None,
     ndvi_history: Optional[List[Dict[str, Any]]] = None,
+    ctx: Optional[FusionContext] = None,
 ) -> Dict[str, Any]:
     """Generate advisory dynamically for crops without pre-generated files."""
     try:
+        ctx = ctx or FusionContext()
         crop = crop_name.lower()
-        crop_health_data = load_json_file(os.path.join(DATA_PATH, "crop_health.json"))
+        crop_health_data = ctx.data_file(os.path.join(DATA_PATH, "crop_health.json"))
         
         # Fetch real market price with fallback
         district = user_context.get("district") or user_context.get("user_district")
-        market = await fetch_market_price(crop_name, district)
+        market = await ctx.market(crop_name, district)
 
         crop_health = crop_health_data.get(crop, {})
 
@@ -691,7 +947,7 @@ async def generate_advisory(
 @router.get("/health")
 async def health_check():
     """Health check endpoint for the fusion engine."""
-    return JSONResponse({
+    return ORJSONResponse({
         "status": "healthy",
         "service": "Fusion Engine",
         "data_sources": ["IMD Weather", "Bhuvan Satellite", "Agmarknet Market"]
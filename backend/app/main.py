@@ -1,19 +1,60 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .database import Base, engine
-from . import fusion_engine, auth, community, ai
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from .database import engine, pool_metrics, request_pool
+from . import fusion_engine, auth, community, ai, schema_migrations
 from .routes import advisory_pdf
+from .services import counter_buffer, dedup, image_pipeline, image_storage, pubsub
+from .services.password_hasher import password_hasher
+from .services.advisory_cache import advisory_cache
+from .services.pdf_cache import pdf_cache
+from .services.pdf_renderer import pdf_renderer
+from .services.user_cache import user_cache
+from .utils.body_limit import BodySizeLimitMiddleware
+from .utils.compression import CompressionMiddleware
+from .utils.responses import MessagePackMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Refuse to serve against an out-of-date schema (or migrate it, see DB_AUTO_MIGRATE)
+    await asyncio.to_thread(schema_migrations.check_schema, engine)
+
+    # Near-duplicate detection index is held in memory; load recent posts
+    await asyncio.to_thread(dedup.rebuild_with_session)
+
+    # Background jobs: write-behind engagement counters and orphaned image cleanup
+    tasks = [
+        asyncio.create_task(counter_buffer.flush_loop()),
+        asyncio.create_task(counter_buffer.reconcile_loop()),
+        asyncio.create_task(image_storage.gc_loop()),
+    ]
+    await pubsub.broker.start()
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await pubsub.broker.stop()
+        await counter_buffer.shutdown_flush()
+        image_pipeline.shutdown()
+        password_hasher.shutdown()
+        pdf_renderer.shutdown()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="krushiRakshak Backend API",
     description="Backend API for krushiRakshak PWA — Farmer advisory and risk management system",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # -------------------------------------------------------------------
@@ -32,6 +73,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -------------------------------------------------------------------
+# 📦 Payload size: MessagePack for clients that ask, then gzip/Brotli
+# (middleware added last runs first, so compression sees the final bytes)
+# -------------------------------------------------------------------
+app.add_middleware(MessagePackMiddleware)
+app.add_middleware(CompressionMiddleware)
+
+# Oversized uploads are refused before FastAPI spools the form to disk
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={f"{community.router.prefix}/upload-image": community.MAX_UPLOAD_REQUEST_SIZE},
+)
+
 # -------------------------------------------------------------------
 # 🔌 Include routers
 # -------------------------------------------------------------------
@@ -41,6 +95,18 @@ app.include_router(community.router)
 app.include_router(ai.router)
 app.include_router(advisory_pdf.router)
 
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # Every database connection stayed busy for DB_POOL_TIMEOUT; shed load instead of a 500
+    request_pool.record_timeout()
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "2"},
+    )
+
+
 # -------------------------------------------------------------------
 # 🌐 Root Route
 # -------------------------------------------------------------------
@@ -49,6 +115,23 @@ def root():
     return {"message": "Welcome to krushiRakshak Backend API"}
 
 
+# -------------------------------------------------------------------
+# 📊 Worker Metrics
+# -------------------------------------------------------------------
+@app.get("/metrics")
+def metrics():
+    """Per-worker pool and cache statistics."""
+    return {
+        "password_hasher": password_hasher.metrics(),
+        "pdf_renderer": pdf_renderer.metrics(),
+        "pdf_cache": pdf_cache.stats(),
+        "advisory_cache": advisory_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "realtime_subscribers": pubsub.broker.subscriber_count,
+        "db_pool": pool_metrics(),
+    }
+
+
 # -------------------------------------------------------------------
 # ⚙️ To Run the Server:
 # -------------------------------------------------------------------
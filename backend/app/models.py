@@ -3,7 +3,7 @@ SQLAlchemy ORM models.
 
 Defines the `User` model used to store authentication information.
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, ForeignKey, Text
+from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime, func, ForeignKey, Text, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -26,36 +26,65 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationship to posts
-    posts = relationship("Post", back_populates="author_user", cascade="all, delete-orphan")
+    # Child rows are removed by ON DELETE CASCADE, not loaded and deleted one by one
+    posts = relationship("Post", back_populates="author_user", cascade="all, delete-orphan", passive_deletes=True)
+
+
+LISTED_POST = text("duplicate_of IS NULL")
 
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Feed segments (see services/feed_ranking.py) are read in rank order off these
+        Index("ix_posts_rank_score", "rank_score"),
+        Index("ix_posts_crop_rank_score", "crop", "rank_score"),
+        Index("ix_posts_region_rank_score", "region", "rank_score"),
+        Index("ix_posts_crop_region_rank_score", "crop", "region", "rank_score"),
+        # Newest-first listings (/community/posts, search) only show posts that are not duplicates
+        Index("ix_posts_created_at", "created_at", postgresql_where=LISTED_POST, sqlite_where=LISTED_POST),
+        Index("ix_posts_crop_created_at", "crop", "created_at", postgresql_where=LISTED_POST, sqlite_where=LISTED_POST),
+        Index(
+            "ix_posts_category_created_at", "category", "created_at",
+            postgresql_where=LISTED_POST, sqlite_where=LISTED_POST,
+        ),
+        # A user's posts, newest first; also the author side of cascades and stats refreshes
+        Index("ix_posts_author_id_created_at", "author_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     region = Column(String, nullable=True)  # State/region of the author
     crop = Column(String, nullable=True)  # Crop type (rice, wheat, cotton, etc.)
     category = Column(String, nullable=True)  # Post category (tip, question, issue, success)
     likes_count = Column(Integer, default=0)
     comments_count = Column(Integer, default=0)
     image_url = Column(String, nullable=True)  # URL to uploaded image
+    image_placeholder = Column(Text, nullable=True)  # Tiny blurred data URI shown while the image loads
+    duplicate_of = Column(Integer, ForeignKey("posts.id", ondelete="SET NULL"), nullable=True, index=True)  # Near-duplicate of this post; hidden from feeds
+    rank_score = Column(Float, nullable=False, default=0, server_default="0")  # Feed ranking, see services/feed_ranking.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     author_user = relationship("User", back_populates="posts")
-    likes = relationship("PostLike", back_populates="post", cascade="all, delete-orphan")
-    comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
+    likes = relationship("PostLike", back_populates="post", cascade="all, delete-orphan", passive_deletes=True)
+    comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class PostLike(Base):
     __tablename__ = "post_likes"
+    __table_args__ = (
+        # One like per user per post; also the conflict target for atomic toggling
+        UniqueConstraint("post_id", "user_id", name="uq_post_likes_post_user"),
+        # Which of these posts has the viewer liked / everything a user liked (index-only)
+        Index("ix_post_likes_user_id_post_id", "user_id", "post_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -64,13 +93,40 @@ class PostLike(Base):
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        # A post's comments in order; also the per-post counts in counter reconciliation
+        Index("ix_comments_post_id_created_at", "post_id", "created_at"),
+        Index("ix_comments_user_id_post_id", "user_id", "post_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     post = relationship("Post", back_populates="comments")
+
+
+class UserStats(Base):
+    """Per-user community statistics, maintained incrementally.
+
+    `region` and `crop` mirror the user's profile so leaderboards can be
+    filtered and ordered straight off an index.
+    """
+    __tablename__ = "user_stats"
+    __table_args__ = (
+        Index("ix_user_stats_posts_count", "posts_count"),
+        Index("ix_user_stats_region_posts_count", "region", "posts_count"),
+        Index("ix_user_stats_crop_posts_count", "crop", "posts_count"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    region = Column(String, nullable=True)  # users.state
+    crop = Column(String, nullable=True)  # users.crop
+    posts_count = Column(Integer, nullable=False, default=0, server_default="0")
+    likes_received = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_received = Column(Integer, nullable=False, default=0, server_default="0")
+    last_active = Column(DateTime(timezone=True), nullable=True)  # Last post or comment
@@ -2,59 +2,56 @@
 PDF Generator for Advisory Reports
 Generates beautiful, structured PDF reports for crop advisories.
 """
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
-from io import BytesIO
-from typing import Dict, Any, Optional
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import logging
+import re
 import sys
 import os
 
+from sqlalchemy import func, select
+
 # Add backend directory to path for imports
 BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 sys.path.insert(0, BACKEND_DIR)
 
 # Import advisory generation logic
-from app.fusion_engine import (
-    resolve_weather_context,
-    fetch_ndvi_context,
-    fetch_market_price,
-    load_crop_mock,
-    build_advisory_from_features,
-    generate_advisory,
-    compute_ndvi_change,
-)
+from app.fusion_engine import FusionContext, compute_advisory
+from app.auth import oauth2_scheme, user_from_token
+from app.database import AsyncSessionLocal
+from app.models import User
+from app.schemas import BulkReportFarm, BulkReportRequest
+from app.services.pdf_cache import advisory_key, pdf_cache
+from app.services.pdf_renderer import PdfRendererBusy, pdf_renderer
+from app.utils.http_cache import etag_matches, not_modified
+from app.utils.zip_stream import ZipStream
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/advisory", tags=["Advisory PDF"])
 
+# Browsers keep the PDF but revalidate it; unchanged advisories get a 304
+PDF_CACHE_CONTROL = "private, no-cache"
 
-def format_date(date_string: Optional[str]) -> str:
-    """Format date string for display."""
-    if not date_string or date_string == "recently":
-        return "Recently"
-    try:
-        # Try to parse ISO format or other common formats
-        if isinstance(date_string, str):
-            # Handle various date formats
-            if "T" in date_string:
-                date_obj = datetime.fromisoformat(date_string.replace("Z", "+00:00"))
-            else:
-                date_obj = datetime.strptime(date_string, "%Y-%m-%d %H:%M:%S")
-            return date_obj.strftime("%B %d, %Y at %I:%M %p")
-    except:
-        pass
-    return str(date_string)
+BULK_REPORT_MAX_FARMS = int(os.getenv("BULK_REPORT_MAX_FARMS", "500"))
+# A single combined PDF is laid out in one piece, so it is capped lower than ZIPs
+BULK_PDF_MAX_SECTIONS = int(os.getenv("BULK_PDF_MAX_SECTIONS", "100"))
+# Farms worked on at once in a bulk report; bounds memory to this many PDFs in flight
+BULK_REPORT_CONCURRENCY = int(os.getenv("BULK_REPORT_CONCURRENCY", str(max(2, pdf_renderer.workers * 2))))
+# Bulk renders wait for room in the render queue instead of failing mid-stream
+BULK_RENDER_RETRY_SECONDS = 1.0
+BULK_RENDER_MAX_RETRIES = 60
+# Roles allowed to pull reports (names, villages, crops) for every registered farmer in a district
+BULK_DISTRICT_ROLES = frozenset({"expert", "officer", "admin"})
 
 
 @router.get("/pdf/{crop_name}")
 async def generate_advisory_pdf(
     crop_name: str,
+    request: Request,
     location: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
@@ -67,9 +64,9 @@ async def generate_advisory_pdf(
     Fetches advisory data using existing logic and formats it as PDF.
     """
     try:
-        # Fetch advisory data using existing internal logic (same as get_advisory endpoint)
-        crop = crop_name.lower()
-        weather, geo_info, lat, lon = await resolve_weather_context(
+        # Same (cached) advisory the JSON endpoint returns
+        advisory_data = await compute_advisory(
+            crop_name,
             location=location,
             latitude=latitude,
             longitude=longitude,
@@ -77,282 +74,34 @@ async def generate_advisory_pdf(
             district=district,
             village=village,
         )
-        ndvi_latest, ndvi_change, ndvi_history = await fetch_ndvi_context(lat, lon, crop)
-        user_context = {
-            "user_district": geo_info.get("district"),
-            "district": geo_info.get("district"),
-            "state": geo_info.get("state"),
-            "location": weather.get("location"),
-            "ndvi": ndvi_latest,
-            "ndvi_change": ndvi_change,
-        }
-
-        # Fetch real market price
-        market = await fetch_market_price(crop, geo_info.get("district"))
-        
-        # Check for mock data
-        mock = load_crop_mock(crop)
-        if mock:
-            features = {
-                "temperature": weather.get("temperature"),
-                "humidity": weather.get("humidity"),
-                "rainfall": weather.get("rainfall"),
-                "wind_speed": weather.get("wind_speed"),
-                "ndvi": ndvi_latest if ndvi_latest is not None else mock.get("ndvi"),
-                "soil_moisture": mock.get("soil_moisture"),
-                "crop_stage": mock.get("crop_stage", "unknown"),
-                "price_change_percent": market.get("price_change_percent", 0),
-                "market_price": market.get("price") or mock.get("market_price"),
-                "days_since_sowing": mock.get("days_since_sowing"),
-                "previous_ndvi": mock.get("previous_ndvi") or mock.get("ndvi_previous"),
-                "ndvi_change": (
-                    ndvi_change
-                    if ndvi_change is not None
-                    else compute_ndvi_change(
-                        ndvi_latest,
-                        mock.get("previous_ndvi") or mock.get("ndvi_previous")
-                    )
-                ),
-                "user_district": mock.get("district") or geo_info.get("district"),
-                "district": mock.get("district") or geo_info.get("district"),
-            }
 
-            fields, score, fired_rules, breakdown = build_advisory_from_features(crop, features, user_context)
-            legacy_priority = "High" if score >= 0.8 else ("Medium" if score >= 0.6 else "Low")
-            advisory_data = {
-                "crop": crop.capitalize(),
-                "analysis": fields["summary"],
-                "priority": legacy_priority,
-                "severity": fields["severity"].capitalize(),
-                "rule_score": score,
-                "fired_rules": fired_rules,
-                "recommendations": [],
-                "rule_breakdown": breakdown,
-                "data_sources": {"weather": "Open-Meteo", "satellite": "Bhuvan", "market": "Agmarknet"},
-                "last_updated": weather.get("timestamp", "recently"),
-                "summary": fields["summary"],
-                "alerts": fields["alerts"],
-                "metrics": fields["metrics"],
-            }
-            if advisory_data.get("metrics") is not None and ndvi_history:
-                advisory_data["metrics"]["ndvi_history"] = ndvi_history
-        else:
-            # Use generate_advisory for non-mock crops
-            advisory_data = await generate_advisory(
-                crop,
-                weather,
-                user_context,
-                ndvi_latest=ndvi_latest,
-                ndvi_change=ndvi_change,
-                ndvi_history=ndvi_history,
+        # Identical advisory data gives an identical report: serve it from the cache
+        key = advisory_key(advisory_data, crop_name)
+        etag = f'"{key}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag, PDF_CACHE_CONTROL)
+
+        # Otherwise lay it out in the render pool; the event loop keeps serving other requests
+        try:
+            pdf_bytes = await pdf_cache.get_or_render(key, lambda: pdf_renderer.render(advisory_data, crop_name))
+        except PdfRendererBusy:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many reports are being generated, please retry shortly",
+                headers={"Retry-After": "5"},
             )
-            if ndvi_history and isinstance(advisory_data.get("metrics"), dict):
-                advisory_data["metrics"]["ndvi_history"] = ndvi_history
-        
-        # Generate PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        
-        # Container for PDF content
-        story = []
-        
-        # Define styles
-        styles = getSampleStyleSheet()
-        
-        # Title style (Blue)
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#0D6EFD'),
-            spaceAfter=12,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Section header style (Green)
-        section_style = ParagraphStyle(
-            'CustomSection',
-            parent=styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#198754'),
-            spaceAfter=12,
-            spaceBefore=12,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Normal text style
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.black,
-            spaceAfter=6,
-            alignment=TA_JUSTIFY,
-            leading=14
-        )
-        
-        # Card style for recommendations
-        card_style = ParagraphStyle(
-            'CardStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.black,
-            spaceAfter=8,
-            leftIndent=12,
-            rightIndent=12,
-            backColor=colors.HexColor('#F0F8FF'),
-            borderPadding=8
-        )
-        
-        # Footer style (Italic)
-        footer_style = ParagraphStyle(
-            'FooterStyle',
-            parent=styles['Normal'],
-            fontSize=9,
-            textColor=colors.grey,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Oblique'
-        )
-        
-        # Build PDF content
-        
-        # Title
-        crop_name_display = advisory_data.get('crop', crop_name.capitalize())
-        title_text = f"Crop Advisory Report: {crop_name_display}"
-        story.append(Paragraph(title_text, title_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Priority and Severity badges
-        priority = advisory_data.get('priority', 'N/A')
-        severity = advisory_data.get('severity', 'N/A')
-        priority_text = f"<b>Priority:</b> {priority} | <b>Severity:</b> {severity}"
-        story.append(Paragraph(priority_text, normal_style))
-        story.append(Spacer(1, 0.1*inch))
-        
-        # Last Updated
-        last_updated = format_date(advisory_data.get('last_updated'))
-        confidence = advisory_data.get('rule_score', 0)
-        confidence_percent = int(confidence * 100) if confidence else 0
-        date_text = f"<b>Last Updated:</b> {last_updated}"
-        if confidence_percent > 0:
-            date_text += f" | <b>Confidence:</b> {confidence_percent}%"
-        story.append(Paragraph(date_text, normal_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Analysis Section
-        story.append(Paragraph("Analysis", section_style))
-        analysis = advisory_data.get('analysis', advisory_data.get('summary', 'No analysis available.'))
-        story.append(Paragraph(analysis, normal_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Recommendations Section
-        recommendations = advisory_data.get('recommendations', [])
-        if recommendations and len(recommendations) > 0:
-            story.append(Paragraph("Recommended Actions", section_style))
-            
-            for idx, rec in enumerate(recommendations, 1):
-                rec_title = rec.get('title', f'Recommendation {idx}')
-                rec_desc = rec.get('desc', rec.get('description', ''))
-                rec_priority = rec.get('priority', 'Medium')
-                rec_timeline = rec.get('timeline', '')
-                
-                # Create recommendation card
-                rec_text = f"<b>{rec_title}</b>"
-                if rec_priority:
-                    rec_text += f" <i>({rec_priority} Priority)</i>"
-                rec_text += f"<br/>{rec_desc}"
-                if rec_timeline:
-                    rec_text += f"<br/><i>Timeline: {rec_timeline}</i>"
-                
-                story.append(Spacer(1, 0.1*inch))
-                story.append(Paragraph(rec_text, card_style))
-                story.append(Spacer(1, 0.1*inch))
-        else:
-            story.append(Paragraph("Recommended Actions", section_style))
-            story.append(Paragraph("No specific recommendations available at this time.", normal_style))
-        
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Rule Breakdown Table
-        rule_breakdown = advisory_data.get('rule_breakdown', {})
-        if rule_breakdown:
-            story.append(Paragraph("Rule Breakdown", section_style))
-            
-            # Prepare table data
-            table_data = [['Category', 'Score', 'Rules Triggered']]
-            
-            for category in ['pest', 'irrigation', 'market']:
-                cat_data = rule_breakdown.get(category, {})
-                score = cat_data.get('score', 0)
-                fired = cat_data.get('fired', [])
-                fired_count = len(fired) if isinstance(fired, list) else 0
-                score_percent = int(score * 100) if score else 0
-                
-                category_name = category.capitalize()
-                table_data.append([
-                    category_name,
-                    f"{score_percent}%",
-                    str(fired_count)
-                ])
-            
-            # Create table
-            table = Table(table_data, colWidths=[2*inch, 1.5*inch, 2*inch])
-            table.setStyle(TableStyle([
-                # Header row
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0D6EFD')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                # Data rows
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F9FA')]),
-            ]))
-            
-            story.append(table)
-            story.append(Spacer(1, 0.2*inch))
-        
-        # Fired Rules (if available)
-        fired_rules = advisory_data.get('fired_rules', [])
-        if fired_rules and len(fired_rules) > 0:
-            story.append(Paragraph("Triggered Rules", section_style))
-            rules_text = "<br/>".join([f"• {rule}" for rule in fired_rules[:10]])  # Limit to 10 rules
-            if len(fired_rules) > 10:
-                rules_text += f"<br/>... and {len(fired_rules) - 10} more"
-            story.append(Paragraph(rules_text, normal_style))
-            story.append(Spacer(1, 0.2*inch))
-        
-        # Footer
-        story.append(Spacer(1, 0.3*inch))
-        footer_text = "Generated by krushiRakshak AI"
-        story.append(Paragraph(footer_text, footer_style))
-        story.append(Spacer(1, 0.1*inch))
-        timestamp = datetime.now().strftime("%B %d, %Y at %I:%M %p")
-        story.append(Paragraph(f"Report generated on {timestamp}", footer_style))
-        
-        # Build PDF
-        doc.build(story)
-        
-        # Get PDF bytes
-        buffer.seek(0)
-        pdf_bytes = buffer.read()
-        buffer.close()
-        
+
         # Return PDF as response
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f'attachment; filename="Advisory_{crop_name.capitalize()}.pdf"'
+                "Content-Disposition": f'attachment; filename="Advisory_{crop_name.capitalize()}.pdf"',
+                "ETag": etag,
+                "Cache-Control": PDF_CACHE_CONTROL,
             }
         )
-        
+
     except HTTPException:
         raise
     except Exception as e:
@@ -361,3 +110,180 @@ async def generate_advisory_pdf(
             detail=f"Error generating PDF: {str(e)}"
         )
 
+
+# ============================================================================
+# Bulk reports
+# ============================================================================
+
+async def _farm_advisory(farm: BulkReportFarm, ctx: FusionContext) -> Dict[str, Any]:
+    # One context for the whole report: farms in the same tile share weather, location and market lookups
+    return await compute_advisory(
+        farm.crop,
+        location=farm.location,
+        latitude=farm.latitude,
+        longitude=farm.longitude,
+        state=farm.state,
+        district=farm.district,
+        village=farm.village,
+        ctx=ctx,
+    )
+
+
+async def _registered_farms(db, body: BulkReportRequest) -> List[BulkReportFarm]:
+    query = select(
+        User.name, User.crop, User.location, User.state, User.district, User.village
+    ).where(
+        func.lower(User.district) == body.district.lower(),
+        User.crop.is_not(None),
+        User.is_active.is_not(False),
+    )
+    if body.state:
+        query = query.where(func.lower(User.state) == body.state.lower())
+    if body.village:
+        query = query.where(func.lower(User.village) == body.village.lower())
+    if body.crop:
+        query = query.where(func.lower(User.crop) == body.crop.lower())
+    query = query.order_by(User.village, User.id).limit(BULK_REPORT_MAX_FARMS + 1)
+    rows = (await db.execute(query)).all()
+    return [BulkReportFarm(**row._mapping) for row in rows]
+
+
+async def _in_order(
+    farms: List[BulkReportFarm], work: Callable[[BulkReportFarm], Awaitable[Any]]
+) -> AsyncIterator[Tuple[int, BulkReportFarm, Any]]:
+    """Run `work` on up to BULK_REPORT_CONCURRENCY farms at a time, yielding results in farm order.
+
+    A farm that fails yields its exception instead of a result.
+    """
+    queue = iter(enumerate(farms, 1))
+    pending = deque()
+
+    def start_next() -> None:
+        item = next(queue, None)
+        if item is not None:
+            pending.append((*item, asyncio.ensure_future(work(item[1]))))
+
+    for _ in range(BULK_REPORT_CONCURRENCY):
+        start_next()
+    try:
+        while pending:
+            index, farm, task = pending.popleft()
+            try:
+                result = await task
+            except Exception as exc:
+                result = exc
+            start_next()
+            yield index, farm, result
+    finally:
+        for _, _, task in pending:
+            task.cancel()
+
+
+async def _render_when_free(advisory_data: Dict[str, Any], crop: str) -> bytes:
+    key = advisory_key(advisory_data, crop)
+    for _ in range(BULK_RENDER_MAX_RETRIES):
+        try:
+            return await pdf_cache.get_or_render(key, lambda: pdf_renderer.render(advisory_data, crop))
+        except PdfRendererBusy:
+            await asyncio.sleep(BULK_RENDER_RETRY_SECONDS)
+    raise PdfRendererBusy("PDF render queue stayed full")
+
+
+def _report_name(index: int, farm: BulkReportFarm) -> str:
+    label = re.sub(r"[^A-Za-z0-9]+", "_", farm.name or farm.village or "").strip("_") or "farm"
+    return f"{index:04d}_{label}_{farm.crop.lower()}.pdf"
+
+
+def _failure(index: int, farm: BulkReportFarm, exc: Exception) -> str:
+    logger.warning("Bulk report: farm %d (%s) failed: %s", index, farm.crop, exc)
+    detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+    return f"{_report_name(index, farm)}: {detail}"
+
+
+async def _zip_reports(farms: List[BulkReportFarm], ctx: FusionContext) -> AsyncIterator[bytes]:
+    async def farm_pdf(farm: BulkReportFarm) -> bytes:
+        return await _render_when_free(await _farm_advisory(farm, ctx), farm.crop)
+
+    archive = ZipStream()
+    failures = []
+    async for index, farm, result in _in_order(farms, farm_pdf):
+        if isinstance(result, Exception):
+            failures.append(_failure(index, farm, result))
+            continue
+        yield archive.add(_report_name(index, farm), result)
+    if failures:
+        yield archive.add("errors.txt", ("\n".join(failures) + "\n").encode("utf-8"))
+    yield archive.close()
+
+
+async def _combined_report(farms: List[BulkReportFarm], ctx: FusionContext) -> Response:
+    sections = []
+    failures = []
+    async for index, farm, result in _in_order(farms, lambda farm: _farm_advisory(farm, ctx)):
+        if isinstance(result, Exception):
+            failures.append(_failure(index, farm, result))
+            continue
+        if farm.name:
+            # Sections share one document, so label each with its farm
+            result = {**result, "crop": f"{result.get('crop', farm.crop.capitalize())} ({farm.name})"}
+        sections.append((result, farm.crop))
+    if not sections:
+        raise HTTPException(status_code=502, detail="Could not build an advisory for any farm")
+    try:
+        pdf_bytes = await pdf_renderer.render_sections(sections)
+    except PdfRendererBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many reports are being generated, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": 'attachment; filename="Advisory_Reports.pdf"',
+            "X-Reports-Skipped": str(len(failures)),
+        },
+    )
+
+
+@router.post("/pdf/bulk")
+async def generate_bulk_advisory_report(body: BulkReportRequest, token: str = Depends(oauth2_scheme)):
+    """Advisory reports for many farms in one download.
+
+    Pass `farms`, or a `district` (optionally `state`, `village`, `crop`) to
+    report on every registered farmer there (extension officers and experts
+    only). Farms in the same area share
+    weather, location and market lookups. `format=zip` streams one PDF per
+    farm as each is rendered; `format=pdf` returns a single document with a
+    section per farm.
+    """
+    # Authenticate and load farms with a short-lived session; the stream must not hold a DB connection
+    async with AsyncSessionLocal() as db:
+        current_user = await user_from_token(token, db)
+        farms = list(body.farms)
+        if not farms:
+            if not body.district:
+                raise HTTPException(status_code=400, detail="Provide farms or a district")
+            if (current_user.user_type or "").lower() not in BULK_DISTRICT_ROLES:
+                raise HTTPException(status_code=403, detail="District reports are limited to extension officers")
+            farms = await _registered_farms(db, body)
+
+    if not farms:
+        raise HTTPException(status_code=404, detail="No registered farms match this filter")
+    limit = BULK_PDF_MAX_SECTIONS if body.format == "pdf" else BULK_REPORT_MAX_FARMS
+    if len(farms) > limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {limit} farms per {body.format} report; narrow the filter"
+            + (" or use format=zip" if body.format == "pdf" else ""),
+        )
+
+    ctx = FusionContext()
+    if body.format == "pdf":
+        return await _combined_report(farms, ctx)
+    return StreamingResponse(
+        _zip_reports(farms, ctx),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="Advisory_Reports.zip"'},
+    )
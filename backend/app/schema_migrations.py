@@ -0,0 +1,391 @@
+"""Versioned schema migrations.
+
+Migrations are numbered SQL files in `backend/migrations/`:
+
+    0008_add_post_duplicate_of.sql          generic (PostgreSQL) version
+    0008_add_post_duplicate_of.sqlite.sql   used instead on SQLite
+
+Each file is applied once, inside a transaction, and recorded in the
+`schema_migrations` table. A file containing the line
+`-- migrate: no-transaction` runs statement by statement in autocommit mode
+instead, which PostgreSQL requires for `CREATE INDEX CONCURRENTLY`; such
+files must be safe to re-run (`IF NOT EXISTS`).
+
+A change SQL cannot express on its own (SQLite table rebuilds that must keep
+whatever columns the table has) can be a `.py` file defining
+`upgrade(connection)`, run in the same transaction. A file marked
+`migrate: foreign-keys-off` runs with SQLite foreign key enforcement off, as
+a table rebuild requires, and fails unless `PRAGMA foreign_key_check` is
+clean before it commits.
+
+SQLite has no `ADD COLUMN IF NOT EXISTS`; the runner skips such a statement
+itself when the column is already there, so `.sqlite.sql` files can be
+re-run over a schema that already has their columns, like the PostgreSQL
+ones.
+
+A database with no tables yet is created straight from the models and
+stamped with every known version. A database that predates the runner
+first gets the tables and plain nullable columns it lacks from the models,
+then every migration, so migrations must tolerate a table or column that is
+already current (`IF NOT EXISTS`). Worker startup only compares the applied
+versions with the files on disk (`check_schema`); DDL runs from
+`migrations/run_migration.py`, or at startup when DB_AUTO_MIGRATE is on
+(the default for SQLite).
+"""
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+FOREIGN_KEYS_OFF_MARKER = "migrate: foreign-keys-off"
+# pg_advisory_lock key serializing migrations across workers and deploy hosts
+MIGRATION_LOCK_KEY = 5_310_041
+
+# "true" / "false"; unset means on for SQLite (development) and off elsewhere
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE")
+
+_FILE_RE = re.compile(r"^(\d{4})_(\w+?)(?:\.(\w+))?\.(?:sql|py)$")
+_DOLLAR_QUOTE_RE = re.compile(r"\$[A-Za-z_]*\$")
+_ADD_COLUMN_IF_NOT_EXISTS_RE = re.compile(
+    r"^(\s*ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+)IF\s+NOT\s+EXISTS\s+(\w+)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+
+class SchemaOutOfDate(RuntimeError):
+    """Raised at startup when the database is missing migrations."""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+    sql: str
+
+    @property
+    def transactional(self) -> bool:
+        return NO_TRANSACTION_MARKER not in self.sql
+
+    @property
+    def foreign_keys_off(self) -> bool:
+        return FOREIGN_KEYS_OFF_MARKER in self.sql
+
+    @property
+    def label(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+
+def discover(dialect: str, directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Migrations in version order, picking the `<name>.<dialect>.sql|py` variant where one exists."""
+    files: Dict[int, Dict[Optional[str], Tuple[str, Path]]] = {}
+    for path in sorted(directory.glob("*.sql")) + sorted(directory.glob("*.py")):
+        match = _FILE_RE.match(path.name)
+        if not match:
+            continue
+        version, name, variant = int(match.group(1)), match.group(2), match.group(3)
+        variants = files.setdefault(version, {})
+        if any(other != name for other, _ in variants.values()):
+            raise ValueError(f"Migration version {version:04d} is used by more than one name")
+        if variant in variants:
+            raise ValueError(f"Migration {version:04d} has more than one file for {variant or 'the default dialect'}")
+        variants[variant] = (name, path)
+
+    migrations = []
+    for version in sorted(files):
+        variants = files[version]
+        chosen = variants.get(dialect) or variants.get(None)
+        if chosen is None:
+            raise ValueError(f"Migration {version:04d} has no file for {dialect}")
+        name, path = chosen
+        migrations.append(Migration(version, name, path, path.read_text(encoding="utf-8")))
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a SQL script on semicolons outside comments, quotes and $$-quoted bodies."""
+    statements: List[str] = []
+    current: List[str] = []
+    has_code = False
+    i, n = 0, len(sql)
+    while i < n:
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = n if end == -1 else end
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+        elif sql[i] in ("'", '"'):
+            # A doubled quote inside a literal just reads as two adjacent literals here
+            end = sql.find(sql[i], i + 1)
+            end = n if end == -1 else end + 1
+            has_code = True
+        elif sql[i] == "$" and _DOLLAR_QUOTE_RE.match(sql, i):
+            tag = _DOLLAR_QUOTE_RE.match(sql, i).group()
+            end = sql.find(tag, i + len(tag))
+            end = n if end == -1 else end + len(tag)
+            has_code = True
+        elif sql[i] == ";":
+            if has_code:
+                statements.append("".join(current).strip())
+            current, has_code = [], False
+            i += 1
+            continue
+        else:
+            end = i + 1
+            has_code = has_code or not sql[i].isspace()
+        current.append(sql[i:end])
+        i = end
+    if has_code:
+        statements.append("".join(current).strip())
+    return statements
+
+
+# ============================================================================
+# Database state
+# ============================================================================
+
+def applied_versions(engine: Engine) -> Set[int]:
+    """Versions recorded in schema_migrations (empty if the table does not exist)."""
+    try:
+        with engine.connect() as conn:
+            return set(conn.execute(select(schema_migrations.c.version)).scalars())
+    except (OperationalError, ProgrammingError):
+        return set()
+
+
+def status(engine: Engine, directory: Path = MIGRATIONS_DIR) -> List[Tuple[Migration, bool]]:
+    applied = applied_versions(engine)
+    return [(migration, migration.version in applied) for migration in discover(engine.dialect.name, directory)]
+
+
+@contextmanager
+def _autocommit(engine: Engine) -> Iterator[Connection]:
+    # Transactions are opened explicitly: pysqlite would otherwise commit
+    # each DDL statement on its own
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        yield conn
+
+
+@contextmanager
+def _transaction(conn: Connection) -> Iterator[None]:
+    conn.exec_driver_sql("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.exec_driver_sql("ROLLBACK")
+        raise
+    conn.exec_driver_sql("COMMIT")
+
+
+@contextmanager
+def _migration_lock(engine: Engine) -> Iterator[None]:
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with _autocommit(engine) as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def _record(conn: Connection, migrations: List[Migration]) -> None:
+    if migrations:
+        conn.execute(
+            schema_migrations.insert(),
+            [{"version": migration.version, "name": migration.name} for migration in migrations],
+        )
+
+
+def _execute(conn: Connection, statement: str) -> None:
+    match = _ADD_COLUMN_IF_NOT_EXISTS_RE.search(statement)
+    if match and conn.dialect.name == "sqlite":
+        # Emulate PostgreSQL's ADD COLUMN IF NOT EXISTS
+        prefix, table, column = match.groups()
+        if column in {existing["name"] for existing in inspect(conn).get_columns(table)}:
+            return
+        statement = statement[:match.start()] + prefix + column + statement[match.end():]
+    conn.exec_driver_sql(statement)
+
+
+def _run(conn: Connection, migration: Migration) -> None:
+    if migration.path.suffix == ".py":
+        spec = importlib.util.spec_from_file_location(f"migration_{migration.label}", migration.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(conn)
+        return
+    for statement in split_statements(migration.sql):
+        _execute(conn, statement)
+
+
+@contextmanager
+def _foreign_keys_off(conn: Connection) -> Iterator[None]:
+    """SQLite: suspend foreign key enforcement (it cannot change inside a transaction)."""
+    enabled = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+    conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+    try:
+        yield
+    finally:
+        conn.exec_driver_sql(f"PRAGMA foreign_keys={'ON' if enabled else 'OFF'}")
+
+
+def _apply(engine: Engine, migration: Migration) -> None:
+    started = time.perf_counter()
+    with _autocommit(engine) as conn:
+        if migration.foreign_keys_off and conn.dialect.name == "sqlite":
+            with _foreign_keys_off(conn), _transaction(conn):
+                _run(conn, migration)
+                violations = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+                if violations:
+                    raise RuntimeError(f"Migration {migration.label} left rows violating foreign keys: {violations[:5]}")
+                _record(conn, [migration])
+        elif migration.transactional:
+            with _transaction(conn):
+                _run(conn, migration)
+                _record(conn, [migration])
+        else:
+            _run(conn, migration)
+            _record(conn, [migration])
+    logger.info("Applied migration %s in %.2fs", migration.label, time.perf_counter() - started)
+
+
+def _create_missing(conn: Connection, applied: Set[int]) -> List[str]:
+    """Create model tables, and plain model columns, that a pre-runner database lacks.
+
+    Databases from before the runner range from a lone `users` table to the
+    full baseline schema, and some never got columns that no migration adds.
+    Only those (no versions recorded, or whole tables missing) are repaired;
+    columns with a foreign key, or NOT NULL without a server default, are
+    left to their migrations.
+    """
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    created = [table.name for table in models.Base.metadata.sorted_tables if table.name not in existing]
+    if applied and not created:
+        return []
+    models.Base.metadata.create_all(conn, checkfirst=True)
+
+    preparer = conn.dialect.identifier_preparer
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            addable = column.nullable or column.server_default is not None
+            if column.name in present or column.foreign_keys or not addable:
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}")
+            created.append(f"{table.name}.{column.name}")
+    return created
+
+
+# ============================================================================
+# Commands
+# ============================================================================
+
+def migrate(engine: Engine, target: Optional[int] = None, directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Apply pending migrations up to `target` (default: all). Returns the ones applied."""
+    migrations = discover(engine.dialect.name, directory)
+    with _migration_lock(engine):
+        schema_migrations.create(engine, checkfirst=True)
+        applied = applied_versions(engine)
+
+        with engine.connect() as conn:
+            fresh = not applied and not inspect(conn).has_table("users")
+        if fresh:
+            # Nothing to upgrade: build the current schema and mark every migration done
+            with _autocommit(engine) as conn, _transaction(conn):
+                models.Base.metadata.create_all(conn)
+                _record(conn, migrations)
+            logger.info("Created database schema at version %04d", migrations[-1].version if migrations else 0)
+            return []
+
+        pending = [
+            migration for migration in migrations
+            if migration.version not in applied and (target is None or migration.version <= target)
+        ]
+        if pending:
+            with _autocommit(engine) as conn, _transaction(conn):
+                repaired = _create_missing(conn, applied)
+            if repaired:
+                logger.info("Created %s before migrating", ", ".join(repaired))
+        for migration in pending:
+            _apply(engine, migration)
+        return pending
+
+
+def stamp(engine: Engine, version: int, directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Record migrations up to `version` as applied without running them."""
+    with _migration_lock(engine):
+        schema_migrations.create(engine, checkfirst=True)
+        applied = applied_versions(engine)
+        stamped = [
+            migration for migration in discover(engine.dialect.name, directory)
+            if migration.version <= version and migration.version not in applied
+        ]
+        with engine.begin() as conn:
+            _record(conn, stamped)
+        return stamped
+
+
+def auto_migrate_enabled(engine: Engine) -> bool:
+    if DB_AUTO_MIGRATE is None:
+        return engine.dialect.name == "sqlite"
+    return DB_AUTO_MIGRATE.lower() in ("1", "true", "yes")
+
+
+def check_schema(engine: Engine, auto_migrate: Optional[bool] = None, directory: Path = MIGRATIONS_DIR) -> None:
+    """Startup check: one query against schema_migrations, no reflection.
+
+    Migrates when auto-migration is on, otherwise raises SchemaOutOfDate if
+    any migration on disk has not been applied.
+    """
+    known = {migration.version for migration in discover(engine.dialect.name, directory)}
+    applied = applied_versions(engine)
+    pending = known - applied
+    if not pending:
+        newer = applied - known
+        if newer:
+            # Expected briefly during a rolling deploy, while old workers drain
+            logger.warning("Database has migrations this release does not know: %s", sorted(newer))
+        return
+
+    if auto_migrate is None:
+        auto_migrate = auto_migrate_enabled(engine)
+    if auto_migrate:
+        migrate(engine, directory=directory)
+        return
+    raise SchemaOutOfDate(
+        f"Database is missing migrations {', '.join(f'{version:04d}' for version in sorted(pending))}; "
+        "run `python migrations/run_migration.py` or set DB_AUTO_MIGRATE=true"
+    )
@@ -4,7 +4,7 @@ Pydantic schemas for request/response validation.
 These schemas define the structure of data sent to and received from the API.
 """
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -73,6 +73,7 @@ class PostBase(BaseModel):
     crop: Optional[str] = None
     category: Optional[str] = None
     image_url: Optional[str] = None
+    image_placeholder: Optional[str] = Field(None, max_length=2048)  # From /community/upload-image
 
 
 class PostCreate(PostBase):
@@ -84,6 +85,7 @@ class PostUpdate(BaseModel):
     crop: Optional[str] = None
     category: Optional[str] = None
     image_url: Optional[str] = None
+    image_placeholder: Optional[str] = Field(None, max_length=2048)
 
 
 class PostAuthor(BaseModel):
@@ -107,11 +109,17 @@ class PostOut(PostBase):
     comments_count: int
     created_at: datetime
     is_liked: bool = False  # Whether current user liked this post
+    duplicate_of: Optional[int] = None  # Near-copy of this post: kept, but not listed in feeds or search
 
     class Config:
         from_attributes = True
 
 
+class FeedPage(BaseModel):
+    items: List[PostOut]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
+
+
 class PostLikeCreate(BaseModel):
     post_id: int
 
@@ -131,3 +139,39 @@ class CommentOut(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class UserStatsOut(BaseModel):
+    user_id: int
+    posts_count: int = 0
+    likes_received: int = 0
+    comments_received: int = 0
+    last_active: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+# ============================================================================
+# Advisory Report Schemas
+# ============================================================================
+
+class BulkReportFarm(BaseModel):
+    crop: str
+    name: Optional[str] = None  # Farmer or farm name, used for the file name
+    location: Optional[str] = None  # "lat,lon"
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    state: Optional[str] = None
+    district: Optional[str] = None
+    village: Optional[str] = None
+
+
+class BulkReportRequest(BaseModel):
+    farms: List[BulkReportFarm] = []
+    # Without `farms`, report on every registered farmer in this district (optionally narrowed)
+    district: Optional[str] = None
+    state: Optional[str] = None
+    village: Optional[str] = None
+    crop: Optional[str] = None
+    format: Literal["zip", "pdf"] = "zip"
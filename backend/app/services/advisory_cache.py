@@ -0,0 +1,130 @@
+"""Cache of computed crop advisories, shared by the JSON and PDF endpoints.
+
+An advisory depends only on the crop, where the farm is (to about a
+kilometre), the current hour's weather, the day's market price and the rule
+files, so results are keyed by exactly those. Viewing an advisory and then
+downloading its PDF, or neighbouring farmers asking within the same hour,
+runs the fusion pipeline once per worker. Concurrent misses for one key
+share a single computation.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+ADVISORY_CACHE_TTL_SECONDS = float(os.getenv("ADVISORY_CACHE_TTL_SECONDS", "3600"))
+ADVISORY_CACHE_SIZE = int(os.getenv("ADVISORY_CACHE_SIZE", "5000"))
+# Decimal places kept from farm coordinates (2 is about 1 km)
+LOCATION_TILE_PRECISION = 2
+
+
+def snap_to_tile(lat: float, lon: float) -> Tuple[float, float]:
+    """Coordinates every farm in the same location tile is computed for."""
+    return round(lat, LOCATION_TILE_PRECISION), round(lon, LOCATION_TILE_PRECISION)
+
+
+def advisory_cache_key(crop: str, tile: Hashable, rules_version: str, now: Optional[datetime] = None) -> tuple:
+    """(crop, location tile, weather hour, market date, rules version)."""
+    now = now or datetime.now(timezone.utc)
+    return (
+        crop.lower(),
+        tile,
+        now.strftime("%Y-%m-%dT%H"),
+        now.date().isoformat(),
+        rules_version,
+    )
+
+
+def seconds_until_refresh(now: Optional[datetime] = None) -> int:
+    """Seconds until the weather hour in the key rolls over."""
+    now = now or datetime.now(timezone.utc)
+    return 3600 - (now.minute * 60 + now.second)
+
+
+class AdvisoryCache:
+    """Bounded LRU cache with a per-entry TTL and single-flight computation.
+
+    Cached advisories are shared between requests; callers must not mutate them.
+    """
+
+    def __init__(self, maxsize: int = ADVISORY_CACHE_SIZE, ttl: float = ADVISORY_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, advisory: Dict[str, Any]) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, advisory)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    async def _compute(self, key: tuple, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        advisory = await compute()
+        self.put(key, advisory)
+        return advisory
+
+    def _finished(self, key: tuple, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def get_or_compute(self, key: tuple, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cached advisory for `key`, calling `compute()` at most once across concurrent requests.
+
+        Failures are not cached; every request waiting on the failed computation sees the error.
+        """
+        advisory = self.get(key)
+        if advisory is not None:
+            return advisory
+        task = self._inflight.get(key)
+        if task is None:
+            with self._lock:
+                self.misses += 1
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            with self._lock:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+advisory_cache = AdvisoryCache()
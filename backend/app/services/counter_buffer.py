@@ -0,0 +1,235 @@
+"""Write-behind buffering for hot-post engagement counters.
+
+Like/comment rows are always written synchronously; only the denormalized
+`posts.likes_count` / `posts.comments_count` updates are deferred for posts
+that are receiving a burst of activity. A delta reaches the buffer only once
+its transaction has committed, and is aggregated per post. Every few hundred
+milliseconds the buffered posts are recounted from the source tables in one
+batched UPDATE, and a periodic reconciliation job does the same for every
+post whose counters drifted.
+
+Flushing recounts rather than adding the deltas, so it is idempotent: with
+several workers buffering deltas for the same post, neither another
+worker's flush nor the reconciliation job can make a delta count twice. The
+buffered deltas are only used for the value shown to the client until then.
+
+Every flush also refreshes the feed rank of posts whose counters changed
+since the previous flush, and the `user_stats` totals of their authors.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import crud
+from ..database import SessionLocal
+from ..models import Comment, Post, PostLike
+from .feed_ranking import refresh_ranks
+
+logger = logging.getLogger(__name__)
+
+# A post becomes "hot" once it sees this many counter updates inside one window
+HOT_POST_THRESHOLD = int(os.getenv("HOT_POST_THRESHOLD", "20"))
+HOT_WINDOW_SECONDS = float(os.getenv("HOT_POST_WINDOW_SECONDS", "10"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("COUNTER_FLUSH_INTERVAL_MS", "250")) / 1000
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("COUNTER_RECONCILE_INTERVAL_SECONDS", "600"))
+
+COUNTER_COLUMNS = ("likes_count", "comments_count")
+# Session.info key for counter changes waiting on the transaction to commit
+_UNCOMMITTED_KEY = "counter_buffer.uncommitted"
+
+
+class CounterBuffer:
+    """Per-post in-memory aggregation of counter deltas."""
+
+    def __init__(self, threshold: int = HOT_POST_THRESHOLD, window: float = HOT_WINDOW_SECONDS):
+        self.threshold = threshold
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Dict[str, int]] = {}
+        self._activity: Dict[int, Tuple[float, int]] = {}
+        self._dirty: Set[int] = set()
+
+    def is_hot(self, post_id: int) -> bool:
+        """Record one counter update for `post_id` and report whether it is hot."""
+        now = time.monotonic()
+        with self._lock:
+            window_start, count = self._activity.get(post_id, (now, 0))
+            if now - window_start > self.window:
+                window_start, count = now, 0
+            count += 1
+            self._activity[post_id] = (window_start, count)
+            return count >= self.threshold or post_id in self._pending
+
+    def add(self, post_id: int, column_name: str, delta: int) -> None:
+        with self._lock:
+            deltas = self._pending.setdefault(post_id, dict.fromkeys(COUNTER_COLUMNS, 0))
+            deltas[column_name] += delta
+
+    def mark_dirty(self, post_id: int) -> None:
+        with self._lock:
+            self._dirty.add(post_id)
+
+    def pending(self, post_id: int, column_name: str) -> int:
+        with self._lock:
+            return self._pending.get(post_id, {}).get(column_name, 0)
+
+    def drain(self) -> Tuple[Dict[int, Dict[str, int]], Set[int]]:
+        """Take all pending deltas and dirty post ids, and forget expired activity."""
+        now = time.monotonic()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            dirty, self._dirty = self._dirty, set()
+            self._activity = {
+                post_id: entry
+                for post_id, entry in self._activity.items()
+                if now - entry[0] <= self.window
+            }
+        return pending, dirty
+
+    def restore(self, pending: Dict[int, Dict[str, int]], dirty: Set[int]) -> None:
+        """Put drained deltas back after a failed flush."""
+        for post_id, deltas in pending.items():
+            for column_name, delta in deltas.items():
+                self.add(post_id, column_name, delta)
+        with self._lock:
+            self._dirty.update(dirty)
+
+
+counter_buffer = CounterBuffer()
+
+
+@event.listens_for(Session, "after_commit")
+def _record_committed(session: Session) -> None:
+    for post_id, column_name, buffered in session.info.pop(_UNCOMMITTED_KEY, ()):
+        counter_buffer.mark_dirty(post_id)
+        if buffered:
+            counter_buffer.add(post_id, column_name, buffered)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session: Session) -> None:
+    session.info.pop(_UNCOMMITTED_KEY, None)
+
+
+def _on_commit(db: AsyncSession, post_id: int, column_name: str, buffered: int) -> None:
+    db.sync_session.info.setdefault(_UNCOMMITTED_KEY, []).append((post_id, column_name, buffered))
+
+
+async def apply_counter_delta(db: AsyncSession, post_id: int, column_name: str, delta: int) -> Optional[int]:
+    """Apply a counter change directly, or buffer it when the post is hot.
+
+    A buffered delta is recorded when the caller commits, and dropped if it
+    rolls back. Returns the counter value the client should see (stored
+    value plus buffered deltas, this one included), or None if the post
+    does not exist.
+    """
+    column = getattr(Post, column_name)
+    if delta and not counter_buffer.is_hot(post_id):
+        value = await crud.increment_post_counter(db, post_id, column_name, delta)
+        if value is not None:
+            _on_commit(db, post_id, column_name, 0)
+        return value
+
+    stored = (await db.execute(select(func.coalesce(column, 0)).where(Post.id == post_id))).first()
+    if stored is None:
+        return None
+    if delta:
+        _on_commit(db, post_id, column_name, delta)
+    return max(0, stored[0] + counter_buffer.pending(post_id, column_name) + delta)
+
+
+def _recount_values():
+    """Correlated subqueries counting a post's likes and comments."""
+    likes = select(func.count(PostLike.id)).where(PostLike.post_id == Post.id).scalar_subquery()
+    comments = select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+    return likes, comments
+
+
+def flush_pending(db: Session) -> int:
+    """Recount all buffered posts in one batched UPDATE. Returns posts touched."""
+    pending, dirty = counter_buffer.drain()
+    if not pending and not dirty:
+        return 0
+
+    likes, comments = _recount_values()
+    try:
+        if pending:
+            db.execute(
+                update(Post)
+                .where(Post.id.in_(list(pending)))
+                .values(likes_count=likes, comments_count=comments)
+                .execution_options(synchronize_session=False)
+            )
+        changed = dirty | pending.keys()
+        refresh_ranks(db, changed)
+        crud.refresh_received_stats(db, post_ids=changed)
+        db.commit()
+    except Exception:
+        db.rollback()
+        counter_buffer.restore(pending, dirty)
+        raise
+    return len(pending)
+
+
+def reconcile_counters(db: Session) -> int:
+    """Recompute likes_count/comments_count from the source tables in bulk.
+
+    Only rows whose stored value has drifted are rewritten (and re-ranked).
+    """
+    likes, comments = _recount_values()
+    fixed = db.execute(
+        update(Post)
+        .where(Post.likes_count.is_distinct_from(likes) | Post.comments_count.is_distinct_from(comments))
+        .values(likes_count=likes, comments_count=comments)
+        .returning(Post.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    refresh_ranks(db, fixed)
+    db.commit()
+    return len(fixed)
+
+
+def _run_with_session(job):
+    db = SessionLocal()
+    try:
+        return job(db)
+    finally:
+        db.close()
+
+
+async def flush_loop(interval: float = FLUSH_INTERVAL_SECONDS) -> None:
+    """Background task: flush buffered counter deltas every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_run_with_session, flush_pending)
+        except Exception:
+            logger.exception("Failed to flush engagement counters")
+
+
+async def reconcile_loop(interval: float = RECONCILE_INTERVAL_SECONDS) -> None:
+    """Background task: periodically rebuild counters from PostLike/Comment rows."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_run_with_session, flush_pending)
+            fixed = await asyncio.to_thread(_run_with_session, reconcile_counters)
+            if fixed:
+                logger.info("Reconciled engagement counters for %d posts", fixed)
+            await asyncio.to_thread(_run_with_session, crud.rebuild_user_stats)
+        except Exception:
+            logger.exception("Failed to reconcile engagement counters")
+
+
+async def shutdown_flush() -> None:
+    """Flush whatever is still buffered before the worker exits."""
+    await asyncio.to_thread(_run_with_session, flush_pending)
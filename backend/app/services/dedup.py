@@ -0,0 +1,273 @@
+"""Near-duplicate post detection with MinHash and locality-sensitive hashing.
+
+Post text is normalized and cut into character 5-grams (works for any
+script farmers write in). A 64-value MinHash signature estimates the
+Jaccard similarity of two posts' shingle sets; signatures are split into
+16 bands of 4 values, and posts sharing any band bucket become candidates.
+With these numbers, pairs above ~50% similarity almost always collide, and
+candidates are then confirmed against DUPLICATE_THRESHOLD.
+
+The index only holds recent original posts (DEDUP_WINDOW_DAYS) and lives in
+process memory. It is rebuilt from the database at startup and catches up
+on posts created by other workers before every lookup, so each worker sees
+the same set. Post ids are not committed in order: a lower id still in
+another worker's transaction is remembered as a gap below the high-water
+mark and looked up again on each catch-up until it appears, or until
+DEDUP_GAP_TIMEOUT_SECONDS shows it was rolled back or deleted.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import Post
+
+logger = logging.getLogger(__name__)
+
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+SHINGLE_SIZE = 5
+# Posts with fewer shingles than this ("hi", "thanks") are too short to judge
+MIN_SHINGLES = 8
+
+DUPLICATE_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+WINDOW_DAYS = float(os.getenv("DEDUP_WINDOW_DAYS", "30"))
+MAX_INDEXED_POSTS = int(os.getenv("DEDUP_MAX_POSTS", "50000"))
+# How long a missing id below the high-water mark is waited for, and how many are tracked
+GAP_TIMEOUT_SECONDS = float(os.getenv("DEDUP_GAP_TIMEOUT_SECONDS", "60"))
+MAX_TRACKED_GAPS = 256
+
+# Universal hashing h(x) = (a*x + b) mod p over 32-bit shingle hashes; the
+# products stay below 2**64 so the arithmetic is exact in uint64
+_PRIME = np.uint64(4294967291)
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, int(_PRIME), size=NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def shingles(text: str) -> Set[str]:
+    normalized = normalize(text)
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of a post, or None if the text is too short to compare."""
+    tokens = shingles(text)
+    if len(tokens) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64, count=len(tokens)
+    )
+    permuted = (np.outer(hashes, _A) + _B) % _PRIME
+    return permuted.min(axis=0)
+
+
+def similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(left == right)) / NUM_PERMUTATIONS
+
+
+@dataclass
+class DuplicateMatch:
+    post_id: int
+    author_id: int
+    similarity: float
+
+
+@dataclass
+class _Entry:
+    author_id: int
+    signature: np.ndarray
+    created_at: datetime
+
+
+class DuplicateIndex:
+    """LSH index of recent original posts."""
+
+    def __init__(self, max_posts: int = MAX_INDEXED_POSTS, window_days: float = WINDOW_DAYS):
+        self.max_posts = max_posts
+        self.window = timedelta(days=window_days)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(NUM_BANDS)]
+        self.last_post_id = 0
+        # Ids below last_post_id not seen yet -> monotonic time they were first missed
+        self._gaps: Dict[int, float] = {}
+
+    @staticmethod
+    def _band_keys(sig: np.ndarray) -> List[bytes]:
+        return [sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes() for band in range(NUM_BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, post_id: int, author_id: int, sig: Optional[np.ndarray], created_at: Optional[datetime] = None) -> None:
+        created_at = _as_utc(created_at)
+        with self._lock:
+            self._seen(post_id)
+            if sig is None or post_id in self._entries:
+                return
+            self._entries[post_id] = _Entry(author_id, sig, created_at)
+            for band, key in enumerate(self._band_keys(sig)):
+                self._buckets[band].setdefault(key, set()).add(post_id)
+            self._evict()
+
+    def _seen(self, post_id: int) -> None:
+        """Advance the high-water mark to `post_id`, remembering the ids skipped as gaps."""
+        self._gaps.pop(post_id, None)
+        if post_id <= self.last_post_id:
+            return
+        now = time.monotonic()
+        for missing in range(max(self.last_post_id + 1, post_id - MAX_TRACKED_GAPS), post_id):
+            self._gaps.setdefault(missing, now)
+        self.last_post_id = post_id
+        if len(self._gaps) > MAX_TRACKED_GAPS:
+            for missing in sorted(self._gaps)[:len(self._gaps) - MAX_TRACKED_GAPS]:
+                del self._gaps[missing]
+
+    def gaps(self) -> List[int]:
+        """Missing ids still waited for (expired ones are dropped)."""
+        cutoff = time.monotonic() - GAP_TIMEOUT_SECONDS
+        with self._lock:
+            self._gaps = {post_id: since for post_id, since in self._gaps.items() if since > cutoff}
+            return sorted(self._gaps)
+
+    def remove(self, post_id: int) -> None:
+        with self._lock:
+            self._remove(post_id)
+
+    def _remove(self, post_id: int) -> None:
+        entry = self._entries.pop(post_id, None)
+        if entry is None:
+            return
+        for band, key in enumerate(self._band_keys(entry.signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(post_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def _evict(self) -> None:
+        cutoff = datetime.now(timezone.utc) - self.window
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_posts and oldest.created_at >= cutoff:
+                break
+            self._remove(oldest_id)
+
+    def find(self, sig: Optional[np.ndarray], exclude: Optional[int] = None) -> Optional[DuplicateMatch]:
+        """Most similar indexed post at or above DUPLICATE_THRESHOLD, if any."""
+        if sig is None:
+            return None
+        with self._lock:
+            candidates: Set[int] = set()
+            for band, key in enumerate(self._band_keys(sig)):
+                candidates.update(self._buckets[band].get(key, ()))
+            candidates.discard(exclude)
+            best = None
+            for post_id in candidates:
+                entry = self._entries[post_id]
+                score = similarity(sig, entry.signature)
+                if score >= DUPLICATE_THRESHOLD and (best is None or score > best.similarity):
+                    best = DuplicateMatch(post_id, entry.author_id, score)
+            return best
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets = [{} for _ in range(NUM_BANDS)]
+            self.last_post_id = 0
+            self._gaps.clear()
+
+    # ------------------------------------------------------------------
+    # Database sync
+    # ------------------------------------------------------------------
+
+    def _index_rows(self, rows) -> int:
+        cutoff = datetime.now(timezone.utc) - self.window
+        loaded = 0
+        for row in sorted(rows, key=lambda row: row.id):
+            if row.duplicate_of is None and _as_utc(row.created_at) >= cutoff:
+                self.add(row.id, row.author_id, signature(row.content), row.created_at)
+                loaded += 1
+            else:
+                # Skipped, but seen: it is neither new nor a gap any more
+                with self._lock:
+                    self._seen(row.id)
+        return loaded
+
+    def rebuild(self, db: Session) -> int:
+        """Reload the index from the most recent original posts."""
+        self.clear()
+        newest = db.execute(select(Post.id).order_by(Post.id.desc()).limit(1)).scalar() or 0
+        cutoff = datetime.now(timezone.utc) - self.window
+        rows = db.execute(
+            select(Post.id, Post.author_id, Post.content, Post.created_at, Post.duplicate_of)
+            .where(Post.id <= newest)
+            .where(Post.duplicate_of.is_(None), Post.created_at >= cutoff)
+            .order_by(Post.id.desc())
+            .limit(self.max_posts)
+        ).all()
+        with self._lock:
+            self.last_post_id = rows[-1].id - 1 if rows else newest
+        loaded = self._index_rows(rows)
+        # Ids skipped by the filters above become gaps; the first catch-up settles them
+        with self._lock:
+            self._seen(newest)
+        logger.info("Duplicate index rebuilt with %d posts", len(self))
+        return loaded
+
+    def catch_up(self, db: Session) -> int:
+        """Index posts committed (e.g. by other workers) since the last sync.
+
+        Reads ids above the high-water mark plus the gaps below it, so a
+        lower id that commits after a higher one is not skipped.
+        """
+        gaps = self.gaps()
+        newer = Post.id > self.last_post_id
+        rows = db.execute(
+            select(Post.id, Post.author_id, Post.content, Post.created_at, Post.duplicate_of)
+            .where(newer | Post.id.in_(gaps) if gaps else newer)
+            .order_by(Post.id.desc())
+            .limit(self.max_posts)
+        ).all()
+        return self._index_rows(rows)
+
+
+def _as_utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+duplicate_index = DuplicateIndex()
+
+
+def rebuild_with_session() -> int:
+    db = SessionLocal()
+    try:
+        return duplicate_index.rebuild(db)
+    finally:
+        db.close()
@@ -0,0 +1,171 @@
+"""Precomputed ranking for the personalized community feed.
+
+Every post stores a `rank_score` combining engagement and recency:
+
+    log10(1 + likes + 2 * comments) + created_epoch / RANK_DECAY_SECONDS
+
+Because the time term grows with post age rather than shrinking, a score
+never has to be recomputed just because time passes: newer posts simply
+start higher, and an older post needs ten times the engagement to keep up
+with one RANK_DECAY_SECONDS younger. Scores are set when a post is created
+and refreshed only for posts whose counters changed (see counter_buffer).
+
+The feed merges a few disjoint segments of the posts table, each read
+straight off a `(..., rank_score)` index and boosted by how well it matches
+the viewer's crop and region, so a page costs O(page size) regardless of
+table size.
+"""
+from __future__ import annotations
+
+import math
+import os
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..models import Post
+
+RANK_DECAY_SECONDS = float(os.getenv("FEED_RANK_DECAY_SECONDS", "45000"))
+COMMENT_WEIGHT = 2
+
+# Score bonus for matching the viewer; 1.0 is worth RANK_DECAY_SECONDS of freshness
+CROP_REGION_BOOST = float(os.getenv("FEED_CROP_REGION_BOOST", "2.0"))
+CROP_BOOST = float(os.getenv("FEED_CROP_BOOST", "1.0"))
+REGION_BOOST = float(os.getenv("FEED_REGION_BOOST", "0.5"))
+
+REFRESH_BATCH_SIZE = 500
+
+
+def rank_score(likes: Optional[int], comments: Optional[int], created_at: Optional[datetime]) -> float:
+    engagement = max(0, likes or 0) + COMMENT_WEIGHT * max(0, comments or 0)
+    if created_at is None:
+        created_at = datetime.now(timezone.utc)
+    elif created_at.tzinfo is None:
+        # SQLite returns naive UTC timestamps
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return math.log10(1 + engagement) + created_at.timestamp() / RANK_DECAY_SECONDS
+
+
+def refresh_ranks(db: Session, post_ids: Iterable[int]) -> int:
+    """Recompute rank_score for the given posts. Does not commit."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return 0
+
+    posts = Post.__table__
+    stmt = (
+        update(posts)
+        .where(posts.c.id == bindparam("b_post_id"))
+        .values(rank_score=bindparam("b_rank_score"))
+    )
+    updated = 0
+    for start in range(0, len(post_ids), REFRESH_BATCH_SIZE):
+        batch = post_ids[start:start + REFRESH_BATCH_SIZE]
+        rows = db.execute(
+            select(Post.id, Post.likes_count, Post.comments_count, Post.created_at).where(Post.id.in_(batch))
+        ).all()
+        params = [
+            {"b_post_id": row.id, "b_rank_score": rank_score(row.likes_count, row.comments_count, row.created_at)}
+            for row in rows
+        ]
+        if params:
+            db.execute(stmt, params)
+            updated += len(params)
+    return updated
+
+
+def rebuild_ranks(db: Session) -> int:
+    """Recompute rank_score for every post (backfill after the migration)."""
+    last_id = 0
+    updated = 0
+    while True:
+        ids = db.execute(
+            select(Post.id).where(Post.id > last_id).order_by(Post.id).limit(REFRESH_BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        updated += refresh_ranks(db, ids)
+        db.commit()
+        last_id = ids[-1]
+    return updated
+
+
+# ============================================================================
+# Feed segments
+# ============================================================================
+
+def feed_segments(crop: Optional[str], region: Optional[str]) -> List[Tuple[float, object]]:
+    """Disjoint (boost, predicate) segments covering every post for this viewer.
+
+    Each predicate leads with the columns of one `(…, rank_score)` index, so
+    ordering a segment by rank_score is an index scan.
+    """
+    crop_match = Post.crop == crop
+    region_match = Post.region == region
+    other_crop = or_(Post.crop.is_(None), Post.crop != crop)
+    other_region = or_(Post.region.is_(None), Post.region != region)
+
+    if crop and region:
+        return [
+            (CROP_REGION_BOOST, and_(crop_match, region_match)),
+            (CROP_BOOST, and_(crop_match, other_region)),
+            (REGION_BOOST, and_(region_match, other_crop)),
+            (0.0, and_(other_crop, other_region)),
+        ]
+    if crop:
+        return [(CROP_BOOST, crop_match), (0.0, other_crop)]
+    if region:
+        return [(REGION_BOOST, region_match), (0.0, other_region)]
+    return [(0.0, None)]
+
+
+def encode_cursor(score: float, post_id: int) -> str:
+    return f"{score!r}:{post_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    score, _, post_id = cursor.partition(":")
+    return float(score), int(post_id)
+
+
+async def ranked_feed(
+    db: AsyncSession,
+    crop: Optional[str],
+    region: Optional[str],
+    limit: int,
+    cursor: Optional[Tuple[float, int]] = None,
+    base_filter=None,
+) -> Tuple[List[Post], Optional[str]]:
+    """One page of the personalized feed and the cursor for the next page.
+
+    Reads at most `limit + 2` rows per segment and merges them by boosted score.
+    """
+    candidates = []
+    for boost, predicate in feed_segments(crop, region):
+        query = select(Post)
+        if predicate is not None:
+            query = query.where(predicate)
+        if base_filter is not None:
+            query = query.where(base_filter)
+        if cursor is not None:
+            # Keyset pagination on the boosted score, shifted into this segment's raw scores
+            bound = cursor[0] - boost
+            query = query.where(
+                or_(Post.rank_score < bound, and_(Post.rank_score == bound, Post.id < cursor[1]))
+            )
+        # One spare row absorbs the cursor post itself if float rounding lets it through
+        query = query.order_by(Post.rank_score.desc(), Post.id.desc()).limit(limit + 2)
+        for post in (await db.execute(query)).scalars():
+            key = ((post.rank_score or 0.0) + boost, post.id)
+            if cursor is None or key < cursor:
+                candidates.append((*key, post))
+
+    candidates.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    page = candidates[:limit]
+    next_cursor = None
+    if len(candidates) > limit and page:
+        next_cursor = encode_cursor(page[-1][0], page[-1][1])
+    return [post for _, _, post in page], next_cursor
@@ -0,0 +1,125 @@
+"""Derivative generation for community image uploads.
+
+Each upload is decoded once in a worker process and re-encoded as WebP at
+a few fixed sizes (EXIF and other metadata are dropped by the re-encode),
+plus a tiny blurred placeholder the PWA can show while the real image loads.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageFilter, ImageOps, UnidentifiedImageError
+
+# Longest side in pixels for each served size
+VARIANTS = {
+    "thumb": 320,
+    "feed": 720,
+    "full": 1600,
+}
+WEBP_QUALITY = 80
+PLACEHOLDER_SIZE = 16
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Refuse decompression bombs well before they exhaust worker memory
+Image.MAX_IMAGE_PIXELS = 40_000_000
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload cannot be decoded as an image."""
+
+
+def variant_filename(stem: str, size: str) -> str:
+    """Filename of a derivative; the full-size variant is the canonical upload name."""
+    if size == "full":
+        return f"{stem}.webp"
+    return f"{stem}_{size}.webp"
+
+
+def _save_webp(img: Image.Image, path: str) -> None:
+    tmp_path = f"{path}.part"
+    img.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+    os.replace(tmp_path, path)
+
+
+def build_derivatives(source_path: str, dest_dir: str, stem: str) -> Dict[str, Any]:
+    """Write the WebP variants for `source_path` into `dest_dir`.
+
+    Runs inside a worker process, so it only takes and returns picklable
+    values. Raises InvalidImageError on undecodable input.
+    """
+    try:
+        with Image.open(source_path) as src:
+            # Apply camera orientation before the EXIF block is discarded
+            img = ImageOps.exif_transpose(src)
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        raise InvalidImageError(str(exc)) from None
+
+    variants = {}
+    for size, max_side in VARIANTS.items():
+        resized = img.copy()
+        resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        filename = variant_filename(stem, size)
+        _save_webp(resized, os.path.join(dest_dir, filename))
+        variants[size] = filename
+
+    tiny = img.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    tiny.save(buffer, "WEBP", quality=30)
+    placeholder = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    return {"variants": variants, "placeholder": placeholder}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+async def process_upload(source_path: str, dest_dir: str, stem: str) -> Dict[str, Any]:
+    """Generate derivatives in the worker pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), build_derivatives, source_path, dest_dir, stem)
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def backfill(upload_dir: str) -> int:
+    """Generate derivatives for uploads that predate the pipeline.
+
+    Originals keep their URLs; `?size=` starts returning the WebP variants.
+    """
+    created = 0
+    for name in sorted(os.listdir(upload_dir)):
+        stem, ext = os.path.splitext(name)
+        if name.startswith(".") or ext.lower() == ".webp":
+            continue
+        if os.path.exists(os.path.join(upload_dir, variant_filename(stem, "thumb"))):
+            continue
+        try:
+            build_derivatives(os.path.join(upload_dir, name), upload_dir, stem)
+            created += 1
+        except InvalidImageError:
+            continue
+    return created
+
+
+if __name__ == "__main__":  # pragma: no cover
+    uploads = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+    print(f"Generated derivatives for {backfill(uploads)} uploads")
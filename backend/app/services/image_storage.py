@@ -0,0 +1,341 @@
+"""Content-addressed storage for community images.
+
+Uploads are keyed by the SHA-256 of their bytes and sharded two levels deep
+(`ab/cd/abcd….webp`), so identical photos are stored once and no directory
+grows past a few hundred entries. Every upload has a small JSON manifest
+next to its variants so a duplicate upload can be answered without
+re-processing.
+
+Two backends are available, selected with IMAGE_STORAGE:
+- `local` (default): files under backend/uploads
+- `s3`: an S3-compatible bucket (AWS, or MinIO via S3_ENDPOINT_URL)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from ..database import SessionLocal
+from ..models import Post
+from ..utils.http_cache import IMMUTABLE_CACHE_CONTROL
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+UPLOAD_DIR = BACKEND_DIR / "uploads"
+
+# Unreferenced files younger than this are kept: the post may not be created yet
+GC_GRACE_SECONDS = float(os.getenv("IMAGE_GC_GRACE_SECONDS", str(24 * 3600)))
+GC_INTERVAL_SECONDS = float(os.getenv("IMAGE_GC_INTERVAL_SECONDS", str(6 * 3600)))
+
+IMAGES_URL_PREFIX = "/community/images/"
+VARIANT_SUFFIX_RE = re.compile(r"_(?:thumb|feed)$")
+SHARDED_KEY_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/")
+
+
+def shard_key(digest: str, filename: str) -> str:
+    """Storage key for a file belonging to the upload with `digest`."""
+    return f"{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+def manifest_key(digest: str) -> str:
+    return shard_key(digest, f"{digest}.json")
+
+
+def is_content_addressed(key: str) -> bool:
+    """True for sharded content-hash keys, False for flat UUID names of older uploads."""
+    return bool(SHARDED_KEY_RE.match(key))
+
+
+def base_name(key: str) -> str:
+    """Key without extension or variant suffix; shared by all files of one upload."""
+    stem, _ = os.path.splitext(key)
+    return VARIANT_SUFFIX_RE.sub("", stem)
+
+
+class LocalImageStorage:
+    """Stores images on the local filesystem."""
+
+    def __init__(self, root: Path = UPLOAD_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir = self.root / ".tmp"
+        self.tmp_dir.mkdir(exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def put_file(self, key: str, local_path: str, content_type: str) -> None:
+        """Move `local_path` into place atomically (it must live under root)."""
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(local_path, target)
+
+    def read_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            return self.path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def touch(self, keys) -> None:
+        """Refresh modification times so the GC grace period restarts."""
+        for key in keys:
+            try:
+                os.utime(self.path(key))
+            except FileNotFoundError:
+                continue
+
+    def delete(self, keys) -> None:
+        for key in keys:
+            path = self.path(key)
+            path.unlink(missing_ok=True)
+            # Drop shard directories that became empty
+            for parent in (path.parent, path.parent.parent):
+                if parent == self.root:
+                    break
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+
+    def iter_keys(self) -> Iterator[Tuple[str, float]]:
+        """Yield (key, modified timestamp) for every stored file."""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                full = os.path.join(dirpath, filename)
+                try:
+                    mtime = os.stat(full).st_mtime
+                except FileNotFoundError:
+                    continue
+                yield os.path.relpath(full, self.root).replace(os.sep, "/"), mtime
+
+
+class S3ImageStorage:
+    """Stores images in an S3-compatible bucket."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.public_base_url = os.getenv("S3_PUBLIC_BASE_URL")
+        self.tmp_dir = UPLOAD_DIR / ".tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError:
+            return False
+
+    def put_file(self, key: str, local_path: str, content_type: str) -> None:
+        self.client.upload_file(
+            local_path,
+            self.bucket,
+            self._object_key(key),
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL},
+        )
+        os.unlink(local_path)
+
+    def read_bytes(self, key: str) -> Optional[bytes]:
+        from botocore.exceptions import ClientError
+
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError:
+            return None
+        return obj["Body"].read()
+
+    def touch(self, keys) -> None:
+        """Refresh LastModified (in-place copy) so the GC grace period restarts."""
+        for key in keys:
+            object_key = self._object_key(key)
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=object_key,
+                CopySource={"Bucket": self.bucket, "Key": object_key},
+                MetadataDirective="REPLACE",
+                ContentType="application/json" if key.endswith(".json") else "image/webp",
+                CacheControl=IMMUTABLE_CACHE_CONTROL,
+            )
+
+    def delete(self, keys) -> None:
+        keys = list(keys)
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": self._object_key(k)} for k in batch], "Quiet": True},
+            )
+
+    def iter_keys(self) -> Iterator[Tuple[str, float]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):], obj["LastModified"].timestamp()
+
+    def url_for(self, key: str) -> str:
+        """Public (CDN) URL if configured, otherwise a presigned GET URL."""
+        if self.public_base_url:
+            return f"{self.public_base_url.rstrip('/')}/{self._object_key(key)}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=3600,
+        )
+
+
+_storage = None
+
+
+def get_storage():
+    """Return the configured storage backend (created on first use)."""
+    global _storage
+    if _storage is None:
+        if os.getenv("IMAGE_STORAGE", "local").lower() == "s3":
+            _storage = S3ImageStorage(
+                bucket=os.environ["S3_BUCKET"],
+                prefix=os.getenv("S3_PREFIX", "uploads"),
+                endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            )
+        else:
+            _storage = LocalImageStorage()
+    return _storage
+
+
+_legacy_storage = None
+
+
+def get_legacy_storage() -> LocalImageStorage:
+    """Local storage for uploads that predate content addressing.
+
+    Those flat-named files were never copied to a bucket, so they stay on
+    local disk whichever backend is configured.
+    """
+    global _legacy_storage
+    storage = get_storage()
+    if isinstance(storage, LocalImageStorage):
+        return storage
+    if _legacy_storage is None:
+        _legacy_storage = LocalImageStorage()
+    return _legacy_storage
+
+
+def read_manifest(storage, digest: str) -> Optional[Dict[str, Any]]:
+    """Manifest of a previously stored upload, or None if it is new.
+
+    A hit also refreshes the upload's files so the GC cannot remove them
+    before the new post referencing them is created.
+    """
+    raw = storage.read_bytes(manifest_key(digest))
+    if raw is None:
+        return None
+    manifest = json.loads(raw)
+    storage.touch([*manifest["variants"].values(), manifest_key(digest)])
+    return manifest
+
+
+def store_derivatives(storage, digest: str, work_dir: str, derived: Dict[str, Any]) -> Dict[str, Any]:
+    """Move processed variants from `work_dir` into storage and write the manifest.
+
+    The manifest is written last, so its presence means the upload is complete.
+    """
+    variants = {}
+    for size, filename in derived["variants"].items():
+        key = shard_key(digest, filename)
+        storage.put_file(key, os.path.join(work_dir, filename), "image/webp")
+        variants[size] = key
+
+    manifest = {"variants": variants, "placeholder": derived["placeholder"]}
+    manifest_path = os.path.join(work_dir, f"{digest}.json")
+    with open(manifest_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    storage.put_file(manifest_key(digest), manifest_path, "application/json")
+    return manifest
+
+
+def make_work_dir(storage) -> str:
+    """Scratch directory for one upload, on the same filesystem as local storage."""
+    return tempfile.mkdtemp(dir=storage.tmp_dir)
+
+
+def remove_work_dir(path: str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+
+
+# ============================================================================
+# Orphan garbage collection
+# ============================================================================
+
+def referenced_bases(db) -> Set[str]:
+    """Base names of every image still referenced by a post."""
+    bases = set()
+    rows = db.execute(select(Post.image_url).where(Post.image_url.is_not(None))).scalars()
+    for url in rows:
+        _, sep, key = url.partition(IMAGES_URL_PREFIX)
+        if sep:
+            bases.add(base_name(key.split("?", 1)[0]))
+    return bases
+
+
+def collect_garbage(db, storage=None, grace_seconds: float = GC_GRACE_SECONDS) -> int:
+    """Delete stored files that no Post.image_url references. Returns files removed."""
+    storage = storage or get_storage()
+    referenced = referenced_bases(db)
+    if not referenced:
+        # An empty reference set almost always means a fresh or misconfigured
+        # database; never treat that as "every image is garbage".
+        logger.warning("Image GC skipped: no post references any image")
+        return 0
+    cutoff = time.time() - grace_seconds
+
+    orphans = [
+        key
+        for key, modified in storage.iter_keys()
+        if modified < cutoff and base_name(key) not in referenced
+    ]
+    if orphans:
+        storage.delete(orphans)
+        logger.info("Image GC removed %d unreferenced files", len(orphans))
+    return len(orphans)
+
+
+def _collect_with_session() -> int:
+    db = SessionLocal()
+    try:
+        return collect_garbage(db)
+    finally:
+        db.close()
+
+
+async def gc_loop(interval: float = GC_INTERVAL_SECONDS) -> None:
+    """Background task: periodically remove images of deleted or never-created posts."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_collect_with_session)
+        except Exception:
+            logger.exception("Image garbage collection failed")
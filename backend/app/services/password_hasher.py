@@ -0,0 +1,98 @@
+"""Password hashing off the event loop.
+
+bcrypt deliberately burns 100-300 ms of CPU per hash or verify. Running it
+inline in an `async def` endpoint stalls every other request on the worker,
+so it runs on a small dedicated thread pool instead (the bcrypt extension
+releases the GIL while hashing). The number of waiting requests is capped:
+past PASSWORD_HASH_MAX_PENDING, callers get PasswordHasherBusy and the API
+answers 503 rather than queueing work nobody will wait for.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many hash/verify calls are already waiting."""
+
+
+class PasswordHasher:
+    """Bounded thread pool for bcrypt with queue-depth metrics."""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def _submit(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusy("Too many password operations in progress")
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._wait_seconds += started - submitted
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._run_seconds += time.perf_counter() - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(pwd_context.verify, password, hashed_password)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_seconds / completed * 1000, 2),
+                "avg_run_ms": round(self._run_seconds / completed * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
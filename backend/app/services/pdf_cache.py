@@ -0,0 +1,204 @@
+"""Cache of rendered advisory PDFs, keyed by a hash of the advisory data.
+
+Farmers in one district asking for the same crop get identical advisory
+data, so the report is rendered once and then served from a small
+in-memory LRU, backed by files under PDF_CACHE_DIR that survive restarts
+and are shared by the workers on a host. Concurrent requests for a report
+that is still rendering wait for that render instead of starting another.
+The key doubles as the response ETag.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.services.pdf_renderer import format_date
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Bump when the PDF layout changes so reports cached by the old layout are not served
+RENDER_VERSION = "1"
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(BACKEND_DIR, ".cache", "pdf"))
+PDF_CACHE_MEMORY_BYTES = int(float(os.getenv("PDF_CACHE_MEMORY_MB", "32")) * 1024 * 1024)
+PDF_CACHE_TTL_SECONDS = float(os.getenv("PDF_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Expired files are swept after this many writes
+PRUNE_EVERY_WRITES = 200
+
+
+def _normalize(value: Any) -> Any:
+    # Float noise from upstream arithmetic should not produce a different report key
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def advisory_key(advisory_data: Dict[str, Any], crop_name: str) -> str:
+    """Content hash of everything that ends up in the report."""
+    advisory = dict(advisory_data)
+    # The report shows the update time to the minute; sub-second timestamps would make every key unique
+    advisory["last_updated"] = format_date(advisory.get("last_updated"))
+    payload = json.dumps(
+        {"version": RENDER_VERSION, "crop": crop_name.lower(), "advisory": _normalize(advisory)},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """Memory LRU in front of a directory of `<key>.pdf` files."""
+
+    def __init__(
+        self,
+        directory: str = PDF_CACHE_DIR,
+        memory_bytes: int = PDF_CACHE_MEMORY_BYTES,
+        ttl: float = PDF_CACHE_TTL_SECONDS,
+    ):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return data
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous)
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    # ------------------------------------------------------------------
+    # Disk tier (called in threads)
+    # ------------------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as handle:
+                return handle.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.part"
+        with open(tmp_path, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY_WRITES == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete cached files older than the TTL."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    async def _load(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        data = await asyncio.to_thread(self._read_disk, key)
+        if data is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            data = await render()
+            await asyncio.to_thread(self._write_disk, key, data)
+        self._put_memory(key, data)
+        return data
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Every waiter may have gone away; retrieve the outcome so it is not logged as lost
+        if not task.cancelled():
+            task.exception()
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Cached PDF for `key`, calling `render()` at most once across concurrent requests."""
+        data = self._get_memory(key)
+        if data is not None:
+            return data
+        task = self._inflight.get(key)
+        if task is None:
+            # Runs as its own task so a client disconnecting does not abort a render others wait on
+            task = asyncio.ensure_future(self._load(key, render))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            with self._lock:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+pdf_cache = PdfCache()
@@ -0,0 +1,356 @@
+"""Advisory PDF rendering in a bounded process pool.
+
+ReportLab layout is pure-Python CPU work (hundreds of milliseconds for a
+report), so it runs in worker processes: `build_advisory_pdf` takes the
+advisory dict and returns the PDF bytes, both picklable. At most
+PDF_RENDER_MAX_PENDING renders may be queued or running; past that callers
+get PdfRendererBusy and the API answers 503 with Retry-After.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+PDF_RENDER_MAX_PENDING = int(os.getenv("PDF_RENDER_MAX_PENDING", "16"))
+
+
+class PdfRendererBusy(RuntimeError):
+    """Raised when too many PDFs are already queued or rendering."""
+
+
+# Page setup and styles are built once per process (each render worker
+# inherits or builds them at import) instead of on every report
+PAGE_OPTIONS = {"pagesize": A4, "topMargin": 0.5*inch, "bottomMargin": 0.5*inch}
+
+_base_styles = getSampleStyleSheet()
+
+# Title style (Blue)
+title_style = ParagraphStyle(
+    'CustomTitle',
+    parent=_base_styles['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#0D6EFD'),
+    spaceAfter=12,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Bold'
+)
+
+# Section header style (Green)
+section_style = ParagraphStyle(
+    'CustomSection',
+    parent=_base_styles['Heading2'],
+    fontSize=16,
+    textColor=colors.HexColor('#198754'),
+    spaceAfter=12,
+    spaceBefore=12,
+    fontName='Helvetica-Bold'
+)
+
+# Normal text style
+normal_style = ParagraphStyle(
+    'CustomNormal',
+    parent=_base_styles['Normal'],
+    fontSize=11,
+    textColor=colors.black,
+    spaceAfter=6,
+    alignment=TA_JUSTIFY,
+    leading=14
+)
+
+# Card style for recommendations
+card_style = ParagraphStyle(
+    'CardStyle',
+    parent=_base_styles['Normal'],
+    fontSize=10,
+    textColor=colors.black,
+    spaceAfter=8,
+    leftIndent=12,
+    rightIndent=12,
+    backColor=colors.HexColor('#F0F8FF'),
+    borderPadding=8
+)
+
+# Footer style (Italic)
+footer_style = ParagraphStyle(
+    'FooterStyle',
+    parent=_base_styles['Normal'],
+    fontSize=9,
+    textColor=colors.grey,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Oblique'
+)
+
+BREAKDOWN_TABLE_STYLE = TableStyle([
+    # Header row
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0D6EFD')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    # Data rows
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F9FA')]),
+])
+
+
+def format_date(date_string: Optional[str]) -> str:
+    """Format date string for display."""
+    if not date_string or date_string == "recently":
+        return "Recently"
+    try:
+        # Try to parse ISO format or other common formats
+        if isinstance(date_string, str):
+            # Handle various date formats
+            if "T" in date_string:
+                date_obj = datetime.fromisoformat(date_string.replace("Z", "+00:00"))
+            else:
+                date_obj = datetime.strptime(date_string, "%Y-%m-%d %H:%M:%S")
+            return date_obj.strftime("%B %d, %Y at %I:%M %p")
+    except:
+        pass
+    return str(date_string)
+
+
+def advisory_story(advisory_data: Dict[str, Any], crop_name: str) -> List[Any]:
+    """Flowables for one advisory report."""
+    # Container for PDF content
+    story = []
+    
+    # Build PDF content
+    
+    # Title
+    # Paragraphs parse their text as markup: every value from the advisory
+    # (farm names, Gemini output, rule text) is escaped
+    crop_name_display = escape(str(advisory_data.get('crop', crop_name.capitalize())))
+    title_text = f"Crop Advisory Report: {crop_name_display}"
+    story.append(Paragraph(title_text, title_style))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Priority and Severity badges
+    priority = escape(str(advisory_data.get('priority', 'N/A')))
+    severity = escape(str(advisory_data.get('severity', 'N/A')))
+    priority_text = f"<b>Priority:</b> {priority} | <b>Severity:</b> {severity}"
+    story.append(Paragraph(priority_text, normal_style))
+    story.append(Spacer(1, 0.1*inch))
+    
+    # Last Updated
+    last_updated = escape(format_date(advisory_data.get('last_updated')))
+    confidence = advisory_data.get('rule_score', 0)
+    confidence_percent = int(confidence * 100) if confidence else 0
+    date_text = f"<b>Last Updated:</b> {last_updated}"
+    if confidence_percent > 0:
+        date_text += f" | <b>Confidence:</b> {confidence_percent}%"
+    story.append(Paragraph(date_text, normal_style))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Analysis Section
+    story.append(Paragraph("Analysis", section_style))
+    analysis = advisory_data.get('analysis', advisory_data.get('summary', 'No analysis available.'))
+    story.append(Paragraph(escape(str(analysis)), normal_style))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Recommendations Section
+    recommendations = advisory_data.get('recommendations', [])
+    if recommendations and len(recommendations) > 0:
+        story.append(Paragraph("Recommended Actions", section_style))
+        
+        for idx, rec in enumerate(recommendations, 1):
+            rec_title = escape(str(rec.get('title', f'Recommendation {idx}')))
+            rec_desc = escape(str(rec.get('desc', rec.get('description', ''))))
+            rec_priority = escape(str(rec.get('priority', 'Medium') or ''))
+            rec_timeline = escape(str(rec.get('timeline') or ''))
+            
+            # Create recommendation card
+            rec_text = f"<b>{rec_title}</b>"
+            if rec_priority:
+                rec_text += f" <i>({rec_priority} Priority)</i>"
+            rec_text += f"<br/>{rec_desc}"
+            if rec_timeline:
+                rec_text += f"<br/><i>Timeline: {rec_timeline}</i>"
+            
+            story.append(Spacer(1, 0.1*inch))
+            story.append(Paragraph(rec_text, card_style))
+            story.append(Spacer(1, 0.1*inch))
+    else:
+        story.append(Paragraph("Recommended Actions", section_style))
+        story.append(Paragraph("No specific recommendations available at this time.", normal_style))
+    
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Rule Breakdown Table
+    rule_breakdown = advisory_data.get('rule_breakdown', {})
+    if rule_breakdown:
+        story.append(Paragraph("Rule Breakdown", section_style))
+        
+        # Prepare table data
+        table_data = [['Category', 'Score', 'Rules Triggered']]
+        
+        for category in ['pest', 'irrigation', 'market']:
+            cat_data = rule_breakdown.get(category, {})
+            score = cat_data.get('score', 0)
+            fired = cat_data.get('fired', [])
+            fired_count = len(fired) if isinstance(fired, list) else 0
+            score_percent = int(score * 100) if score else 0
+            
+            category_name = category.capitalize()
+            table_data.append([
+                category_name,
+                f"{score_percent}%",
+                str(fired_count)
+            ])
+        
+        # Create table
+        table = Table(table_data, colWidths=[2*inch, 1.5*inch, 2*inch])
+        table.setStyle(BREAKDOWN_TABLE_STYLE)
+        
+        story.append(table)
+        story.append(Spacer(1, 0.2*inch))
+    
+    # Fired Rules (if available)
+    fired_rules = advisory_data.get('fired_rules', [])
+    if fired_rules and len(fired_rules) > 0:
+        story.append(Paragraph("Triggered Rules", section_style))
+        rules_text = "<br/>".join([f"• {escape(str(rule))}" for rule in fired_rules[:10]])  # Limit to 10 rules
+        if len(fired_rules) > 10:
+            rules_text += f"<br/>... and {len(fired_rules) - 10} more"
+        story.append(Paragraph(rules_text, normal_style))
+        story.append(Spacer(1, 0.2*inch))
+    
+    # Footer
+    story.append(Spacer(1, 0.3*inch))
+    footer_text = "Generated by krushiRakshak AI"
+    story.append(Paragraph(footer_text, footer_style))
+    story.append(Spacer(1, 0.1*inch))
+    timestamp = datetime.now().strftime("%B %d, %Y at %I:%M %p")
+    story.append(Paragraph(f"Report generated on {timestamp}", footer_style))
+    return story
+
+
+def _build(story: List[Any]) -> bytes:
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, **PAGE_OPTIONS)
+    doc.build(story)
+    
+    # Get PDF bytes
+    buffer.seek(0)
+    pdf_bytes = buffer.read()
+    buffer.close()
+    return pdf_bytes
+
+
+def build_advisory_pdf(advisory_data: Dict[str, Any], crop_name: str) -> bytes:
+    """Lay out the advisory report. Runs inside a worker process."""
+    return _build(advisory_story(advisory_data, crop_name))
+
+
+def build_advisory_sections_pdf(sections: List[Tuple[Dict[str, Any], str]]) -> bytes:
+    """One document with a report per (advisory, crop) section, each starting on a new page."""
+    story: List[Any] = []
+    for advisory_data, crop_name in sections:
+        if story:
+            story.append(PageBreak())
+        story.extend(advisory_story(advisory_data, crop_name))
+    return _build(story)
+
+
+class PdfRenderer:
+    """Process pool for PDF layout with queue-depth limits and metrics."""
+
+    def __init__(self, workers: int = PDF_RENDER_WORKERS, max_pending: int = PDF_RENDER_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._render_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Started on first use, so importing the app does not fork workers
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def render(self, advisory_data: Dict[str, Any], crop_name: str) -> bytes:
+        return await self._run(build_advisory_pdf, advisory_data, crop_name)
+
+    async def render_sections(self, sections: List[Tuple[Dict[str, Any], str]]) -> bytes:
+        return await self._run(build_advisory_sections_pdf, sections)
+
+    async def _run(self, build: Callable[..., bytes], *args: Any) -> bytes:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PdfRendererBusy("Too many PDF reports are being generated")
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            executor = self._get_executor()
+            pdf_bytes = await asyncio.get_running_loop().run_in_executor(
+                executor, build, *args
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next request
+            with self._lock:
+                self._failed += 1
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        except BaseException:
+            with self._lock:
+                self._failed += 1
+            raise
+        else:
+            with self._lock:
+                self._completed += 1
+                self._render_seconds += time.perf_counter() - started
+            return pdf_bytes
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._pending,
+                "queued": max(0, self._pending - self.workers),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_render_ms": round(self._render_seconds / completed * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pdf_renderer = PdfRenderer()
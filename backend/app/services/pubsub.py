@@ -0,0 +1,141 @@
+"""Publish/subscribe fan-out for realtime community events.
+
+Events are plain dicts with at least `type`, `post_id`, `crop` and `region`.
+Subscribers choose the crops and regions they care about and receive only
+matching events through a bounded queue.
+
+COMMUNITY_BROKER selects the transport:
+- `memory` (default): events stay inside this worker process.
+- `postgres`: events go through PostgreSQL LISTEN/NOTIFY, so clients
+  connected to any worker see events published by every other worker.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Set
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+NOTIFY_CHANNEL = "community_events"
+
+
+class Subscription:
+    """One connected client and the crops/regions it subscribed to."""
+
+    def __init__(self, crops: Optional[Iterable[str]] = None, regions: Optional[Iterable[str]] = None):
+        self.crops = {c.lower() for c in crops or ()}
+        self.regions = {r.lower() for r in regions or ()}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.crops and (event.get("crop") or "").lower() not in self.crops:
+            return False
+        if self.regions and (event.get("region") or "").lower() not in self.regions:
+            return False
+        return True
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Queue an event, dropping the oldest one if the client is falling behind."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class InProcessBroker:
+    """Delivers events to subscribers connected to this worker."""
+
+    def __init__(self):
+        self._subscribers: Set[Subscription] = set()
+
+    def subscribe(self, crops=None, regions=None) -> Subscription:
+        subscription = Subscription(crops, regions)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        for subscription in list(self._subscribers):
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        self._deliver(event)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class PostgresNotifyBroker(InProcessBroker):
+    """Fans events out across workers with PostgreSQL LISTEN/NOTIFY.
+
+    Publishing issues `pg_notify`; every worker (including the publisher)
+    holds one LISTEN connection and delivers what it receives locally.
+    """
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self._listener: Optional[asyncio.Task] = None
+
+    def _notify(self, payload: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        payload = json.dumps(event, default=str)
+        try:
+            await asyncio.to_thread(self._notify, payload)
+        except Exception:
+            logger.exception("Failed to publish community event")
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        conninfo = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    async for notify in conn.notifies():
+                        self._deliver(json.loads(notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Community event listener disconnected; retrying")
+                await asyncio.sleep(5)
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+
+def create_broker():
+    if os.getenv("COMMUNITY_BROKER", "memory").lower() == "postgres":
+        from ..database import engine
+
+        return PostgresNotifyBroker(engine)
+    return InProcessBroker()
+
+
+broker = create_broker()
@@ -0,0 +1,109 @@
+"""Short-lived cache of authenticated users, keyed by token subject.
+
+`get_current_user` runs on nearly every request; caching a lightweight
+snapshot of the user saves a database round trip each time. Entries expire
+after USER_CACHE_TTL_SECONDS and are dropped explicitly when the profile
+changes or the account is deleted. Invalidation is per worker process, so
+the TTL bounds how stale another worker's copy can be.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Read-only copy of the User columns request handlers need."""
+
+    id: int
+    email: str
+    name: Optional[str]
+    phone: Optional[str]
+    user_type: Optional[str]
+    crop: Optional[str]
+    location: Optional[str]
+    state: Optional[str]
+    district: Optional[str]
+    village: Optional[str]
+    is_active: Optional[bool]
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            phone=user.phone,
+            user_type=user.user_type,
+            crop=user.crop,
+            location=user.location,
+            state=user.state,
+            district=user.district,
+            village=user.village,
+            is_active=user.is_active,
+        )
+
+
+def subject_key(user_id: Optional[int] = None, email: Optional[str] = None) -> str:
+    """Cache key for a token: the integer user id, or the email of older tokens."""
+    return f"uid:{user_id}" if user_id is not None else f"email:{email}"
+
+
+class UserCache:
+    """Bounded LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, UserSnapshot]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[UserSnapshot]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, snapshot: UserSnapshot) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int, email: Optional[str] = None) -> None:
+        """Forget a user under both id- and email-keyed subjects."""
+        with self._lock:
+            self._entries.pop(subject_key(user_id=user_id), None)
+            if email is not None:
+                self._entries.pop(subject_key(email=email), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache()
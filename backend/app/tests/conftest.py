@@ -0,0 +1,61 @@
+"""Shared pytest setup for backend tests."""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_DIR = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# app.database refuses to import without a DATABASE_URL; use a throwaway SQLite file
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+import asyncio  # noqa: E402
+
+import pytest  # noqa: E402
+
+# Imported after DATABASE_URL is set
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models import Post, User, UserStats  # noqa: E402
+
+
+def run_committed(job):
+    """Run `await job(db)` in a fresh AsyncSession, commit and return its result."""
+    async def run():
+        async with AsyncSessionLocal() as db:
+            result = await job(db)
+            await db.commit()
+            return result
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def community_db():
+    """Session on the test database; users, posts and stats are removed afterwards."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.query(UserStats).delete()
+        db.query(Post).delete()
+        db.query(User).delete()
+        db.commit()
+        db.close()
+
+
+@pytest.fixture
+def seeded_post(community_db):
+    """A post with no likes or comments yet; returns (post_id, author_id)."""
+    author = User(email="author@example.com", hashed_password="x")
+    community_db.add(author)
+    community_db.flush()
+    post = Post(content="Leaf curl", author_id=author.id, likes_count=0, comments_count=0)
+    community_db.add(post)
+    community_db.commit()
+    return post.id, author.id
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app import fusion_engine
+from app.services.advisory_cache import AdvisoryCache, advisory_cache_key
+
+
+def test_key_changes_with_the_weather_hour_and_rules():
+    at_ten = datetime(2024, 6, 1, 10, 5, tzinfo=timezone.utc)
+    assert advisory_cache_key("Cotton", (18.52, 73.86), "r1", at_ten) == advisory_cache_key(
+        "cotton", (18.52, 73.86), "r1", at_ten.replace(minute=55)
+    )
+    assert advisory_cache_key("cotton", (18.52, 73.86), "r1", at_ten) != advisory_cache_key(
+        "cotton", (18.52, 73.86), "r1", at_ten.replace(hour=11)
+    )
+    assert advisory_cache_key("cotton", (18.52, 73.86), "r1", at_ten) != advisory_cache_key(
+        "cotton", (18.52, 73.86), "r2", at_ten
+    )
+
+
+def test_json_and_pdf_requests_share_one_computation(monkeypatch):
+    computed = []
+
+    async def assemble_advisory(crop, weather, geo_info, lat, lon, ctx):
+        computed.append((lat, lon))
+        await asyncio.sleep(0.01)
+        return {"crop": crop.capitalize()}
+
+    async def get_realtime_weather(lat, lon):
+        return {"temperature": 31}
+
+    async def reverse_geocode(lat, lon):
+        return {"district": "Pune"}
+
+    monkeypatch.setattr(fusion_engine, "get_realtime_weather", get_realtime_weather)
+    monkeypatch.setattr(fusion_engine, "reverse_geocode", reverse_geocode)
+    monkeypatch.setattr(fusion_engine, "assemble_advisory", assemble_advisory)
+    monkeypatch.setattr(fusion_engine, "advisory_cache", AdvisoryCache())
+
+    async def run():
+        # A dashboard view and a PDF download racing, then a neighbour a few hundred metres away
+        first, second = await asyncio.gather(
+            fusion_engine.compute_advisory("cotton", location="18.5204,73.8567"),
+            fusion_engine.compute_advisory("Cotton", latitude=18.5204, longitude=73.8567),
+        )
+        third = await fusion_engine.compute_advisory("cotton", location="18.5231,73.8581")
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == second == third == {"crop": "Cotton"}
+    assert computed == [(18.52, 73.86)]
+    assert fusion_engine.advisory_cache.stats() == {"size": 1, "hits": 1, "misses": 1, "coalesced": 1}
+
+
+def test_failures_are_not_cached():
+    cache = AdvisoryCache()
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream down")
+        return {"crop": "Cotton"}
+
+    async def run():
+        try:
+            await cache.get_or_compute(("cotton",), compute)
+        except RuntimeError:
+            pass
+        return await cache.get_or_compute(("cotton",), compute)
+
+    assert asyncio.run(run()) == {"crop": "Cotton"}
+    assert len(attempts) == 2
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth import create_access_token, user_from_token
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.models import User
+from app.services.user_cache import user_cache
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.query(User).delete()
+        session.commit()
+        session.close()
+        user_cache.clear()
+
+
+def _token(user):
+    return create_access_token(data={"sub": user.email, "uid": user.id})
+
+
+def _resolve(token):
+    async def resolve():
+        async with AsyncSessionLocal() as session:
+            return await user_from_token(token, session)
+
+    return asyncio.run(resolve())
+
+
+def test_token_of_deleted_account_does_not_resolve_to_reused_id(db):
+    old = User(email="a@example.com", hashed_password="x")
+    db.add(old)
+    db.commit()
+    old_token = _token(old)
+    assert _resolve(old_token).email == "a@example.com"
+
+    # The account is deleted and its id handed to the next sign-up
+    user_id = old.id
+    db.delete(old)
+    db.commit()
+    user_cache.invalidate(user_id, "a@example.com")
+    victim = User(id=user_id, email="victim@example.com", hashed_password="x")
+    db.add(victim)
+    db.commit()
+
+    with pytest.raises(HTTPException) as raised:
+        _resolve(old_token)
+    assert raised.value.status_code == 401
+
+    # Also when the victim's own request has already cached the id
+    assert _resolve(_token(victim)).email == "victim@example.com"
+    with pytest.raises(HTTPException) as raised:
+        _resolve(old_token)
+    assert raised.value.status_code == 401
+
+
+def test_tokens_without_uid_resolve_by_email(db):
+    user = User(email="legacy@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    token = create_access_token(data={"sub": user.email})
+    assert _resolve(token).id == user.id
+    assert _resolve(token).id == user.id  # served from the cache
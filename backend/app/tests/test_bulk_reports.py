@@ -0,0 +1,115 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+
+from app import fusion_engine
+from app.auth import create_access_token
+from app.database import Base, SessionLocal, engine
+from app.fusion_engine import FusionContext
+from app.models import User
+from app.routes import advisory_pdf
+from app.schemas import BulkReportFarm, BulkReportRequest
+from app.services.advisory_cache import AdvisoryCache
+
+
+def _fake_upstream(monkeypatch):
+    calls = {"weather": 0, "geocode": 0, "market": 0}
+
+    async def get_realtime_weather(lat, lon):
+        calls["weather"] += 1
+        await asyncio.sleep(0.01)
+        return {"temperature": 30, "timestamp": "2024-06-01T10:00:00Z"}
+
+    async def reverse_geocode(lat, lon):
+        calls["geocode"] += 1
+        return {"district": "Pune", "state": "Maharashtra"}
+
+    async def fetch_market_price(crop, district=None):
+        calls["market"] += 1
+        return {"price": 7000, "price_change_percent": 1.5}
+
+    async def assemble_advisory(crop, weather, geo_info, lat, lon, ctx):
+        if crop == "mango":
+            raise HTTPException(status_code=500, detail="no rules for mango")
+        market = await ctx.market(crop, geo_info["district"])
+        return {"crop": crop.capitalize(), "lat": lat, "price": market["price"]}
+
+    monkeypatch.setattr(fusion_engine, "get_realtime_weather", get_realtime_weather)
+    monkeypatch.setattr(fusion_engine, "reverse_geocode", reverse_geocode)
+    monkeypatch.setattr(fusion_engine, "fetch_market_price", fetch_market_price)
+    monkeypatch.setattr(fusion_engine, "assemble_advisory", assemble_advisory)
+    monkeypatch.setattr(fusion_engine, "advisory_cache", AdvisoryCache())
+    return calls
+
+
+def test_farms_in_one_area_share_upstream_lookups(monkeypatch):
+    calls = _fake_upstream(monkeypatch)
+    farms = [
+        BulkReportFarm(crop="cotton", latitude=18.5204, longitude=73.8567),
+        BulkReportFarm(crop="cotton", latitude=18.5231, longitude=73.8581),
+        BulkReportFarm(crop="wheat", latitude=18.5210, longitude=73.8570),
+        BulkReportFarm(crop="cotton", latitude=19.9975, longitude=73.7898),
+    ]
+    ctx = FusionContext()
+
+    async def run():
+        return await asyncio.gather(*(advisory_pdf._farm_advisory(farm, ctx) for farm in farms))
+
+    advisories = asyncio.run(run())
+    assert calls == {"weather": 2, "geocode": 2, "market": 2}
+    # Advisories are computed for the ~1 km tile, once per crop
+    assert [a["lat"] for a in advisories] == [18.52, 18.52, 18.52, 20.0]
+    assert fusion_engine.advisory_cache.stats()["misses"] == 3
+
+
+def test_zip_report_streams_entries_in_order_and_lists_failures(monkeypatch):
+    _fake_upstream(monkeypatch)
+
+    async def render(advisory_data, crop):
+        await asyncio.sleep(0.01 if crop == "cotton" else 0)
+        return f"%PDF {advisory_data['crop']}".encode()
+
+    monkeypatch.setattr(advisory_pdf, "_render_when_free", render)
+    farms = [
+        BulkReportFarm(crop="cotton", name="Ramesh Patil", latitude=18.52, longitude=73.85),
+        BulkReportFarm(crop="mango", name="Sita", latitude=18.52, longitude=73.85),
+        BulkReportFarm(crop="wheat", village="Wagholi", latitude=18.58, longitude=73.98),
+    ]
+
+    async def collect():
+        return [chunk async for chunk in advisory_pdf._zip_reports(farms, FusionContext())]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) == 4  # two reports, errors.txt, central directory
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.namelist() == ["0001_Ramesh_Patil_cotton.pdf", "0003_Wagholi_wheat.pdf", "errors.txt"]
+    assert archive.read("0003_Wagholi_wheat.pdf") == b"%PDF Wheat"
+    assert b"0002_Sita_mango.pdf: no rules for mango" in archive.read("errors.txt")
+
+
+def test_district_reports_are_limited_to_officers():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    farmer = User(email="bulk-farmer@example.com", hashed_password="x", user_type="farmer", district="Pune")
+    expert = User(email="bulk-expert@example.com", hashed_password="x", user_type="expert")
+    db.add_all([farmer, expert])
+    db.commit()
+
+    def request(user, body):
+        token = create_access_token(data={"sub": user.email, "uid": user.id})
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(advisory_pdf.generate_bulk_advisory_report(body, token=token))
+        return raised.value.status_code
+
+    try:
+        assert request(farmer, BulkReportRequest(district="Pune")) == 403
+        # The farmer has no crop on file, so the officer's filter matches nobody
+        assert request(expert, BulkReportRequest(district="Pune")) == 404
+        assert request(farmer, BulkReportRequest(farms=[BulkReportFarm(crop="cotton")] * 600)) == 413
+    finally:
+        db.query(User).delete()
+        db.commit()
+        db.close()
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from app import crud
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import Post, PostLike, User
+from app.services import counter_buffer
+from app.services.counter_buffer import CounterBuffer, apply_counter_delta, flush_pending, reconcile_counters
+
+
+@pytest.fixture
+def post(seeded_post, community_db, monkeypatch):
+    """A post with two likers; every counter update counts as hot."""
+    monkeypatch.setattr(counter_buffer, "counter_buffer", CounterBuffer(threshold=1))
+    post_id, author_id = seeded_post
+    liker = User(email="liker@example.com", hashed_password="x")
+    community_db.add(liker)
+    community_db.commit()
+    return post_id, [author_id, liker.id]
+
+
+def _like(post_id, user_id, commit=True):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            delta, _ = await crud.toggle_post_like(db, post_id, user_id)
+            value = await apply_counter_delta(db, post_id, "likes_count", delta)
+            if commit:
+                await db.commit()
+            else:
+                await db.rollback()
+            return value
+
+    return asyncio.run(run())
+
+
+def _stored(post_id):
+    with SessionLocal() as db:
+        return db.get(Post, post_id).likes_count
+
+
+def test_post_becomes_hot_after_threshold_within_window(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(counter_buffer.time, "monotonic", lambda: now[0])
+    buffer = CounterBuffer(threshold=3, window=10)
+    assert [buffer.is_hot(1) for _ in range(3)] == [False, False, True]
+
+    now[0] += 11
+    assert buffer.is_hot(1) is False
+    buffer.add(1, "likes_count", 1)
+    assert buffer.is_hot(1) is True  # stays hot while deltas are pending
+
+
+def test_deltas_are_buffered_only_after_commit(post):
+    post_id, (first, second) = post
+    buffer = counter_buffer.counter_buffer
+
+    assert _like(post_id, first, commit=False) == 1
+    assert buffer.pending(post_id, "likes_count") == 0
+
+    assert _like(post_id, first) == 1
+    assert _like(post_id, second) == 2
+    assert buffer.pending(post_id, "likes_count") == 2
+    assert _stored(post_id) == 0
+
+    with SessionLocal() as db:
+        assert flush_pending(db) == 1
+    assert _stored(post_id) == 2
+    assert buffer.pending(post_id, "likes_count") == 0
+
+
+def test_flush_restores_deltas_when_it_fails(post, monkeypatch):
+    post_id, (first, _) = post
+    _like(post_id, first)
+
+    def fail(db, post_ids):
+        raise RuntimeError("database went away")
+
+    refresh_ranks = counter_buffer.refresh_ranks
+    monkeypatch.setattr(counter_buffer, "refresh_ranks", fail)
+    with SessionLocal() as db, pytest.raises(RuntimeError):
+        flush_pending(db)
+    assert _stored(post_id) == 0
+    assert counter_buffer.counter_buffer.pending(post_id, "likes_count") == 1
+
+    monkeypatch.setattr(counter_buffer, "refresh_ranks", refresh_ranks)
+    with SessionLocal() as db:
+        flush_pending(db)
+    assert _stored(post_id) == 1
+
+
+def test_reconcile_and_other_flushes_cannot_double_count(post):
+    post_id, (first, second) = post
+    _like(post_id, first)
+    _like(post_id, second)
+
+    # Another worker's reconcile pass sees the committed likes before this worker flushes
+    with SessionLocal() as db:
+        assert reconcile_counters(db) == 1
+    assert _stored(post_id) == 2
+    with SessionLocal() as db:
+        flush_pending(db)
+    assert _stored(post_id) == 2
+
+    with SessionLocal() as db:
+        db.query(Post).filter(Post.id == post_id).update({"likes_count": 7})
+        db.query(PostLike).filter(PostLike.user_id == second).delete()
+        db.commit()
+        assert reconcile_counters(db) == 1
+        assert reconcile_counters(db) == 0
+    assert _stored(post_id) == 1
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.database import (
+    PoolMonitor,
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    _configure_sqlite_connection,
+    engine_options,
+    get_db,
+    request_pool,
+)
+
+
+def test_statement_timeout_is_passed_per_driver():
+    sync = engine_options("postgresql+psycopg://u:p@db/agri", 5, 5)
+    assert sync["connect_args"]["options"].startswith("-c statement_timeout=")
+    assert sync["pool_size"] == 5 and sync["max_overflow"] == 5
+
+    asyncpg = engine_options("postgresql+asyncpg://u:p@db/agri", 10, 0)
+    assert "statement_timeout" in asyncpg["connect_args"]["server_settings"]
+
+    assert "connect_args" not in engine_options("sqlite:///dev.db", 5, 5)
+    assert engine_options("sqlite:///dev.db", 5, 5)["poolclass"] is TimedQueuePool
+    assert engine_options("sqlite+aiosqlite:///dev.db", 5, 5)["poolclass"] is TimedAsyncAdaptedQueuePool
+    assert engine_options("sqlite://", 5, 5) == {}
+
+
+def test_sqlite_connections_use_wal():
+    path = os.path.join(tempfile.mkdtemp(), "wal.db")
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", _configure_sqlite_connection)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    engine.dispose()
+
+
+def test_monitor_tracks_saturation_and_timeouts():
+    path = os.path.join(tempfile.mkdtemp(), "pool.db")
+    engine = create_engine(f"sqlite:///{path}", pool_size=1, max_overflow=1, pool_timeout=0.1)
+    monitor = PoolMonitor(engine, "test", capacity=2)
+
+    first = engine.connect()
+    second = engine.connect()
+    stats = monitor.metrics()
+    assert stats["checked_out"] == 2
+    assert stats["saturation"] == 1.0
+
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    monitor.record_timeout()
+
+    first.close()
+    second.close()
+    stats = monitor.metrics()
+    assert stats["checked_out"] == 0
+    assert stats["peak_checked_out"] == 2
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["max_hold_ms"] > 0
+    engine.dispose()
+
+
+def test_checkout_waits_are_timed_by_the_pool():
+    path = os.path.join(tempfile.mkdtemp(), "wait.db")
+    engine = create_engine(f"sqlite:///{path}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=5)
+    monitor = PoolMonitor(engine, "test", capacity=1)
+
+    first = engine.connect()
+    threading.Timer(0.2, first.close).start()
+    with engine.connect():
+        pass
+    stats = monitor.metrics()
+    assert stats["checkouts"] == 2
+    assert stats["max_wait_ms"] >= 150
+    assert stats["avg_wait_ms"] < stats["max_wait_ms"]
+    engine.dispose()
+
+
+def test_get_db_checks_out_lazily():
+    async def use_session():
+        sessions = get_db()
+        db = await sessions.__anext__()
+        before = request_pool.checked_out()
+        await db.execute(text("SELECT 1"))
+        during = request_pool.checked_out()
+        await sessions.aclose()
+        return before, during
+
+    checkouts = request_pool.metrics()["checkouts"]
+    assert asyncio.run(use_session()) == (0, 1)
+    assert request_pool.metrics()["checkouts"] == checkouts + 1
+    assert request_pool.metrics()["avg_wait_ms"] is not None
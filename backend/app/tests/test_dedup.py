@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+
+from app import community
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.models import Post, User, UserStats
+from app.schemas import PostCreate
+from app.services import dedup
+
+QUESTION = "My cotton leaves are turning yellow with brown spots after the rain. What spray should I use?"
+
+
+def test_near_duplicate_is_found():
+    index = dedup.DuplicateIndex()
+    index.add(1, author_id=7, sig=dedup.signature(QUESTION))
+    index.add(2, author_id=8, sig=dedup.signature("When is the right time to sow wheat in Punjab this year?"))
+
+    match = index.find(dedup.signature(QUESTION.upper() + "!!"))
+    assert match is not None
+    assert (match.post_id, match.author_id) == (1, 7)
+
+    edited = "My cotton leaves are turning yellow with brown spots after rain. What spray should I use?"
+    assert index.find(dedup.signature(edited)) is not None
+
+
+def test_distinct_and_short_posts_are_not_duplicates():
+    index = dedup.DuplicateIndex()
+    index.add(1, author_id=7, sig=dedup.signature(QUESTION))
+
+    assert index.find(dedup.signature("Rice prices went up at the Nashik mandi today, selling tomorrow.")) is None
+    assert dedup.signature("thanks") is None
+    reworded = "Cotton leaves turning yellow with brown spots after rain, which spray should I use?"
+    assert index.find(dedup.signature(reworded)) is None
+
+
+def test_removed_posts_are_not_matched():
+    index = dedup.DuplicateIndex()
+    index.add(1, author_id=7, sig=dedup.signature(QUESTION))
+    index.remove(1)
+    assert index.find(dedup.signature(QUESTION)) is None
+    assert len(index) == 0
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    author = User(email="dedup@example.com", hashed_password="x")
+    session.add(author)
+    session.commit()
+    try:
+        yield session, author.id
+    finally:
+        session.query(Post).delete()
+        session.query(User).delete()
+        session.commit()
+        session.close()
+
+
+def test_catch_up_indexes_a_lower_id_committed_late(db):
+    session, author_id = db
+    base = session.query(Post.id).order_by(Post.id.desc()).limit(1).scalar() or 0
+    index = dedup.DuplicateIndex()
+    index.rebuild(session)
+
+    session.add_all([
+        Post(id=base + 1, author_id=author_id, content="Wheat sowing dates for Punjab this season?"),
+        Post(id=base + 3, author_id=author_id, content="Best drip irrigation spacing for sugarcane rows?"),
+    ])
+    session.commit()
+    assert index.catch_up(session) == 2
+    assert index.gaps() == [base + 2]
+
+    # Another worker's transaction holding id base+2 commits only now
+    session.add(Post(id=base + 2, author_id=author_id, content=QUESTION))
+    session.commit()
+    assert index.catch_up(session) == 1
+    assert index.find(dedup.signature(QUESTION)).post_id == base + 2
+    assert index.gaps() == []
+
+
+def test_gaps_expire(monkeypatch):
+    index = dedup.DuplicateIndex()
+    index.add(5, author_id=7, sig=None)
+    assert index.gaps() == [1, 2, 3, 4]
+    monkeypatch.setattr(dedup, "GAP_TIMEOUT_SECONDS", 0)
+    assert index.gaps() == []
+    assert index.last_post_id == 5
+
+
+def test_copy_of_another_users_post_is_flagged_to_its_author(db, monkeypatch):
+    session, author_id = db
+    copier = User(email="copier@example.com", hashed_password="x")
+    session.add(copier)
+    session.commit()
+    monkeypatch.setattr(dedup, "duplicate_index", dedup.DuplicateIndex())
+
+    def call(endpoint, viewer_id, **kwargs):
+        async def run():
+            async with AsyncSessionLocal() as async_db:
+                return await endpoint(current_user=await async_db.get(User, viewer_id), db=async_db, **kwargs)
+
+        return asyncio.run(run())
+
+    def post(user_id, content):
+        response = Response()
+        response.status_code = None  # as FastAPI injects it: unset means the route's 201
+        result = call(community.create_post, user_id, post_data=PostCreate(content=content), response=response)
+        return response.status_code, result
+
+    try:
+        status, original = post(author_id, QUESTION)
+        assert status is None and original.duplicate_of is None
+
+        status, copy = post(copier.id, QUESTION + "!")
+        assert status == 202
+        assert copy["duplicate_of"] == original.id
+
+        status, repost = post(author_id, QUESTION)
+        assert status == 200 and repost["id"] == original.id
+
+        # Not listed, but the author still sees it, flagged, among their own posts
+        listed = call(community.get_posts, copier.id)
+        assert [p["id"] for p in listed] == [original.id]
+        own = call(community.get_user_posts, copier.id, user_id=copier.id)
+        assert [(p["id"], p["duplicate_of"]) for p in own] == [(copy["id"], original.id)]
+    finally:
+        session.query(UserStats).delete()
+        session.commit()
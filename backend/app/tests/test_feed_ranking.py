@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.models import Post, User
+from app.services import feed_ranking
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.query(Post).delete()
+        session.query(User).delete()
+        session.commit()
+        session.close()
+
+
+def test_engagement_outweighs_small_age_difference():
+    now = datetime.now(timezone.utc)
+    fresh = feed_ranking.rank_score(0, 0, now)
+    popular = feed_ranking.rank_score(50, 10, now - timedelta(hours=6))
+    assert popular > fresh
+    assert feed_ranking.rank_score(0, 0, now - timedelta(days=7)) < fresh
+
+
+def test_feed_prefers_matching_posts_and_paginates(db):
+    author = User(email="feed@example.com", hashed_password="x")
+    db.add(author)
+    db.flush()
+    now = datetime.now(timezone.utc)
+    specs = [
+        ("cotton", "Maharashtra"),
+        ("cotton", "Punjab"),
+        ("wheat", "Maharashtra"),
+        ("wheat", "Punjab"),
+        (None, None),
+    ]
+    for crop, region in specs:
+        db.add(Post(
+            content=f"{crop} {region}",
+            author_id=author.id,
+            crop=crop,
+            region=region,
+            created_at=now,
+            rank_score=feed_ranking.rank_score(0, 0, now),
+        ))
+    db.commit()
+
+    async def read_pages():
+        async with AsyncSessionLocal() as session:
+            first, cursor = await feed_ranking.ranked_feed(session, crop="cotton", region="Maharashtra", limit=3)
+            rest, last_cursor = await feed_ranking.ranked_feed(
+                session, crop="cotton", region="Maharashtra", limit=3, cursor=feed_ranking.decode_cursor(cursor)
+            )
+        return first, cursor, rest, last_cursor
+
+    first, cursor, rest, last_cursor = asyncio.run(read_pages())
+    assert [(p.crop, p.region) for p in first] == specs[:3]
+    assert cursor is not None
+    assert {p.id for p in rest}.isdisjoint(p.id for p in first)
+    assert len(rest) == 2
+    assert last_cursor is None
@@ -0,0 +1,139 @@
+"""Each upstream lookup is made at most once per request."""
+import asyncio
+import json
+import os
+from collections import Counter
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import fusion_engine
+from app.fusion_engine import FusionContext
+from app.services.advisory_cache import AdvisoryCache
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = Counter()
+    real_load_json_file = fusion_engine.load_json_file
+    real_ndvi_history = fusion_engine.synthetic_ndvi_history
+
+    async def get_realtime_weather(lat, lon):
+        calls["weather"] += 1
+        await asyncio.sleep(0.01)
+        return {"temperature": 33, "humidity": 85, "rainfall": 2, "wind_speed": 4, "timestamp": "2024-06-01T10:00:00Z"}
+
+    async def reverse_geocode(lat, lon):
+        calls["geocode"] += 1
+        return {"state": "Maharashtra", "district": "Pune", "village": "Wagholi"}
+
+    async def fetch_market_price(crop, district=None):
+        calls["market"] += 1
+        return {"price": 7000, "price_change_percent": -6.0}
+
+    def load_json_file(path):
+        calls[os.path.basename(path)] += 1
+        return real_load_json_file(path)
+
+    def synthetic_ndvi_history(lat, lon, crop, days=7):
+        calls["ndvi"] += 1
+        return real_ndvi_history(lat, lon, crop, days=days)
+
+    monkeypatch.setattr(fusion_engine, "get_realtime_weather", get_realtime_weather)
+    monkeypatch.setattr(fusion_engine, "reverse_geocode", reverse_geocode)
+    monkeypatch.setattr(fusion_engine, "fetch_market_price", fetch_market_price)
+    monkeypatch.setattr(fusion_engine, "load_json_file", load_json_file)
+    monkeypatch.setattr(fusion_engine, "synthetic_ndvi_history", synthetic_ndvi_history)
+    monkeypatch.setattr(fusion_engine, "advisory_cache", AdvisoryCache())
+    return calls
+
+
+@pytest.mark.parametrize("crop", ["cotton", "soybean"])  # with and without mock data
+def test_advisory_calls_each_upstream_once(upstream, crop):
+    advisory = asyncio.run(fusion_engine.compute_advisory(crop, location="18.52,73.85"))
+    assert advisory["crop"] == crop.capitalize()
+    assert all(count == 1 for count in upstream.values()), upstream
+    assert {"weather", "geocode", "market", "ndvi", "weather_data.json"} <= set(upstream)
+
+
+def test_generate_and_enhance_share_market_and_crop_health(upstream):
+    ctx = FusionContext()
+
+    async def run():
+        weather, geo_info, lat, lon = await fusion_engine.resolve_weather_context(location="18.52,73.85", ctx=ctx)
+        user_context = {"district": geo_info["district"], "location": weather["location"]}
+        advisory = await fusion_engine.generate_advisory("wheat", weather, user_context, ctx=ctx)
+        advisory["metrics"]["location"] = weather["location"]
+        return await fusion_engine.enhance_advisory_with_rules(advisory, "wheat", ctx=ctx)
+
+    advisory = asyncio.run(run())
+    assert advisory["rule_breakdown"]
+    assert upstream["crop_health.json"] == 1
+    assert upstream["market"] == 1
+    assert upstream["weather"] == 1
+    assert ctx.calls["market"] == 1
+
+
+def test_failed_geocode_does_not_refetch_weather(upstream, monkeypatch):
+    async def reverse_geocode(lat, lon):
+        upstream["geocode"] += 1
+        raise RuntimeError("geocoder down")
+
+    monkeypatch.setattr(fusion_engine, "reverse_geocode", reverse_geocode)
+    weather, geo_info, lat, lon = asyncio.run(
+        fusion_engine.resolve_weather_context(location="18.52,73.85", district="Pune")
+    )
+    assert upstream["weather"] == 1
+    assert (lat, lon) == (18.52, 73.85)
+    assert weather["temperature"] == 33
+    assert geo_info["district"] == "Pune"
+
+
+def test_dashboard_calls_each_upstream_once(upstream):
+    request = Request({"type": "http", "headers": []})
+    response = asyncio.run(fusion_engine.get_dashboard_data(request, crop="cotton", location="18.52,73.85"))
+    body = json.loads(response.body)
+    assert body["market"]["cotton"]["price"] == 7000
+    assert all(count == 1 for count in upstream.values()), upstream
+
+
+def test_dashboard_weather_only_skips_other_upstreams(upstream):
+    request = Request({"type": "http", "headers": []})
+    response = asyncio.run(
+        fusion_engine.get_dashboard_data(request, crop="cotton", location="18.52,73.85", fields="weather")
+    )
+    body = json.loads(response.body)
+    assert set(body) == {"weather", "timestamp", "user_crop", "coordinates"}
+    assert body["weather"]["temperature"] == 33
+    assert set(upstream) == {"weather", "weather_data.json"}
+
+
+def test_dashboard_market_section_looks_up_district_without_weather(upstream):
+    request = Request({"type": "http", "headers": []})
+    response = asyncio.run(
+        fusion_engine.get_dashboard_data(request, crop="cotton", location="18.52,73.85", fields="market,summary")
+    )
+    body = json.loads(response.body)
+    assert body["market"]["cotton"]["price"] == 7000
+    assert body["user_district"] == "Pune"
+    assert "weather" not in body and "ndvi" not in body and "alerts" not in body
+    assert set(upstream) == {"geocode", "market", "alerts.json", "crop_health.json"}
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(HTTPException) as excinfo:
+        fusion_engine.requested_fields("weather,forecast", fusion_engine.DASHBOARD_SECTIONS)
+    assert excinfo.value.status_code == 400
+    assert fusion_engine.requested_fields(" NDVI, weather ,", fusion_engine.DASHBOARD_SECTIONS) == ("weather", "ndvi")
+    assert fusion_engine.requested_fields(None, fusion_engine.DASHBOARD_SECTIONS) == fusion_engine.DASHBOARD_SECTIONS
+
+
+def test_advisory_fields_trim_the_shared_advisory(upstream):
+    request = Request({"type": "http", "headers": []})
+    full = asyncio.run(fusion_engine.get_advisory("cotton", request, location="18.52,73.85"))
+    trimmed = asyncio.run(fusion_engine.get_advisory("cotton", request, location="18.52,73.85", fields="priority,alerts"))
+    assert set(json.loads(trimmed.body)) == {"crop", "priority", "alerts"}
+    assert trimmed.headers["etag"] != full.headers["etag"]
+    # Served from the advisory cache: no second computation
+    assert upstream["weather"] == 1
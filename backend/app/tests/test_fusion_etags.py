@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import fusion_engine
+from app.services.advisory_cache import AdvisoryCache
+from app.utils.responses import JSON_VARY
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    async def get_realtime_weather(lat, lon):
+        return {"temperature": 30, "timestamp": "2024-06-01T10:00:00Z"}
+
+    async def reverse_geocode(lat, lon):
+        return {"district": "Pune"}
+
+    async def fetch_market_price(crop, district=None):
+        return {"price": 7000}
+
+    monkeypatch.setattr(fusion_engine, "get_realtime_weather", get_realtime_weather)
+    monkeypatch.setattr(fusion_engine, "reverse_geocode", reverse_geocode)
+    monkeypatch.setattr(fusion_engine, "fetch_market_price", fetch_market_price)
+    monkeypatch.setattr(fusion_engine, "advisory_cache", AdvisoryCache())
+
+    def go_offline():
+        async def unexpected(*args, **kwargs):
+            raise RuntimeError("upstream called")
+
+        for name in ("get_realtime_weather", "reverse_geocode", "fetch_market_price"):
+            monkeypatch.setattr(fusion_engine, name, unexpected)
+        monkeypatch.setattr(fusion_engine, "advisory_cache", AdvisoryCache())
+
+    return go_offline
+
+
+def test_advisory_revalidates_without_upstream_work(upstream):
+    first = asyncio.run(fusion_engine.get_advisory("cotton", _request(), location="18.5204,73.8567"))
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"].startswith("public, max-age=")
+
+    upstream()
+    # Same tile, so the same inputs and the same ETag
+    again = asyncio.run(fusion_engine.get_advisory("cotton", _request(etag), location="18.5231,73.8581"))
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.headers["vary"] == JSON_VARY  # as the middlewares set on the 200
+
+
+def test_dashboard_body_is_for_the_tile_its_etag_names(upstream, monkeypatch):
+    looked_up = []
+
+    async def get_realtime_weather(lat, lon):
+        looked_up.append((lat, lon))
+        return {"temperature": 30}
+
+    monkeypatch.setattr(fusion_engine, "get_realtime_weather", get_realtime_weather)
+    responses = [
+        asyncio.run(fusion_engine.get_dashboard_data(_request(), location=location, fields="weather"))
+        for location in ("18.5204,73.8567", "18.5231,73.8581")
+    ]
+    assert responses[0].headers["etag"] == responses[1].headers["etag"]
+    bodies = [json.loads(response.body) for response in responses]
+    for body in bodies:
+        # Stamped per response, like any weak ETag's body may be
+        body.pop("timestamp")
+        body["weather"].pop("timestamp")
+    assert bodies[0] == bodies[1]
+    assert looked_up == [(18.52, 73.86)] * 2
+
+
+def test_dashboard_etag_follows_its_inputs(upstream):
+    first = asyncio.run(fusion_engine.get_dashboard_data(_request(), crop="cotton", location="18.52,73.85"))
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+
+    upstream()
+    again = asyncio.run(fusion_engine.get_dashboard_data(_request(etag), crop="cotton", location="18.52,73.85"))
+    assert again.status_code == 304
+
+    # A different crop is a different input set: no 304, so the (now failing) upstream work runs
+    with pytest.raises(HTTPException):
+        asyncio.run(fusion_engine.get_dashboard_data(_request(etag), crop="wheat", location="18.52,73.85"))
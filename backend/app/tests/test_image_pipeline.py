@@ -0,0 +1,73 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app.services import image_pipeline
+
+ORIENTATION = 0x0112
+
+
+def _write(path, size=(2000, 1000), mode="RGB", rotate=False):
+    img = Image.new(mode, size, (40, 160, 60, 128)[:len(mode)])
+    exif = Image.Exif()
+    exif[0x010F] = "FieldCam"  # Make
+    if rotate:
+        exif[ORIENTATION] = 6  # camera held sideways: rotate 90 degrees clockwise
+    img.save(path, "PNG" if mode == "RGBA" else "JPEG", exif=exif)
+    return path
+
+
+def test_variants_are_webp_resized_and_stripped(tmp_path):
+    source = _write(tmp_path / "upload.jpg", rotate=True)
+    derived = image_pipeline.build_derivatives(str(source), str(tmp_path), "leaf")
+
+    assert derived["variants"] == {"thumb": "leaf_thumb.webp", "feed": "leaf_feed.webp", "full": "leaf.webp"}
+    for size, filename in derived["variants"].items():
+        with Image.open(tmp_path / filename) as img:
+            assert img.format == "WEBP"
+            # Orientation is applied, so the landscape source is served portrait
+            assert img.size[1] == image_pipeline.VARIANTS[size]
+            assert img.size[0] < img.size[1]
+            assert ORIENTATION not in img.getexif() and "exif" not in img.info
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_small_images_are_not_upscaled_and_keep_alpha(tmp_path):
+    source = _write(tmp_path / "upload.png", size=(200, 100), mode="RGBA")
+    derived = image_pipeline.build_derivatives(str(source), str(tmp_path), "leaf")
+    with Image.open(tmp_path / derived["variants"]["full"]) as img:
+        assert img.size == (200, 100)
+        assert img.mode == "RGBA"
+
+
+def test_placeholder_is_a_tiny_inline_webp(tmp_path):
+    source = _write(tmp_path / "upload.jpg")
+    placeholder = image_pipeline.build_derivatives(str(source), str(tmp_path), "leaf")["placeholder"]
+
+    prefix = "data:image/webp;base64,"
+    assert placeholder.startswith(prefix)
+    data = base64.b64decode(placeholder[len(prefix):])
+    assert len(data) < 1024
+    with Image.open(BytesIO(data)) as img:
+        assert img.format == "WEBP"
+        assert max(img.size) == image_pipeline.PLACEHOLDER_SIZE
+
+
+def test_undecodable_upload_raises_invalid_image(tmp_path):
+    source = tmp_path / "upload.jpg"
+    source.write_bytes(b"\xff\xd8\xff not a jpeg")
+    with pytest.raises(image_pipeline.InvalidImageError):
+        image_pipeline.build_derivatives(str(source), str(tmp_path), "leaf")
+    assert not list(tmp_path.glob("*.webp"))
+
+
+def test_backfill_builds_missing_derivatives_once(tmp_path):
+    _write(tmp_path / "legacy.jpg")
+    (tmp_path / "broken.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+
+    assert image_pipeline.backfill(str(tmp_path)) == 1
+    assert (tmp_path / "legacy_thumb.webp").exists() and (tmp_path / "legacy_feed.webp").exists()
+    assert (tmp_path / "legacy.jpg").exists()
+    assert image_pipeline.backfill(str(tmp_path)) == 0
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import community
+from app.services import image_storage
+from app.utils.http_cache import IMMUTABLE_CACHE_CONTROL
+
+DIGEST = "ab" * 32
+FULL = f"ab/ab/{DIGEST}.webp"
+THUMB = f"ab/ab/{DIGEST}_thumb.webp"
+LEGACY = "0f1e2d3c-legacy.jpg"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    local = image_storage.LocalImageStorage(tmp_path)
+    for key, data in ((FULL, b"full" * 100), (THUMB, b"thumb"), (LEGACY, b"legacy-jpeg")):
+        local.path(key).parent.mkdir(parents=True, exist_ok=True)
+        local.path(key).write_bytes(data)
+    monkeypatch.setattr(image_storage, "_storage", local)
+    return local
+
+
+def _get(filename, headers=None, size=None):
+    """Call get_image and send its response; returns (status, headers, body)."""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": f"/community/images/{filename}",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    messages = []
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        response = await community.get_image(filename, Request(scope), size=size)
+        await response(scope, receive, send)
+
+    asyncio.run(run())
+    start = messages[0]
+    response_headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], response_headers, body
+
+
+def test_image_is_served_with_immutable_caching_and_name_etag(storage):
+    status, headers, body = _get(FULL)
+    assert (status, body) == (200, b"full" * 100)
+    assert headers["etag"] == f'"{DIGEST}"'
+    assert headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert headers["content-type"] == "image/webp"
+
+
+def test_matching_if_none_match_returns_304(storage):
+    status, headers, body = _get(FULL, {"If-None-Match": f'W/"{DIGEST}", "other"'})
+    assert (status, body) == (304, b"")
+    assert headers["etag"] == f'"{DIGEST}"'
+
+    status, _, _ = _get(FULL, {"If-None-Match": '"stale"'})
+    assert status == 200
+
+
+def test_size_selects_variant_and_falls_back_to_legacy_original(storage):
+    status, headers, body = _get(FULL, size="thumb")
+    assert (status, body, headers["etag"]) == (200, b"thumb", f'"{DIGEST}_thumb"')
+
+    status, headers, body = _get(LEGACY, size="feed")
+    assert (status, body) == (200, b"legacy-jpeg")
+    assert headers["content-type"] == "image/jpeg"
+
+
+def test_range_requests_return_partial_content(storage):
+    status, headers, body = _get(FULL, {"Range": "bytes=4-11"})
+    assert (status, body) == (206, b"fullfull")
+    assert headers["content-range"] == "bytes 4-11/400"
+
+    status, _, body = _get(FULL, {"Range": "bytes=0-3", "If-Range": '"stale"'})
+    assert (status, len(body)) == (200, 400)
+
+
+def test_accel_redirect_hands_the_file_to_the_proxy(storage, monkeypatch):
+    monkeypatch.setattr(community, "IMAGE_ACCEL_REDIRECT_PREFIX", "/_protected/uploads/")
+    status, headers, body = _get(FULL, size="thumb")
+    assert (status, body) == (200, b"")
+    assert headers["x-accel-redirect"] == f"/_protected/uploads/{THUMB}"
+    assert headers["etag"] == f'"{DIGEST}_thumb"'
+    assert headers["content-type"] == "image/webp"
+
+
+@pytest.mark.parametrize("filename", ["missing.webp", "../secret.webp", "ab/ab/../../x.png", "leaf.svg"])
+def test_missing_or_unsafe_names_are_404(storage, filename):
+    with pytest.raises(HTTPException) as raised:
+        _get(filename)
+    assert raised.value.status_code == 404
+
+
+class _Bucket:
+    """Stands in for the S3 backend: every key resolves to a CDN URL."""
+
+    def url_for(self, key):
+        return f"https://cdn.example.com/uploads/{key}"
+
+
+def test_s3_backend_redirects_hashed_names_and_serves_legacy_files_locally(storage, monkeypatch):
+    monkeypatch.setattr(image_storage, "_storage", _Bucket())
+    monkeypatch.setattr(image_storage, "_legacy_storage", storage)
+
+    status, headers, _ = _get(FULL, size="feed")
+    assert status == 307
+    assert headers["location"] == f"https://cdn.example.com/uploads/ab/ab/{DIGEST}_feed.webp"
+
+    status, headers, body = _get(LEGACY, size="thumb")
+    assert (status, body) == (200, b"legacy-jpeg")
+    assert headers["etag"] == '"0f1e2d3c-legacy"'
@@ -0,0 +1,96 @@
+"""Tests for content-addressed image storage, deduplication and orphan GC."""
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Post, User
+from app.services import image_pipeline, image_storage
+
+
+def _store_image(storage, color) -> tuple[str, dict]:
+    buffer = BytesIO()
+    Image.new("RGB", (800, 600), color).save(buffer, "PNG")
+    raw = buffer.getvalue()
+    digest = hashlib.sha256(raw).hexdigest()
+
+    source = os.path.join(storage.tmp_dir, "source.png")
+    with open(source, "wb") as fh:
+        fh.write(raw)
+    work_dir = image_storage.make_work_dir(storage)
+    try:
+        derived = image_pipeline.build_derivatives(source, work_dir, digest)
+        manifest = image_storage.store_derivatives(storage, digest, work_dir, derived)
+    finally:
+        image_storage.remove_work_dir(work_dir)
+        os.unlink(source)
+    return digest, manifest
+
+
+def test_upload_is_sharded_and_deduplicated(tmp_path):
+    storage = image_storage.LocalImageStorage(tmp_path)
+    digest, manifest = _store_image(storage, (10, 200, 30))
+
+    assert manifest["variants"]["full"] == f"{digest[:2]}/{digest[2:4]}/{digest}.webp"
+    assert set(manifest["variants"]) == {"thumb", "feed", "full"}
+    assert all(storage.exists(key) for key in manifest["variants"].values())
+    assert manifest["placeholder"].startswith("data:image/webp;base64,")
+
+    # A second upload of the same bytes is answered from the manifest
+    assert image_storage.read_manifest(storage, digest) == manifest
+    assert image_storage.read_manifest(storage, "0" * 64) is None
+
+
+def test_gc_removes_only_unreferenced_uploads(tmp_path):
+    storage = image_storage.LocalImageStorage(tmp_path / "uploads")
+    _, kept = _store_image(storage, (10, 200, 30))
+    _, orphan = _store_image(storage, (200, 10, 30))
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'gc.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = User(email="gc@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    db.add(Post(
+        content="with image",
+        author_id=user.id,
+        image_url=image_storage.IMAGES_URL_PREFIX + kept["variants"]["full"],
+    ))
+    db.commit()
+
+    # Fresh files are inside the grace period
+    assert image_storage.collect_garbage(db, storage) == 0
+
+    removed = image_storage.collect_garbage(db, storage, grace_seconds=-1)
+    assert removed == 4  # three variants + manifest
+    assert all(storage.exists(key) for key in kept["variants"].values())
+    assert not any(storage.exists(key) for key in orphan["variants"].values())
+    db.close()
+
+
+@pytest.mark.skipif(
+    not (os.getenv("S3_ENDPOINT_URL") and os.getenv("S3_BUCKET")),
+    reason="needs an S3-compatible endpoint (e.g. local MinIO) in S3_ENDPOINT_URL/S3_BUCKET",
+)
+def test_s3_backend_roundtrip():
+    storage = image_storage.S3ImageStorage(
+        bucket=os.environ["S3_BUCKET"],
+        prefix=f"test-{uuid.uuid4().hex}",
+        endpoint_url=os.environ["S3_ENDPOINT_URL"],
+    )
+    digest, manifest = _store_image(storage, (30, 30, 200))
+    try:
+        assert image_storage.read_manifest(storage, digest) == manifest
+        keys = {key for key, _ in storage.iter_keys()}
+        assert set(manifest["variants"].values()) <= keys
+    finally:
+        storage.delete(key for key, _ in storage.iter_keys())
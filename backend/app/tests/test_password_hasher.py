@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import crud, schemas
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.models import User
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy, password_hasher, pwd_context
+
+
+def test_saturated_pool_rejects_and_counts():
+    hasher = PasswordHasher(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def saturate():
+        slow = [asyncio.ensure_future(hasher._submit(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        busy = hasher.metrics()
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.hash("one too many")
+        release.set()
+        await asyncio.gather(*slow)
+        return busy
+
+    try:
+        busy = asyncio.run(saturate())
+        assert (busy["in_flight"], busy["running"], busy["queued"]) == (2, 1, 1)
+        stats = hasher.metrics()
+        assert stats["rejected"] == 1
+        assert stats["completed"] == 2
+        assert stats["in_flight"] == 0
+        assert stats["avg_wait_ms"] > 0
+    finally:
+        hasher.shutdown()
+
+
+def test_hash_and_verify_round_trip():
+    hasher = PasswordHasher(workers=1, max_pending=4)
+
+    async def round_trip():
+        hashed = await hasher.hash("kharif2024")
+        return hashed, await hasher.verify("kharif2024", hashed), await hasher.verify("rabi2024", hashed)
+
+    try:
+        hashed, valid, invalid = asyncio.run(round_trip())
+        assert hashed != "kharif2024" and valid and not invalid
+        assert hasher.metrics()["completed"] == 3
+    finally:
+        hasher.shutdown()
+
+
+def test_create_user_hashes_on_the_pool():
+    Base.metadata.create_all(bind=engine)
+    completed = password_hasher.metrics()["completed"]
+    new_user = schemas.UserCreate(email="hasher@example.com", password="kharif2024", userType="farmer")
+
+    async def create():
+        async with AsyncSessionLocal() as db:
+            return await crud.create_user(db, new_user)
+
+    try:
+        user = asyncio.run(create())
+        assert pwd_context.verify("kharif2024", user.hashed_password)
+        assert password_hasher.metrics()["completed"] == completed + 1
+    finally:
+        with SessionLocal() as db:
+            db.query(User).filter(User.email == new_user.email).delete()
+            db.commit()
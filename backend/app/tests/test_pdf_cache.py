@@ -0,0 +1,61 @@
+import asyncio
+import os
+import time
+
+from app.services.pdf_cache import PdfCache, advisory_key
+
+
+def test_advisory_key_ignores_key_order_and_float_noise():
+    first = advisory_key({"priority": "High", "rule_score": 0.82, "rule_breakdown": {"pest": {"score": 0.9}}}, "Cotton")
+    second = advisory_key({"rule_breakdown": {"pest": {"score": 0.9000000000001}}, "rule_score": 0.82, "priority": "High"}, "cotton")
+    assert first == second
+    assert advisory_key({"priority": "Low", "rule_score": 0.82}, "cotton") != advisory_key({"priority": "High", "rule_score": 0.82}, "cotton")
+    assert advisory_key({"priority": "High"}, "cotton") != advisory_key({"priority": "High"}, "wheat")
+    assert advisory_key({"last_updated": "2024-06-01T10:00:01.123+00:00"}, "cotton") == advisory_key(
+        {"last_updated": "2024-06-01T10:00:42.9+00:00"}, "cotton"
+    )
+
+
+def test_concurrent_requests_share_one_render(tmp_path):
+    cache = PdfCache(directory=str(tmp_path))
+    calls = []
+
+    async def render():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b"%PDF-report"
+
+    async def fetch_many():
+        return await asyncio.gather(*(cache.get_or_render("ab" * 32, render) for _ in range(5)))
+
+    assert asyncio.run(fetch_many()) == [b"%PDF-report"] * 5
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+
+    asyncio.run(cache.get_or_render("ab" * 32, render))
+    assert cache.stats()["memory_hits"] == 1
+    assert len(calls) == 1
+
+
+def test_disk_copy_survives_restart_until_ttl(tmp_path):
+    key = "cd" * 32
+
+    async def render():
+        return b"%PDF-report"
+
+    async def fail():
+        raise AssertionError("should have been served from disk")
+
+    asyncio.run(PdfCache(directory=str(tmp_path)).get_or_render(key, render))
+
+    restarted = PdfCache(directory=str(tmp_path))
+    assert asyncio.run(restarted.get_or_render(key, fail)) == b"%PDF-report"
+    assert restarted.stats()["disk_hits"] == 1
+
+    expired = PdfCache(directory=str(tmp_path), ttl=60)
+    path = expired._path(key)
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    assert expired.prune() == 1
+    assert not os.path.exists(path)
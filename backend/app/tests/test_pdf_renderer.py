@@ -0,0 +1,60 @@
+import asyncio
+
+from reportlab.platypus import Paragraph
+
+from app.services.pdf_renderer import PdfRenderer, PdfRendererBusy, advisory_story, build_advisory_pdf
+
+ADVISORY = {
+    "crop": "Cotton",
+    "priority": "High",
+    "severity": "Medium",
+    "rule_score": 0.82,
+    "last_updated": "2024-06-01T10:00:00Z",
+    "analysis": "Humidity favours bollworm; scout fields this week.",
+    "recommendations": [{"title": "Scout for pests", "desc": "Check 20 plants per acre.", "priority": "High"}],
+    "rule_breakdown": {"pest": {"score": 0.9, "fired": ["humidity_high"]}, "irrigation": {"score": 0.4, "fired": []}},
+    "fired_rules": ["humidity_high"],
+}
+
+
+def test_build_advisory_pdf_returns_a_document():
+    pdf = build_advisory_pdf(ADVISORY, "cotton")
+    assert pdf.startswith(b"%PDF")
+    assert len(pdf) > 1000
+
+
+def test_render_pool_rejects_past_max_pending():
+    renderer = PdfRenderer(workers=1, max_pending=1)
+
+    async def render_two():
+        return await asyncio.gather(
+            renderer.render(ADVISORY, "cotton"),
+            renderer.render(ADVISORY, "cotton"),
+            return_exceptions=True,
+        )
+
+    try:
+        first, second = asyncio.run(render_two())
+        assert first.startswith(b"%PDF")
+        assert isinstance(second, PdfRendererBusy)
+        stats = renderer.metrics()
+        assert stats["completed"] == 1
+        assert stats["rejected"] == 1
+        assert stats["in_flight"] == 0
+    finally:
+        renderer.shutdown()
+
+
+def test_advisory_text_is_escaped_not_parsed_as_markup():
+    advisory = {
+        **ADVISORY,
+        "crop": "Cotton (Patil <b>& Sons)",
+        "analysis": "Rain < 5mm & humidity > 80%",
+        "recommendations": [{"title": "Spray <font>", "desc": "Use 2 & 3 ml/L", "timeline": "<br"}],
+        "fired_rules": ["humidity > 80 & temp < 30"],
+    }
+    story = advisory_story(advisory, "cotton")
+    texts = [flowable.text for flowable in story if isinstance(flowable, Paragraph)]
+    assert texts[0] == "Crop Advisory Report: Cotton (Patil &lt;b&gt;&amp; Sons)"
+    assert "Rain &lt; 5mm &amp; humidity &gt; 80%" in texts
+    assert build_advisory_pdf(advisory, "cotton").startswith(b"%PDF")
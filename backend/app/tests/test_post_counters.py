@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event, func, select
+
+from app import community, crud
+from app.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.models import Comment, PostLike, User
+from app.schemas import CommentCreate
+from app.tests.conftest import run_committed
+
+
+def test_like_unlike_like_toggles_row_and_delta(seeded_post):
+    post_id, user_id = seeded_post
+    results = [run_committed(lambda db: crud.toggle_post_like(db, post_id, user_id)) for _ in range(3)]
+    assert results == [(1, True), (-1, False), (1, True)]
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count(PostLike.id)).where(PostLike.post_id == post_id)) == 1
+
+
+def test_concurrent_duplicate_like_is_not_counted(seeded_post):
+    post_id, user_id = seeded_post
+    raced = []
+
+    def like_first(conn, cursor, statement, parameters, context, executemany):
+        # Another request's like lands between this one's DELETE and INSERT
+        if statement.startswith("INSERT INTO post_likes") and not raced:
+            raced.append(True)
+            cursor.execute("INSERT INTO post_likes (post_id, user_id) VALUES (?, ?)", (post_id, user_id))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", like_first)
+    try:
+        assert run_committed(lambda db: crud.toggle_post_like(db, post_id, user_id)) == (0, True)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", like_first)
+    assert raced
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count(PostLike.id)).where(PostLike.post_id == post_id)) == 1
+
+
+def test_counter_never_goes_below_zero(seeded_post):
+    post_id, _ = seeded_post
+    assert run_committed(lambda db: crud.increment_post_counter(db, post_id, "likes_count", 2)) == 2
+    assert run_committed(lambda db: crud.increment_post_counter(db, post_id, "likes_count", -5)) == 0
+    assert run_committed(lambda db: crud.increment_post_counter(db, post_id, "comments_count", -1)) == 0
+    assert run_committed(lambda db: crud.increment_post_counter(db, post_id + 1000, "likes_count", 1)) is None
+
+
+def test_like_and_comment_on_missing_post_are_404(seeded_post):
+    _, user_id = seeded_post
+
+    async def call(endpoint):
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(HTTPException) as raised:
+                await endpoint(db, await db.get(User, user_id))
+            return raised.value.status_code
+
+    assert asyncio.run(call(lambda db, user: community.toggle_like(999_999, current_user=user, db=db))) == 404
+    assert asyncio.run(call(
+        lambda db, user: community.create_comment(999_999, CommentCreate(content="hi"), current_user=user, db=db)
+    )) == 404
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count(Comment.id))) == 0
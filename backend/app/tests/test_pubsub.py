@@ -0,0 +1,38 @@
+import asyncio
+
+from app.services.pubsub import SUBSCRIBER_QUEUE_SIZE, InProcessBroker
+
+
+def test_events_are_filtered_by_crop_and_region():
+    async def scenario():
+        broker = InProcessBroker()
+        everything = broker.subscribe()
+        cotton = broker.subscribe(crops=["Cotton"])
+        wheat_punjab = broker.subscribe(crops=["wheat"], regions=["punjab"])
+
+        await broker.publish({"type": "post_created", "post_id": 1, "crop": "cotton", "region": "Maharashtra"})
+        await broker.publish({"type": "like_count", "post_id": 2, "crop": "Wheat", "region": "Punjab"})
+        await broker.publish({"type": "like_count", "post_id": 3, "crop": "Wheat", "region": "Haryana"})
+
+        assert everything.queue.qsize() == 3
+        assert (await cotton.queue.get())["post_id"] == 1
+        assert cotton.queue.empty()
+        assert (await wheat_punjab.queue.get())["post_id"] == 2
+        assert wheat_punjab.queue.empty()
+
+        broker.unsubscribe(everything)
+        assert broker.subscriber_count == 2
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_keeps_latest_events():
+    async def scenario():
+        broker = InProcessBroker()
+        sub = broker.subscribe()
+        for post_id in range(SUBSCRIBER_QUEUE_SIZE + 5):
+            await broker.publish({"type": "post_created", "post_id": post_id, "crop": None, "region": None})
+        assert sub.queue.qsize() == SUBSCRIBER_QUEUE_SIZE
+        assert (await sub.queue.get())["post_id"] == 5
+
+    asyncio.run(scenario())
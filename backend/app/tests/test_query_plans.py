@@ -0,0 +1,108 @@
+"""The hot community queries must be index scans, not sequential scans.
+
+Runs against a throwaway SQLite database, and against PostgreSQL too when
+TEST_POSTGRES_URL points at an empty scratch database. Postgres tables here
+are tiny, so sequential scans and sorts are disabled to ask whether an index
+*can* serve the query rather than whether it is cheaper at this size.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.community import comments_query, liked_post_ids_query, posts_query, user_posts_query
+from app.database import Base
+from app.models import Comment, Post, PostLike, User
+
+# (query, index that must serve it, must come out in index order)
+CASES = {
+    "posts": (posts_query(), "ix_posts_created_at", True),
+    "posts by crop": (posts_query(crop="cotton"), "ix_posts_crop_created_at", True),
+    "posts by category": (posts_query(category="tip"), "ix_posts_category_created_at", True),
+    "user posts": (user_posts_query(1), "ix_posts_author_id_created_at", True),
+    "comments": (comments_query(1), "ix_comments_post_id_created_at", True),
+    "like state": (liked_post_ids_query(1, [1, 2, 3]), None, False),
+    "liked by user": (select(PostLike.post_id).where(PostLike.user_id == 1), "ix_post_likes_user_id_post_id", False),
+    "commented by user": (select(Comment.post_id).where(Comment.user_id == 1), "ix_comments_user_id_post_id", False),
+}
+
+
+def _seed(engine) -> None:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "email": f"u{i}@example.com", "hashed_password": "x"} for i in range(1, 51)
+        ])
+        conn.execute(Post.__table__.insert(), [
+            {
+                "id": i, "author_id": i % 50 + 1, "content": f"post {i}",
+                "crop": ["cotton", "wheat", "rice", "soybean"][i % 4],
+                "category": ["tip", "question", "issue", "success"][i % 4],
+            }
+            for i in range(1, 501)
+        ])
+        conn.execute(PostLike.__table__.insert(), [
+            {"post_id": i % 500 + 1, "user_id": i // 500 + 1} for i in range(2000)
+        ])
+        conn.execute(Comment.__table__.insert(), [
+            {"post_id": i % 500 + 1, "user_id": i % 50 + 1, "content": "c"} for i in range(2000)
+        ])
+
+
+def _sql(engine, query) -> str:
+    return str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+@pytest.fixture(scope="module")
+def sqlite_engine():
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/plans.db")
+    _seed(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_sqlite_plan_uses_index(sqlite_engine, name):
+    query, index, ordered = CASES[name]
+    with sqlite_engine.connect() as conn:
+        plan = " | ".join(row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + _sql(sqlite_engine, query)))
+    first = plan.split(" | ")[0]
+    assert first.startswith("SEARCH") or "USING" in first, plan
+    if index:
+        assert f"INDEX {index}" in plan, plan
+    else:
+        assert "USING COVERING INDEX" in plan, plan
+    if ordered:
+        assert "TEMP B-TREE" not in plan, plan
+
+
+@pytest.fixture(scope="module")
+def postgres_engine():
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("set TEST_POSTGRES_URL to check PostgreSQL plans")
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    _seed(engine)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("ANALYZE")
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_postgres_plan_uses_index(postgres_engine, name):
+    query, index, ordered = CASES[name]
+    with postgres_engine.begin() as conn:
+        for setting in ("enable_seqscan", "enable_bitmapscan", "enable_sort"):
+            conn.exec_driver_sql(f"SET LOCAL {setting} = off")
+        plan = "\n".join(row[0] for row in conn.exec_driver_sql("EXPLAIN " + _sql(postgres_engine, query)))
+    assert (index or "Index Only Scan") in plan, plan
+    if ordered:
+        assert "Sort" not in plan, plan
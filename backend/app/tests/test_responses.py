@@ -0,0 +1,127 @@
+import asyncio
+import gzip
+
+import numpy as np
+import pytest
+from starlette.responses import Response, StreamingResponse
+
+from app.utils.compression import CompressionMiddleware
+from app.utils.http_cache import not_modified
+from app.utils.responses import JSON_VARY, MessagePackMiddleware, ORJSONResponse, accepts_msgpack
+
+PAYLOAD = {"crop": "Cotton", "alerts": [{"type": "pest", "message": "Pink bollworm risk"}] * 40}
+
+
+def _call(app, headers):
+    """Run an ASGI app once; returns (status, headers, body)."""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    messages = []
+
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            await asyncio.Event().wait()  # no disconnect; streaming responses listen for one
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    response_headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], response_headers, body
+
+
+def test_orjson_response_handles_numpy_and_int_keys():
+    response = ORJSONResponse({"ndvi": np.float32(0.5), "history": {1: np.int64(3)}})
+    assert response.body == b'{"ndvi":0.5,"history":{"1":3}}'
+
+
+def test_large_json_is_gzipped_small_json_is_not():
+    app = CompressionMiddleware(ORJSONResponse(PAYLOAD, headers={"ETag": '"abc"'}), minimum_size=1024)
+    status, headers, body = _call(app, {"Accept-Encoding": "gzip"})
+    assert status == 200
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["etag"] == 'W/"abc"'
+    assert int(headers["content-length"]) == len(body)
+    assert ORJSONResponse(PAYLOAD).body == gzip.decompress(body)
+
+    small = CompressionMiddleware(ORJSONResponse({"status": "healthy"}), minimum_size=1024)
+    _, headers, body = _call(small, {"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in headers
+    assert body == b'{"status":"healthy"}'
+
+
+def test_binary_streams_and_uncompressing_clients_are_left_alone():
+    pdf = CompressionMiddleware(Response(b"%PDF" * 1000, media_type="application/pdf"), minimum_size=10)
+    _, headers, body = _call(pdf, {"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in headers and len(body) == 4000
+
+    async def events():
+        yield b"data: 1\n\n" * 500
+
+    sse = CompressionMiddleware(StreamingResponse(events(), media_type="text/event-stream"), minimum_size=10)
+    _, headers, _ = _call(sse, {"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in headers
+
+    _, headers, _ = _call(CompressionMiddleware(ORJSONResponse(PAYLOAD), minimum_size=10), {"Accept-Encoding": "identity"})
+    assert "content-encoding" not in headers
+
+
+def test_brotli_is_preferred_when_installed():
+    brotli = pytest.importorskip("brotli")
+    app = CompressionMiddleware(ORJSONResponse(PAYLOAD), minimum_size=1024)
+    _, headers, body = _call(app, {"Accept-Encoding": "gzip, deflate, br"})
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(body) == ORJSONResponse(PAYLOAD).body
+    _, headers, _ = _call(app, {"Accept-Encoding": "gzip, br;q=0"})
+    assert headers["content-encoding"] == "gzip"
+
+
+def test_accepts_msgpack_follows_preference():
+    assert accepts_msgpack("application/msgpack, application/json;q=0.9")
+    assert accepts_msgpack("application/x-msgpack")
+    assert not accepts_msgpack("application/json, application/msgpack;q=0.5")
+    assert not accepts_msgpack("*/*")
+    assert not accepts_msgpack(None)
+
+
+def test_msgpack_is_negotiated_and_then_compressed():
+    msgpack = pytest.importorskip("msgpack")
+    app = CompressionMiddleware(MessagePackMiddleware(ORJSONResponse(PAYLOAD)), minimum_size=100)
+
+    _, headers, body = _call(app, {"Accept": "application/msgpack, application/json;q=0.9", "Accept-Encoding": "gzip"})
+    assert headers["content-type"] == "application/msgpack"
+    assert headers["vary"] == "Accept, Accept-Encoding"
+    assert msgpack.unpackb(gzip.decompress(body)) == PAYLOAD
+
+    _, headers, body = _call(app, {"Accept": "application/json"})
+    assert headers["content-type"] == "application/json"
+    assert headers["vary"] == "Accept, Accept-Encoding"
+    assert body == ORJSONResponse(PAYLOAD).body
+
+
+@pytest.mark.parametrize("request_headers", [
+    {"Accept-Encoding": "gzip"},
+    {"Accept": "application/msgpack, application/json;q=0.9", "Accept-Encoding": "br, gzip"},
+    {},
+])
+def test_not_modified_carries_the_vary_of_the_full_response(request_headers):
+    def stack(response):
+        return CompressionMiddleware(MessagePackMiddleware(response), minimum_size=100)
+
+    status, full, _ = _call(stack(ORJSONResponse(PAYLOAD, headers={"ETag": 'W/"abc"'})), request_headers)
+    assert status == 200
+    status, revalidated, body = _call(stack(not_modified('W/"abc"', "no-cache", JSON_VARY)), request_headers)
+    assert (status, body) == (304, b"")
+    assert revalidated["vary"] == full["vary"]
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import community, crud, schema_migrations
+from app.models import Post, User
+from app.services.feed_ranking import rank_score
+from app.schema_migrations import SchemaOutOfDate, applied_versions, check_schema, discover, migrate, split_statements
+
+
+def _engine():
+    return create_engine(f"sqlite:///{tempfile.mkdtemp()}/migrations.db")
+
+
+def _write(directory: Path, name: str, sql: str) -> None:
+    (directory / name).write_text(sql, encoding="utf-8")
+
+
+def test_split_statements_respects_quotes_and_comments():
+    sql = """
+    -- a comment; not a statement
+    INSERT INTO t VALUES ('a;b', "c;d");
+    /* block; comment */
+    CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql;
+    -- trailing comment only
+    """
+    statements = split_statements(sql)
+    assert len(statements) == 2
+    assert "'a;b'" in statements[0]
+    assert statements[1].endswith("LANGUAGE sql")
+
+
+def test_every_shipped_migration_has_a_file_per_dialect():
+    for dialect in ("postgresql", "sqlite"):
+        versions = [migration.version for migration in discover(dialect)]
+        assert versions == list(range(1, len(versions) + 1))
+    assert discover("sqlite")[0].path.name.endswith(".sqlite.sql")
+    assert discover("postgresql")[0].path.name.endswith("_add_crop_location.sql")
+
+
+def test_postgres_indexes_on_live_tables_are_built_concurrently():
+    # 0002 and 0003 predate the runner; 0003's unique index must see its own de-duplication
+    create_index = re.compile(r"CREATE INDEX (CONCURRENTLY )?IF NOT EXISTS (\w+)", re.IGNORECASE)
+    built = set()
+    for migration in discover("postgresql"):
+        matches = [] if migration.version <= 3 else create_index.findall(migration.sql)
+        if matches:
+            assert not migration.transactional, migration.label
+            assert all(concurrently for concurrently, _ in matches), migration.label
+            built.update(name for _, name in matches)
+    assert {
+        "ix_user_stats_posts_count", "ix_user_stats_region_posts_count", "ix_user_stats_crop_posts_count",
+        "ix_posts_rank_score", "ix_posts_crop_rank_score", "ix_posts_region_rank_score",
+        "ix_posts_crop_region_rank_score", "ix_posts_duplicate_of",
+    } <= built
+
+
+def test_fresh_database_is_created_from_models_and_stamped():
+    engine = _engine()
+    assert migrate(engine) == []
+    assert inspect(engine).has_table("posts")
+    assert applied_versions(engine) == {migration.version for migration in discover("sqlite")}
+    check_schema(engine, auto_migrate=False)
+
+
+def test_pending_migrations_apply_once_and_failures_roll_back():
+    engine = _engine()
+    directory = Path(tempfile.mkdtemp())
+    _write(directory, "0001_create_notes.sql", "CREATE TABLE notes (id INTEGER PRIMARY KEY);")
+    # Make the database non-empty so it is upgraded rather than created from the models
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    assert [m.version for m in migrate(engine, directory=directory)] == [1]
+    assert migrate(engine, directory=directory) == []
+
+    _write(directory, "0002_add_body.sql", "ALTER TABLE notes ADD COLUMN body TEXT;\nSELECT * FROM missing_table;")
+    with pytest.raises(SchemaOutOfDate):
+        check_schema(engine, auto_migrate=False, directory=directory)
+    with pytest.raises(Exception):
+        migrate(engine, directory=directory)
+    assert "body" not in {column["name"] for column in inspect(engine).get_columns("notes")}
+    assert applied_versions(engine) == {1}
+
+    _write(directory, "0002_add_body.sql", "ALTER TABLE notes ADD COLUMN body TEXT;")
+    check_schema(engine, auto_migrate=True, directory=directory)
+    assert applied_versions(engine) == {1, 2}
+
+
+def test_no_transaction_marker():
+    directory = Path(tempfile.mkdtemp())
+    _write(directory, "0001_index.sql", f"{schema_migrations.NO_TRANSACTION_MARKER}\nCREATE INDEX CONCURRENTLY x ON t (a);")
+    _write(directory, "0001_index.sqlite.sql", "CREATE INDEX x ON t (a);")
+    assert discover("postgresql", directory)[0].transactional is False
+    assert discover("sqlite", directory)[0].transactional is True
+
+
+# Schema as created by the models before versioned migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL PRIMARY KEY, email VARCHAR NOT NULL, name VARCHAR, phone VARCHAR,
+    user_type VARCHAR, hashed_password VARCHAR NOT NULL, crop VARCHAR, location VARCHAR,
+    state VARCHAR, district VARCHAR, village VARCHAR, is_active BOOLEAN,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE posts (
+    id INTEGER NOT NULL PRIMARY KEY, content TEXT NOT NULL, author_id INTEGER NOT NULL REFERENCES users (id),
+    region VARCHAR, crop VARCHAR, category VARCHAR, likes_count INTEGER, comments_count INTEGER,
+    image_url VARCHAR, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME
+);
+CREATE TABLE post_likes (
+    id INTEGER NOT NULL PRIMARY KEY, post_id INTEGER NOT NULL REFERENCES posts (id),
+    user_id INTEGER NOT NULL REFERENCES users (id), created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE comments (
+    id INTEGER NOT NULL PRIMARY KEY, post_id INTEGER NOT NULL REFERENCES posts (id),
+    user_id INTEGER NOT NULL REFERENCES users (id), content TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME
+);
+INSERT INTO users (id, email, hashed_password, state, crop) VALUES (1, 'a@x.in', 'x', 'Maharashtra', 'cotton');
+INSERT INTO posts (id, content, author_id, likes_count, comments_count) VALUES (1, 'Bollworm', 1, 1, 1);
+INSERT INTO post_likes (post_id, user_id) VALUES (1, 1);
+INSERT INTO comments (post_id, user_id, content) VALUES (1, 1, 'Spray neem');
+"""
+
+# Only the original users table, like the checked-in agrisense_dev.db
+USERS_ONLY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL PRIMARY KEY, email VARCHAR NOT NULL, name VARCHAR, phone VARCHAR,
+    hashed_password VARCHAR NOT NULL, user_type VARCHAR, is_active BOOLEAN,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@x.in', 'x');
+"""
+
+
+def _legacy_engine(schema: str):
+    engine = _engine()
+    with engine.begin() as conn:
+        for statement in split_statements(schema):
+            conn.exec_driver_sql(statement)
+    return engine
+
+
+def _columns(engine, table):
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def test_baseline_schema_is_upgraded_in_place():
+    engine = _legacy_engine(BASELINE_SCHEMA)
+    check_schema(engine, auto_migrate=True)
+    assert applied_versions(engine) == {migration.version for migration in discover("sqlite")}
+    assert {"image_placeholder", "rank_score", "duplicate_of"} <= _columns(engine, "posts")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT posts_count, likes_received FROM user_stats").all() == [(1, 1)]
+        assert conn.exec_driver_sql("SELECT content FROM comments").scalar() == "Spray neem"
+        created_at, score = conn.execute(select(Post.created_at, Post.rank_score)).one()
+        assert score == pytest.approx(rank_score(1, 1, created_at))
+    check_schema(engine, auto_migrate=False)
+
+
+@pytest.mark.parametrize("stamped", [set(), {1}])
+def test_partial_schema_gets_missing_tables_and_columns(stamped):
+    engine = _legacy_engine(USERS_ONLY_SCHEMA)
+    if stamped:
+        # Left behind by an earlier run that stopped at 0002
+        schema_migrations.stamp(engine, max(stamped))
+    migrate(engine)
+    assert applied_versions(engine) == {migration.version for migration in discover("sqlite")}
+    assert {"crop", "location", "state", "district", "village"} <= _columns(engine, "users")
+    for table in ("posts", "post_likes", "comments", "user_stats"):
+        assert inspect(engine).has_table(table)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT email FROM users").scalar() == "a@x.in"
+
+
+# A second member, cross likes and comments, and a like left by a deleted post
+SECOND_USER = """
+INSERT INTO users (id, email, hashed_password) VALUES (2, 'b@x.in', 'x');
+INSERT INTO posts (id, content, author_id, likes_count, comments_count) VALUES (2, 'Wheat rust', 2, 1, 1);
+INSERT INTO post_likes (post_id, user_id) VALUES (1, 2), (2, 1), (99, 1);
+INSERT INTO comments (post_id, user_id, content) VALUES (1, 2, 'Same here'), (2, 1, 'Try propiconazole');
+UPDATE posts SET likes_count = 2, comments_count = 2 WHERE id = 1;
+"""
+
+
+def test_sqlite_rebuild_adds_cascading_deletes():
+    engine = _legacy_engine(BASELINE_SCHEMA + SECOND_USER)
+    migrate(engine)
+    assert "uq_post_likes_post_user" in {index["name"] for index in inspect(engine).get_indexes("post_likes")}
+
+    async_engine = create_async_engine(str(engine.url).replace("sqlite://", "sqlite+aiosqlite://"))
+    event.listen(async_engine.sync_engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def delete_post_then_user():
+        async with Session() as db:
+            await community.delete_post(2, current_user=await db.get(User, 2), db=db)
+        async with Session() as db:
+            assert await crud.delete_user(db, 2)
+        await async_engine.dispose()
+
+    asyncio.run(delete_post_then_user())
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT id, likes_count, comments_count FROM posts").all() == [(1, 1, 1)]
+        assert conn.exec_driver_sql("SELECT post_id, user_id FROM post_likes").all() == [(1, 1)]
+        assert conn.exec_driver_sql("SELECT content FROM comments").scalars().all() == ["Spray neem"]
+        assert conn.exec_driver_sql("SELECT user_id, likes_received, comments_received FROM user_stats").all() == [(1, 1, 1)]
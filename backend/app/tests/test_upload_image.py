@@ -0,0 +1,105 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from PIL import Image
+
+from app import community
+from app.services import image_storage
+from app.utils.body_limit import BodySizeLimitMiddleware
+
+LIMIT = 64 * 1024
+BOUNDARY = "farm"
+
+
+def _multipart(data: bytes) -> bytes:
+    return (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="leaf.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _limited_app():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return BodySizeLimitMiddleware(app, limits={"/upload": LIMIT})
+
+
+def _post(app, body: bytes, chunk_size: int, declare_length: bool):
+    """POST `body` in chunks through an ASGI app; returns (status, chunks read)."""
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if declare_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": headers, "query_string": b""}
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    read = 0
+    messages = []
+
+    async def receive():
+        nonlocal read
+        if read == len(chunks):
+            await asyncio.Event().wait()
+        read += 1
+        return {"type": "http.request", "body": chunks[read - 1], "more_body": read < len(chunks)}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages[0]["status"], read
+
+
+def test_declared_oversized_body_is_refused_before_reading():
+    status, read = _post(_limited_app(), _multipart(b"0" * LIMIT * 4), 4096, declare_length=True)
+    assert (status, read) == (413, 0)
+
+
+def test_streamed_oversized_body_stops_at_the_limit():
+    status, read = _post(_limited_app(), _multipart(b"0" * LIMIT * 4), 4096, declare_length=False)
+    assert status == 413
+    assert read <= LIMIT // 4096 + 1
+
+    status, _ = _post(_limited_app(), _multipart(b"0" * 1000), 4096, declare_length=False)
+    assert status == 200
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    local = image_storage.LocalImageStorage(tmp_path)
+    monkeypatch.setattr(image_storage, "_storage", local)
+    return local
+
+
+def _upload(data: bytes, filename: str = "leaf.png"):
+    upload = UploadFile(BytesIO(data), filename=filename)
+    return asyncio.run(community.upload_image(file=upload, current_user=None))
+
+
+@pytest.mark.parametrize("data, filename", [
+    (b"GIF89a not really", "leaf.png"),                  # wrong magic bytes
+    (b"\x89PNG\r\n\x1a\n" + b"\x00" * 200, "leaf.png"),  # PNG signature, corrupt body
+    (b"", "leaf.png"),
+    (b"\x89PNG\r\n\x1a\n", "leaf.exe"),
+])
+def test_invalid_images_are_rejected_and_nothing_is_kept(storage, data, filename):
+    with pytest.raises(HTTPException) as raised:
+        _upload(data, filename)
+    assert raised.value.status_code == 400
+    assert list(storage.iter_keys()) == []
+    assert list(storage.tmp_dir.iterdir()) == []
+
+
+def test_file_over_the_size_limit_is_rejected(storage, monkeypatch):
+    monkeypatch.setattr(community, "MAX_UPLOAD_SIZE", 1024)
+    buffer = BytesIO()
+    Image.effect_noise((128, 128), 64).save(buffer, "PNG")
+    assert len(buffer.getvalue()) > 1024
+    with pytest.raises(HTTPException) as raised:
+        _upload(buffer.getvalue())
+    assert raised.value.status_code == 400
+    assert "too large" in raised.value.detail
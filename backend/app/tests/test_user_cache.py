@@ -0,0 +1,34 @@
+import time
+
+from app.services.user_cache import UserCache, UserSnapshot, subject_key
+
+
+def _snapshot(user_id=1, email="farmer@example.com", crop="cotton"):
+    return UserSnapshot(
+        id=user_id, email=email, name="Farmer", phone=None, user_type="farmer", crop=crop,
+        location=None, state="Maharashtra", district=None, village=None, is_active=True,
+    )
+
+
+def test_entries_expire_and_are_bounded():
+    cache = UserCache(maxsize=2, ttl=0.05)
+    cache.put(subject_key(user_id=1), _snapshot(1))
+    cache.put(subject_key(user_id=2), _snapshot(2))
+    assert cache.get(subject_key(user_id=1)).id == 1
+
+    # Least recently used entry (user 2) is evicted
+    cache.put(subject_key(user_id=3), _snapshot(3))
+    assert cache.get(subject_key(user_id=2)) is None
+    assert cache.get(subject_key(user_id=3)).id == 3
+
+    time.sleep(0.06)
+    assert cache.get(subject_key(user_id=1)) is None
+
+
+def test_invalidate_drops_id_and_email_subjects():
+    cache = UserCache()
+    cache.put(subject_key(user_id=1), _snapshot())
+    cache.put(subject_key(email="farmer@example.com"), _snapshot())
+    cache.invalidate(1, "farmer@example.com")
+    assert cache.get(subject_key(user_id=1)) is None
+    assert cache.get(subject_key(email="farmer@example.com")) is None
@@ -0,0 +1,105 @@
+import pytest
+from fastapi import HTTPException
+
+from app import community, crud
+from app.database import SessionLocal
+from app.models import Post, User, UserStats
+from app.tests.conftest import run_committed
+
+
+@pytest.fixture
+def users(community_db):
+    """Three farmers: a Punjab wheat grower, a Punjab rice grower and a Gujarat cotton grower."""
+    profiles = [("Punjab", "wheat"), ("Punjab", "rice"), ("Gujarat", "cotton")]
+    rows = [
+        User(email=f"stats{i}@example.com", hashed_password="x", name=f"Farmer {i}", state=state, crop=crop)
+        for i, (state, crop) in enumerate(profiles)
+    ]
+    community_db.add_all(rows)
+    community_db.commit()
+    return [user.id for user in rows]
+
+
+def _record(user_id, posts_delta=0, touch=True):
+    async def record(db):
+        await crud.record_user_activity(db, await db.get(User, user_id), posts_delta, touch)
+
+    run_committed(record)
+
+
+def _stats(user_id):
+    with SessionLocal() as db:
+        return db.get(UserStats, user_id)
+
+
+def test_record_user_activity_upserts_and_floors_posts_count(users):
+    user_id = users[0]
+    _record(user_id, posts_delta=1, touch=False)
+    stats = _stats(user_id)
+    assert (stats.posts_count, stats.region, stats.crop, stats.last_active) == (1, "Punjab", "wheat", None)
+
+    _record(user_id, posts_delta=1)
+    stats = _stats(user_id)
+    assert stats.posts_count == 2 and stats.last_active is not None
+
+    with SessionLocal() as db:
+        db.query(User).filter(User.id == user_id).update({"state": "Haryana"})
+        db.commit()
+    _record(user_id, posts_delta=-5)
+    stats = _stats(user_id)
+    assert (stats.posts_count, stats.region) == (0, "Haryana")
+
+
+def test_rebuild_rewrites_only_drifted_rows(users):
+    author, idle, _ = users
+    with SessionLocal() as db:
+        db.add(Post(content="Yellow rust", author_id=author, likes_count=3, comments_count=1))
+        db.commit()
+
+        assert crud.rebuild_user_stats(db) == 1
+        assert db.query(UserStats).count() == 3
+        assert crud.rebuild_user_stats(db) == 0
+
+        db.query(UserStats).filter(UserStats.user_id == author).update({"likes_received": 0})
+        db.commit()
+        assert crud.rebuild_user_stats(db) == 1
+
+    stats = _stats(author)
+    assert (stats.posts_count, stats.likes_received, stats.comments_received) == (1, 3, 1)
+    assert stats.last_active is not None
+    idle_stats = _stats(idle)
+    assert (idle_stats.posts_count, idle_stats.last_active) == (0, None)
+
+
+def test_top_contributors_filters_by_region_and_crop(users):
+    wheat, rice, cotton = users
+    for user_id, posts in ((wheat, 3), (rice, 1), (cotton, 2)):
+        _record(user_id, posts_delta=posts)
+
+    def top(**filters):
+        rows = run_committed(lambda db: community.get_top_contributors(current_user=None, db=db, **filters))
+        return [row["user_id"] for row in rows]
+
+    assert top() == [wheat, cotton, rice]
+    assert top(limit=2) == [wheat, cotton]
+    assert top(region="Punjab") == [wheat, rice]
+    assert top(region="Punjab", crop="rice") == [rice]
+    assert top(crop="cotton") == [cotton]
+
+    _record(rice, posts_delta=-1)
+    assert top(region="Punjab") == [wheat]
+
+
+def test_user_stats_endpoint(users):
+    author, idle, _ = users
+    _record(author, posts_delta=2)
+
+    def stats(user_id):
+        return run_committed(lambda db: community.get_user_stats(user_id, current_user=None, db=db))
+
+    assert stats(author).posts_count == 2
+    idle_stats = stats(idle)
+    assert (idle_stats.user_id, idle_stats.posts_count, idle_stats.last_active) == (idle, 0, None)
+    with pytest.raises(HTTPException) as raised:
+        stats(max(users) + 1000)
+    assert raised.value.status_code == 404
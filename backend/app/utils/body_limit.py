@@ -0,0 +1,51 @@
+"""Request body size limits enforced while the body is received.
+
+FastAPI reads (and spools to disk) a whole multipart form before the
+endpoint runs, so an upload route cannot stop an oversized body itself.
+This middleware answers 413 straight away when the declared Content-Length
+is over the limit for the path, and stops a chunked body as soon as the
+bytes received pass it.
+"""
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+def _too_large(limit: int) -> str:
+    return f"Request body too large. Maximum size is {limit // (1024 * 1024)}MB."
+
+
+class BodySizeLimitMiddleware:
+    """Cap the request body size of the given paths (path -> bytes)."""
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = Headers(scope=scope).get("content-length", "")
+        if declared.isdigit() and int(declared) > limit:
+            await JSONResponse({"detail": _too_large(limit)}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing as they are
+                    raise HTTPException(status_code=413, detail=_too_large(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,114 @@
+"""gzip/Brotli compression of API responses.
+
+Only text-like bodies (JSON, MessagePack, HTML, CSV...) of at least
+`RESPONSE_COMPRESSION_MIN_BYTES` are compressed; small payloads gain little
+and PDFs, images and ZIPs are already compressed. Streaming responses (SSE,
+bulk report downloads) are never buffered and pass through unchanged.
+"""
+import gzip
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .responses import add_vary, quality_values
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip only
+    brotli = None
+
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+# Qualities above ~5 cost much more CPU for a few percent on dynamic responses
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type.startswith("text/"):
+        return media_type != "text/event-stream"
+    return media_type in COMPRESSIBLE_TYPES
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Brotli if the client takes it (and it is installed), else gzip, else None."""
+    if not accept_encoding:
+        return None
+    accepted = dict(quality_values(accept_encoding))
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=RESPONSE_BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compress complete response bodies with the client's preferred encoding."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        start: Optional[Message] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if is_compressible(headers.get("content-type", "")) and "content-encoding" not in headers:
+                    # A copy either way: Response objects can be reused
+                    start = {**message, "headers": list(message["headers"])}
+                    if encoding is None:
+                        # Sent as is, but other clients get it compressed
+                        add_vary(MutableHeaders(raw=start["headers"]), "Accept-Encoding")
+                        await send(start)
+                        start = None
+                    # Otherwise held until the body shows whether it is worth compressing
+                    return
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            add_vary(headers, "Accept-Encoding")
+            body = message.get("body", b"")
+            if len(body) >= self.minimum_size and not message.get("more_body", False):
+                body = compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The compressed bytes differ, so a strong validator no longer holds
+                    headers["etag"] = f"W/{etag}"
+                message = {**message, "body": body}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
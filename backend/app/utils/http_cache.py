@@ -0,0 +1,45 @@
+"""HTTP caching helpers: ETag comparison and 304 responses."""
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+# For URLs whose content never changes (e.g. UUID/content-hash file names)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def weak_etag(*inputs) -> str:
+    """Weak ETag derived from the inputs a response is built from rather than its bytes.
+
+    Lets a handler answer If-None-Match before doing the work to build the body.
+    """
+    digest = hashlib.sha256(repr(inputs).encode("utf-8")).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Return True if an If-None-Match header value matches `etag`.
+
+    Uses the weak comparison required for If-None-Match (RFC 9110 13.1.2).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == target
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str, cache_control: str, vary: Optional[str] = None) -> Response:
+    """Empty 304 response carrying the validators the client should keep.
+
+    Pass the `Vary` the matching 200 carries, so shared caches pair the 304
+    with the right representation.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    return Response(status_code=304, headers=headers)
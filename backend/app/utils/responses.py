@@ -0,0 +1,107 @@
+"""JSON and MessagePack response encoding.
+
+Routes with a `response_model` are already serialized to bytes by Pydantic.
+`ORJSONResponse` is for handlers that build their own response from plain
+dicts (the fusion endpoints), where it replaces `json.dumps`.
+"""
+from typing import Any, Iterable, Optional, Tuple
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import msgpack
+except ImportError:  # optional: without it every client gets JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Vary that MessagePackMiddleware and CompressionMiddleware give every JSON
+# response; a 304 for a JSON resource must repeat it
+JSON_VARY = "Accept, Accept-Encoding" if msgpack is not None else "Accept-Encoding"
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (also accepts numpy values and non-string keys)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def quality_values(header: str) -> Iterable[Tuple[str, float]]:
+    """(media type, q) pairs of an Accept or Accept-Encoding header."""
+    for item in header.split(","):
+        name, *params = item.split(";")
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        yield name.strip().lower(), q
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """True if the Accept header asks for MessagePack at least as much as JSON."""
+    if not accept:
+        return False
+    ranges = dict(quality_values(accept))
+    msgpack_q = max(ranges.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    return msgpack_q > 0 and msgpack_q >= ranges.get("application/json", 0.0)
+
+
+def add_vary(headers: MutableHeaders, field: str) -> None:
+    vary = [value.strip() for value in headers.get("vary", "").split(",") if value.strip()]
+    if field.lower() not in (value.lower() for value in vary):
+        headers["vary"] = ", ".join(vary + [field])
+
+
+class MessagePackMiddleware:
+    """Re-encode JSON responses as MessagePack for clients that ask for it.
+
+    The PWA sends `Accept: application/msgpack, application/json;q=0.9`; other
+    clients keep getting JSON. JSON responses carry `Vary: Accept` so shared
+    caches keep the two apart. Streaming responses are passed through as they are.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or msgpack is None:
+            await self.app(scope, receive, send)
+            return
+        wants_msgpack = accepts_msgpack(Headers(scope=scope).get("accept"))
+        start: Optional[Message] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if headers.get("content-type", "").startswith("application/json"):
+                    # Held until the body shows whether it can be converted (a copy: Response objects can be reused)
+                    start = {**message, "headers": list(message["headers"])}
+                    return
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            add_vary(headers, "Accept")
+            body = message.get("body", b"")
+            if wants_msgpack and body and not message.get("more_body", False):
+                body = msgpack.packb(orjson.loads(body))
+                headers["content-type"] = MSGPACK_MEDIA_TYPES[0]
+                headers["content-length"] = str(len(body))
+                message = {**message, "body": body}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,45 @@
+"""Write a ZIP archive incrementally so it can be streamed as it is built."""
+import zipfile
+from typing import List
+
+
+class _Sink:
+    """Write-only file object; zipfile falls back to data descriptors because it cannot seek."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """ZIP archive whose bytes are handed back entry by entry.
+
+    Only the entry being added and the central directory (a few dozen bytes
+    per entry) are held in memory. Entries are stored uncompressed by default,
+    which suits already-compressed content such as PDFs.
+    """
+
+    def __init__(self, compression: int = zipfile.ZIP_STORED):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, mode="w", compression=compression)
+
+    def add(self, name: str, data: bytes) -> bytes:
+        """Add an entry and return the archive bytes written for it."""
+        self._zip.writestr(name, data)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Finish the archive and return the central directory."""
+        self._zip.close()
+        return self._sink.drain()
@@ -0,0 +1,4 @@
+-- Migration: Add crop and location fields to users table (SQLite)
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS crop VARCHAR;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS location VARCHAR;
@@ -0,0 +1,7 @@
+-- Migration: Add crop and category columns to posts table (SQLite)
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS crop VARCHAR;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS category VARCHAR;
+
+CREATE INDEX IF NOT EXISTS idx_posts_crop ON posts(crop);
+CREATE INDEX IF NOT EXISTS idx_posts_category ON posts(category);
@@ -0,0 +1,17 @@
+-- Migration: Enforce one like per (post, user) and resync like counters
+-- Description: Removes duplicate likes left by the old read-check-insert toggle,
+-- adds the unique index used as the ON CONFLICT target, and recomputes likes_count.
+
+-- Keep the oldest like for every (post_id, user_id) pair
+DELETE FROM post_likes a
+USING post_likes b
+WHERE a.post_id = b.post_id
+  AND a.user_id = b.user_id
+  AND a.id > b.id;
+
+-- Unique index backing INSERT ... ON CONFLICT (post_id, user_id) DO NOTHING
+CREATE UNIQUE INDEX IF NOT EXISTS uq_post_likes_post_user ON post_likes(post_id, user_id);
+
+-- Counters may have drifted under concurrent taps; rebuild them from the source rows
+UPDATE posts
+SET likes_count = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id);
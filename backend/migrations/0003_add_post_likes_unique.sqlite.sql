@@ -0,0 +1,9 @@
+-- Migration: Enforce one like per (post, user) and resync like counters (SQLite)
+
+DELETE FROM post_likes
+WHERE id NOT IN (SELECT MIN(id) FROM post_likes GROUP BY post_id, user_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_post_likes_post_user ON post_likes(post_id, user_id);
+
+UPDATE posts
+SET likes_count = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id);
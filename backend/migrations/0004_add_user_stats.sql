@@ -0,0 +1,33 @@
+-- Migration: Materialized per-user community statistics
+-- Description: Creates user_stats (served by /community/top-contributors and
+-- /community/user/{id}/stats) and backfills it from users, posts and comments.
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    region VARCHAR,
+    crop VARCHAR,
+    posts_count INTEGER NOT NULL DEFAULT 0,
+    likes_received INTEGER NOT NULL DEFAULT 0,
+    comments_received INTEGER NOT NULL DEFAULT 0,
+    last_active TIMESTAMP WITH TIME ZONE
+);
+
+-- Leaderboard indexes are built concurrently by 0010
+
+-- Backfill
+INSERT INTO user_stats (user_id, region, crop, posts_count, likes_received, comments_received, last_active)
+SELECT
+    u.id,
+    u.state,
+    u.crop,
+    COUNT(p.id),
+    COALESCE(SUM(p.likes_count), 0),
+    COALESCE(SUM(p.comments_count), 0),
+    GREATEST(
+        MAX(p.created_at),
+        (SELECT MAX(c.created_at) FROM comments c WHERE c.user_id = u.id)
+    )
+FROM users u
+LEFT JOIN posts p ON p.author_id = u.id
+GROUP BY u.id, u.state, u.crop
+ON CONFLICT (user_id) DO NOTHING;
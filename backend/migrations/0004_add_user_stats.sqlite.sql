@@ -0,0 +1,29 @@
+-- Migration: Materialized per-user community statistics (SQLite)
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    region VARCHAR,
+    crop VARCHAR,
+    posts_count INTEGER NOT NULL DEFAULT 0,
+    likes_received INTEGER NOT NULL DEFAULT 0,
+    comments_received INTEGER NOT NULL DEFAULT 0,
+    last_active DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_stats_posts_count ON user_stats(posts_count);
+CREATE INDEX IF NOT EXISTS ix_user_stats_region_posts_count ON user_stats(region, posts_count);
+CREATE INDEX IF NOT EXISTS ix_user_stats_crop_posts_count ON user_stats(crop, posts_count);
+
+-- Backfill (last_active is refreshed by the app on the next post or comment)
+INSERT OR IGNORE INTO user_stats (user_id, region, crop, posts_count, likes_received, comments_received, last_active)
+SELECT
+    u.id,
+    u.state,
+    u.crop,
+    COUNT(p.id),
+    COALESCE(SUM(p.likes_count), 0),
+    COALESCE(SUM(p.comments_count), 0),
+    MAX(p.created_at)
+FROM users u
+LEFT JOIN posts p ON p.author_id = u.id
+GROUP BY u.id, u.state, u.crop;
@@ -0,0 +1,29 @@
+-- Migration: Database-level cascading deletes
+-- Description: Recreates the foreign keys on posts, post_likes, comments and
+-- user_stats with ON DELETE CASCADE so deleting a post or user is a single
+-- statement (the ORM relationships use passive_deletes=True).
+-- Constraint names are PostgreSQL's defaults for tables created by create_all.
+
+ALTER TABLE posts DROP CONSTRAINT IF EXISTS posts_author_id_fkey;
+ALTER TABLE posts ADD CONSTRAINT posts_author_id_fkey
+    FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE;
+
+ALTER TABLE post_likes DROP CONSTRAINT IF EXISTS post_likes_post_id_fkey;
+ALTER TABLE post_likes ADD CONSTRAINT post_likes_post_id_fkey
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE;
+
+ALTER TABLE post_likes DROP CONSTRAINT IF EXISTS post_likes_user_id_fkey;
+ALTER TABLE post_likes ADD CONSTRAINT post_likes_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+
+ALTER TABLE comments DROP CONSTRAINT IF EXISTS comments_post_id_fkey;
+ALTER TABLE comments ADD CONSTRAINT comments_post_id_fkey
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE;
+
+ALTER TABLE comments DROP CONSTRAINT IF EXISTS comments_user_id_fkey;
+ALTER TABLE comments ADD CONSTRAINT comments_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+
+ALTER TABLE user_stats DROP CONSTRAINT IF EXISTS user_stats_user_id_fkey;
+ALTER TABLE user_stats ADD CONSTRAINT user_stats_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
@@ -0,0 +1,64 @@
+"""Migration: Database-level cascading deletes (SQLite)
+
+SQLite cannot alter a foreign key, so every table whose references to users
+or posts have no ON DELETE action is rebuilt with ON DELETE CASCADE: create
+a copy from its own CREATE statement, copy the rows, drop the old table,
+rename the copy and recreate its indexes. Working from the stored statement
+keeps whatever columns the table has at this point, and tables created by
+the models (which already cascade) are left alone.
+
+Rows orphaned by deletes made before foreign keys were enforced would fail
+the foreign key check, so they are removed first and the post counters
+recounted.
+
+migrate: foreign-keys-off
+"""
+import re
+
+TABLES = ("posts", "post_likes", "comments", "user_stats")
+
+ORPHANS = (
+    "DELETE FROM posts WHERE author_id NOT IN (SELECT id FROM users)",
+    "DELETE FROM post_likes WHERE post_id NOT IN (SELECT id FROM posts) OR user_id NOT IN (SELECT id FROM users)",
+    "DELETE FROM comments WHERE post_id NOT IN (SELECT id FROM posts) OR user_id NOT IN (SELECT id FROM users)",
+    "DELETE FROM user_stats WHERE user_id NOT IN (SELECT id FROM users)",
+    """UPDATE posts SET
+        likes_count = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id),
+        comments_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)""",
+)
+
+# A reference to users(id) or posts(id) not already followed by an ON DELETE action
+_REFERENCE_RE = re.compile(
+    r'(REFERENCES\s+"?(?:users|posts)"?\s*\(\s*"?id"?\s*\))(?!\s+ON\s+DELETE)',
+    re.IGNORECASE,
+)
+
+
+def _rebuild(conn, table: str) -> None:
+    sql = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).scalar()
+    cascading = _REFERENCE_RE.sub(r"\1 ON DELETE CASCADE", sql)
+    if cascading == sql:
+        return
+    indexes = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+    ).scalars().all()
+
+    copy = f"{table}__rebuild"
+    create = re.sub(
+        rf'^\s*CREATE\s+TABLE\s+"?{table}"?', f'CREATE TABLE "{copy}"', cascading, count=1, flags=re.IGNORECASE
+    )
+    conn.exec_driver_sql(create)
+    conn.exec_driver_sql(f'INSERT INTO "{copy}" SELECT * FROM "{table}"')
+    conn.exec_driver_sql(f'DROP TABLE "{table}"')
+    conn.exec_driver_sql(f'ALTER TABLE "{copy}" RENAME TO "{table}"')
+    for index in indexes:
+        conn.exec_driver_sql(index)
+
+
+def upgrade(conn) -> None:
+    for statement in ORPHANS:
+        conn.exec_driver_sql(statement)
+    for table in TABLES:
+        _rebuild(conn, table)
@@ -0,0 +1,6 @@
+-- Migration: Add image_placeholder column to posts table
+-- Description: Stores the tiny blurred data URI produced by the image
+-- derivative pipeline so the feed can render a placeholder instantly.
+
+ALTER TABLE posts
+ADD COLUMN IF NOT EXISTS image_placeholder TEXT;
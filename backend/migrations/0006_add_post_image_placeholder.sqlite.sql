@@ -0,0 +1,3 @@
+-- Migration: Add image_placeholder column to posts table (SQLite)
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS image_placeholder TEXT;
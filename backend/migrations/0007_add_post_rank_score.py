@@ -0,0 +1,25 @@
+"""Migration: Add rank_score column to posts table
+
+Precomputed ranking for the personalized community feed
+(log10(1 + likes + 2 * comments) + created_epoch / FEED_RANK_DECAY_SECONDS).
+The app keeps it current; this backfills existing rows in one UPDATE, taking
+the weights from feed_ranking so the backfill matches the scores the app
+writes. The feed indexes are built concurrently by 0010.
+"""
+from sqlalchemy import text
+
+from app.services.feed_ranking import COMMENT_WEIGHT, RANK_DECAY_SECONDS
+
+BACKFILL = text(
+    """
+    UPDATE posts
+    SET rank_score = log(1 + GREATEST(COALESCE(likes_count, 0), 0)
+                         + CAST(:comment_weight AS DOUBLE PRECISION) * GREATEST(COALESCE(comments_count, 0), 0))
+        + EXTRACT(EPOCH FROM COALESCE(created_at, now())) / CAST(:decay_seconds AS DOUBLE PRECISION)
+    """
+)
+
+
+def upgrade(conn) -> None:
+    conn.exec_driver_sql("ALTER TABLE posts ADD COLUMN IF NOT EXISTS rank_score DOUBLE PRECISION NOT NULL DEFAULT 0")
+    conn.execute(BACKFILL, {"comment_weight": COMMENT_WEIGHT, "decay_seconds": RANK_DECAY_SECONDS})
@@ -0,0 +1,23 @@
+"""Migration: Add rank_score column and feed indexes to posts table (SQLite)
+
+SQLite has no log10() by default, so existing rows are backfilled with the
+app's own formula (feed_ranking.refresh_ranks) inside the migration.
+"""
+from sqlalchemy import inspect
+
+from app.services.feed_ranking import refresh_ranks
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_posts_rank_score ON posts (rank_score)",
+    "CREATE INDEX IF NOT EXISTS ix_posts_crop_rank_score ON posts (crop, rank_score)",
+    "CREATE INDEX IF NOT EXISTS ix_posts_region_rank_score ON posts (region, rank_score)",
+    "CREATE INDEX IF NOT EXISTS ix_posts_crop_region_rank_score ON posts (crop, region, rank_score)",
+)
+
+
+def upgrade(conn) -> None:
+    if "rank_score" not in {column["name"] for column in inspect(conn).get_columns("posts")}:
+        conn.exec_driver_sql("ALTER TABLE posts ADD COLUMN rank_score FLOAT NOT NULL DEFAULT 0")
+    refresh_ranks(conn, conn.exec_driver_sql("SELECT id FROM posts").scalars().all())
+    for statement in INDEXES:
+        conn.exec_driver_sql(statement)
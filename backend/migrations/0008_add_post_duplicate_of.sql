@@ -0,0 +1,8 @@
+-- Migration: Add duplicate_of column to posts table
+-- Description: Marks posts detected as near-duplicates of an earlier post
+-- (MinHash/LSH, see app/services/dedup.py). Such posts stay readable but
+-- are left out of feeds, search and trending. The index on the column is
+-- built concurrently by 0010.
+
+ALTER TABLE posts
+ADD COLUMN IF NOT EXISTS duplicate_of INTEGER REFERENCES posts(id) ON DELETE SET NULL;
@@ -0,0 +1,5 @@
+-- Migration: Add duplicate_of column to posts table (SQLite)
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS duplicate_of INTEGER REFERENCES posts(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_posts_duplicate_of ON posts (duplicate_of);
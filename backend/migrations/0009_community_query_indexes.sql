@@ -0,0 +1,26 @@
+-- Migration: Composite indexes for the hot community queries
+-- Description: Newest-first post listings (partial on listed posts), a user's
+-- posts, a post's comments and like-state lookups. Built concurrently so the
+-- tables stay writable; the single-column crop/category indexes from 0002
+-- are superseded by the composites.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_created_at
+    ON posts (created_at) WHERE duplicate_of IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_crop_created_at
+    ON posts (crop, created_at) WHERE duplicate_of IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_category_created_at
+    ON posts (category, created_at) WHERE duplicate_of IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_author_id_created_at
+    ON posts (author_id, created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_post_likes_user_id_post_id
+    ON post_likes (user_id, post_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_post_id_created_at
+    ON comments (post_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_user_id_post_id
+    ON comments (user_id, post_id);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_posts_crop;
+DROP INDEX CONCURRENTLY IF EXISTS idx_posts_category;
@@ -0,0 +1,25 @@
+-- Migration: Build the leaderboard, feed and duplicate indexes concurrently
+-- Description: 0004, 0007 and 0008 used to create these inside their
+-- transactions, blocking writes to posts and user_stats for the whole build.
+-- They are built here with CREATE INDEX CONCURRENTLY instead; on databases
+-- that already have them every statement is a no-op.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_stats_posts_count
+    ON user_stats (posts_count);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_stats_region_posts_count
+    ON user_stats (region, posts_count);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_stats_crop_posts_count
+    ON user_stats (crop, posts_count);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_rank_score
+    ON posts (rank_score);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_crop_rank_score
+    ON posts (crop, rank_score);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_region_rank_score
+    ON posts (region, rank_score);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_crop_region_rank_score
+    ON posts (crop, region, rank_score);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_duplicate_of
+    ON posts (duplicate_of);
@@ -0,0 +1,14 @@
+-- Migration: Build the leaderboard, feed and duplicate indexes concurrently (SQLite)
+-- SQLite has no concurrent builds; 0004, 0007 and 0008 already create these
+-- indexes, so this only restores any that are missing.
+
+CREATE INDEX IF NOT EXISTS ix_user_stats_posts_count ON user_stats(posts_count);
+CREATE INDEX IF NOT EXISTS ix_user_stats_region_posts_count ON user_stats(region, posts_count);
+CREATE INDEX IF NOT EXISTS ix_user_stats_crop_posts_count ON user_stats(crop, posts_count);
+
+CREATE INDEX IF NOT EXISTS ix_posts_rank_score ON posts (rank_score);
+CREATE INDEX IF NOT EXISTS ix_posts_crop_rank_score ON posts (crop, rank_score);
+CREATE INDEX IF NOT EXISTS ix_posts_region_rank_score ON posts (region, rank_score);
+CREATE INDEX IF NOT EXISTS ix_posts_crop_region_rank_score ON posts (crop, region, rank_score);
+
+CREATE INDEX IF NOT EXISTS ix_posts_duplicate_of ON posts (duplicate_of);
@@ -1,8 +1,14 @@
 """
-Migration script to add crop and category columns to posts table.
-Run this script to update your database schema.
+Apply pending database migrations.
+
+    python migrations/run_migration.py               # apply everything pending
+    python migrations/run_migration.py --status      # list applied / pending versions
+    python migrations/run_migration.py --target 7    # stop after version 0007
+    python migrations/run_migration.py --stamp 8     # mark 0001-0008 applied without running them
+
+See README_MIGRATION.md for how migration files are named.
 """
-import os
+import argparse
 import sys
 from pathlib import Path
 
@@ -12,53 +18,45 @@ sys.path.insert(0, str(BASE_DIR))
 
 # Import app's database connection
 from app.database import engine
-from sqlalchemy import text
+from app import schema_migrations
+
+
+def print_status():
+    for migration, applied in schema_migrations.status(engine):
+        mark = "✓" if applied else " "
+        mode = "" if migration.transactional else "  (no transaction)"
+        print(f"   [{mark}] {migration.label}{mode}")
+
 
-def run_migration():
-    """Run the migration to add crop and category columns."""
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending database migrations.")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    parser.add_argument("--target", type=int, help="apply migrations up to this version only")
+    parser.add_argument("--stamp", type=int, metavar="VERSION",
+                        help="record migrations up to VERSION as applied without running them")
+    args = parser.parse_args()
+
+    print(f"🔌 Connecting to {engine.url.render_as_string(hide_password=True)}...")
     try:
-        print("🔌 Connecting to database...")
-        
-        # Read migration SQL
-        migration_file = BASE_DIR / "migrations" / "add_post_crop_category.sql"
-        if not migration_file.exists():
-            print(f"❌ Migration file not found: {migration_file}")
-            sys.exit(1)
-        
-        with open(migration_file, "r") as f:
-            migration_sql = f.read()
-        
-        # Execute migration
-        print("📝 Running migration: add_post_crop_category.sql")
-        with engine.connect() as conn:
-            # Execute each statement separately
-            statements = [s.strip() for s in migration_sql.split(";") if s.strip() and not s.strip().startswith("--")]
-            for statement in statements:
-                if statement:
-                    try:
-                        conn.execute(text(statement))
-                        conn.commit()
-                        print(f"   ✓ Executed: {statement[:50]}...")
-                    except Exception as e:
-                        # Ignore "column already exists" errors
-                        error_msg = str(e).lower()
-                        if "already exists" in error_msg or "duplicate" in error_msg or "if not exists" in error_msg:
-                            print(f"   ⚠️  Skipped (already exists): {statement[:50]}...")
-                        else:
-                            print(f"   ❌ Error: {e}")
-                            raise
-        
-        print("\n✅ Migration completed successfully!")
-        print("   - Added 'crop' column to posts table")
-        print("   - Added 'category' column to posts table")
-        print("   - Created indexes for faster filtering")
-        
+        if args.status:
+            print_status()
+            return
+        if args.stamp is not None:
+            stamped = schema_migrations.stamp(engine, args.stamp)
+            print(f"📝 Stamped {len(stamped)} migration(s) as applied")
+            print_status()
+            return
+
+        applied = schema_migrations.migrate(engine, target=args.target)
+        for migration in applied:
+            print(f"   ✓ Applied {migration.label}")
+        print("\n✅ Database schema is up to date" if not args.target else f"\n✅ Migrated up to {args.target:04d}")
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
 
-if __name__ == "__main__":
-    run_migration()
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Load test: other endpoints' latency during a login storm.
+
+Measures GET / latency on its own, then again while many concurrent logins
+hit /auth/login (as after a morning SMS campaign). With bcrypt running on
+the password-hash pool, the latency during the storm should stay close to
+the baseline instead of growing by hundreds of milliseconds.
+
+Usage (server running on localhost:8000):
+    python test_scripts/load_test_login.py [--logins 200] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+EMAIL = "loadtest@example.com"
+PASSWORD = "loadtest-password"
+
+
+async def ensure_user(client: httpx.AsyncClient):
+    await client.post("/auth/signup", json={
+        "email": EMAIL,
+        "password": PASSWORD,
+        "name": "Load Test",
+        "userType": "farmer",
+    })
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, samples: list):
+    """Hit a cheap endpoint every 20 ms and record its latency."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/")
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.02)
+
+
+async def login_storm(client: httpx.AsyncClient, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async def one_login():
+        async with semaphore:
+            response = await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    return statuses
+
+
+def summarize(label: str, samples: list):
+    if not samples:
+        print(f"{label}: no samples")
+        return
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) >= 20 else ordered[-1]
+    print(f"{label}: n={len(samples)} p50={statistics.median(samples):.1f}ms p95={p95:.1f}ms max={ordered[-1]:.1f}ms")
+
+
+async def main(logins: int, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60, limits=limits) as client:
+        await ensure_user(client)
+
+        baseline, stop = [], asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, baseline))
+        await asyncio.sleep(2)
+        stop.set()
+        await probe_task
+        summarize("GET / baseline      ", baseline)
+
+        during, stop = [], asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, during))
+        started = time.perf_counter()
+        statuses = await login_storm(client, logins, concurrency)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+        summarize("GET / during storm  ", during)
+        print(f"{logins} logins in {elapsed:.1f}s, status codes: {statuses}")
+
+        metrics = await client.get("/metrics")
+        print(f"Password hasher: {metrics.json().get('password_hasher')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
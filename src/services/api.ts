@@ -23,6 +23,7 @@ export interface Post {
   image_url?: string | null;
   created_at: string;
   is_liked: boolean;
+  duplicate_of?: number | null; // Set (with HTTP 202) when the post is a near-copy and won't be listed
 }
 
 export interface CreatePostData {